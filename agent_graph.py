@@ -1,12 +1,25 @@
+import os
 import random
 import asyncio
-import sqlite3
-import googlemaps
+import hashlib
+import zlib
+from dataclasses import dataclass
 from datetime import datetime, time, timedelta
-from typing import TypedDict, List, Dict, Any, Optional
+from time import perf_counter
+from typing import TypedDict, List, Dict, Any, NamedTuple, Optional, Tuple
+import numpy as np
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite import SqliteSaver
 from pydantic import BaseModel, Field
+from maps_batching import DistanceMatrixBatcher, Leg
+from maps_client import shared_maps_client
+from travel_time_cache import TravelTimeCache, make_key
+from opening_hours import MINUTES_PER_DAY, ActivityWindow, OpeningHoursStore
+from checkpointer import PooledAsyncSqliteSaver
+from live_frontier import LiveFrontier
+from pareto import pareto_mask
+from routing_policy import load_policy
+from schedule_solver import Stop, check, solve
 
 # --- Pydantic Models for Auditor ---
 
@@ -16,25 +29,55 @@ class Location(BaseModel):
     lng: float = 0.0
     address: str = ""
 
+def content_digest(*parts: Any) -> str:
+    return hashlib.blake2b("|".join(map(str, parts)).encode("utf-8"), digest_size=8).hexdigest()
+
 class Activity(BaseModel):
     title: str
     location: Location
     start_time: time
     end_time: time
     description: str = ""
+    flex_minutes: int = 60   # How far the scheduler may move the activity from its planned times
+
+    def content_hash(self) -> str:
+        """Hash of what the audit looks at (place, times, title); the description is not audited."""
+        return content_digest(self.location.place_id, self.title, self.start_time, self.end_time)
 
 class DailyPlan(BaseModel):
     date: str # YYYY-MM-DD
     activities: List[Activity]
 
+    def activity_keys(self) -> List[str]:
+        """Audit-memo keys of the opening-hours checks, one per activity."""
+        return [content_digest("hours", self.date, a.content_hash()) for a in self.activities]
+
+    def leg_keys(self) -> List[str]:
+        """Audit-memo keys of the traffic checks, one per consecutive pair (both endpoints and the date)."""
+        hashes = [a.content_hash() for a in self.activities]
+        return [content_digest("leg", self.date, a, b) for a, b in zip(hashes, hashes[1:])]
+
 class Itinerary(BaseModel):
     daily_plans: List[DailyPlan]
 
+class Candidate(BaseModel):
+    """One planner variant's itinerary, filled in as it goes through the graph"""
+    agent_version: str
+    itinerary: Itinerary
+    itinerary_raw: List[str]
+    errors: List[str] = Field(default_factory=list)
+    profit_margin: Optional[float] = None
+    aesthetic_score: Optional[float] = None
+    on_frontier: Optional[bool] = None
+    schedule_notes: List[str] = Field(default_factory=list)  # What the scheduler changed or could not fit
+    timings: Dict[str, float] = Field(default_factory=dict)  # seconds per stage ("plan", "schedule"); the audit is shared, see the auditor's message
+
 # --- State Definition ---
 
 class AgentState(TypedDict):
     user_id: str
     user_request: str
+    request_hash: str        # Identifies the request a thread was planned for (see backend_api)
     itinerary_raw: List[str] # Keeping old simple list for compatibility/display
     itinerary: Itinerary     # Structured Pydantic model for Auditor
     errors: List[str]
@@ -44,6 +87,12 @@ class AgentState(TypedDict):
     messages: List[str]
     user_context: str
     system_instruction_add_on: str
+    user_segment: str
+    agent_version: str       # Routed by the active policy in routing_policies.json
+    candidate_versions: List[str]  # Planner variants to fan out to, the routed version first
+    candidates: List[Candidate]    # One per variant; the arbiter picks from their Pareto frontier
+    audit_memo: Dict[str, List[str]]  # Issues found per activity / leg key (see DailyPlan), reused by re-audits of the same run; new runs reset it
+    selected_version: str          # Variant whose candidate the arbiter picked
 
 # --- Memory Retrieval Logic ---
 
@@ -57,10 +106,49 @@ def mock_get_user_preferences(user_id: str) -> str:
     else:
         return "偏好：标准行程，注重性价比。"
 
+def mock_get_user_segment(user_id: str) -> str:
+    """Mock CRM lookup of the user's segment (same segments as the routing policies)"""
+    if "vip" in user_id:
+        return "high_net_worth"
+    elif "user_123" in user_id:
+        return "standard"
+    return "price_sensitive"
+
 def mock_get_org_memory() -> str:
     """Mock database lookup for organizational knowledge"""
     return "组织记忆：1. 巴黎丽兹酒店大巴无法进入，需安排小车接驳。 2. 卢浮宫周二闭馆，排期需避开。"
 
+def mock_get_org_closures() -> List[Dict[str, Any]]:
+    """Structured form of the closure rules in the organizational memory (used by the opening-hours engine)"""
+    return [
+        {"keywords": ["卢浮宫", "Louvre"], "closed_weekdays": [1]},  # 周二闭馆
+    ]
+
+# --- Planner Variants ---
+
+@dataclass
+class PlannerProfile:
+    aesthetic_weight: float     # arbiter trade-off weights when this version is the routed one
+    profit_weight: float
+    base_aesthetic: float       # mock arbiter scores of the variant's plans
+    base_profit: float
+
+# Keyed by version family (the "v1" of "v1-balanced"), so patched releases share a profile
+PLANNER_PROFILES = {
+    "v1": PlannerProfile(0.5, 0.5, 9.0, 15.0),
+    "v2": PlannerProfile(0.8, 0.2, 9.6, 12.0),
+    "v3": PlannerProfile(0.2, 0.8, 7.5, 19.0),
+}
+# Planner variants per request (the routed version plus the policy's others)
+PLANNER_FANOUT = int(os.getenv("PLANNER_FANOUT", "3"))
+
+def planner_profile(agent_version: str) -> PlannerProfile:
+    return PLANNER_PROFILES.get(agent_version.split("-")[0], PLANNER_PROFILES["v1"])
+
+def candidate_versions(versions: List[str], routed: str, fanout: int = PLANNER_FANOUT) -> List[str]:
+    """The routed version first, then the policy's other versions, at most `fanout`."""
+    return [routed, *(v for v in versions if v != routed)][:max(1, fanout)]
+
 async def memory_retrieval(state: AgentState):
     """
     Memory Retrieval Node: Fetches long-term user preferences and organizational wisdom.
@@ -74,18 +162,29 @@ async def memory_retrieval(state: AgentState):
     # 2. Fetch Organizational Memory
     org_wisdom = mock_get_org_memory()
     
+    # 3. Route to an agent version (sticky per user while the policy is unchanged)
+    segment = mock_get_user_segment(user_id)
+    policy = load_policy()
+    agent_version = policy.route(segment, key=user_id)
+    
     combined_context = f"用户画像: {user_prefs}\n企业知识库: {org_wisdom}"
     
     return {
         "user_context": combined_context,
         "system_instruction_add_on": f"【重要约束】请严格遵守以下记忆信息：\n{combined_context}",
-        "messages": [f"Memory: Retrieved context for {user_id}"]
+        "user_segment": segment,
+        "agent_version": agent_version,
+        "candidate_versions": candidate_versions(policy.versions, agent_version),
+        "messages": [
+            f"Memory: Retrieved context for {user_id}",
+            f"Router: {segment} -> {agent_version} (policy {policy.name} v{policy.version})"
+        ]
     }
 
 
 # --- Mock Data Helpers ---
 # Since we don't have real Place IDs, we mock them
-def create_mock_itinerary():
+def create_mock_itinerary(agent_version: str = "v1-balanced"):
     # Day 1
     act1 = Activity(
         title="Hotel Ritz Check-in",
@@ -106,186 +205,491 @@ def create_mock_itinerary():
         start_time=time(13, 0),
         end_time=time(16, 0)
     )
-    
+    day2 = [act2, act3]
+
+    # Variants differ in what they add to the shared skeleton
+    family = agent_version.split("-")[0]
+    if family == "v2":
+        # Aesthetic-first: golden-hour cruise
+        day2.append(Activity(
+            title="Seine Sunset Cruise",
+            location=Location(place_id="ChIJ-b-5...MockID4"),
+            start_time=time(20, 30),
+            end_time=time(22, 0),
+            flex_minutes=0 # Golden hour is not negotiable
+        ))
+    elif family == "v3":
+        # Profit-seeker: partner shopping slot right after the museum
+        day2.append(Activity(
+            title="Galeries Lafayette (Partner)",
+            location=Location(place_id="ChIJ-b-5...MockID5"),
+            start_time=time(16, 30),
+            end_time=time(18, 0)
+        ))
+
     return Itinerary(daily_plans=[
         DailyPlan(date="2024-06-01", activities=[act1]),
-        DailyPlan(date="2024-06-02", activities=[act2, act3])
+        DailyPlan(date="2024-06-02", activities=day2)
     ])
 
+def mock_itinerary_display(agent_version: str = "v1-balanced") -> List[str]:
+    display = [
+        "Day 1: Arrive in Paris, check into Hotel Ritz.",
+        "Day 2: Morning coffee at Café de Flore, afternoon visit to Musée d'Orsay.",
+        "Day 3: Day trip to Giverny to see Monet's gardens.",
+        "Day 4: Sunset cruise on the Seine, dinner at Le Jules Verne."
+    ]
+    family = agent_version.split("-")[0]
+    if family == "v2":
+        display[1] = "Day 2: Morning coffee at Café de Flore, Musée d'Orsay, golden-hour cruise on the Seine."
+    elif family == "v3":
+        display[1] = "Day 2: Morning coffee at Café de Flore, Musée d'Orsay, shopping at Galeries Lafayette."
+    return display
+
+def mock_place_details(place_id: str) -> Dict[str, Any]:
+    """Place Details results for the mock place IDs (Places API format, day 0 = Sunday)"""
+    daily = lambda open_time, close_time, days=range(7): [
+        {"open": {"day": d, "time": open_time}, "close": {"day": d if close_time > open_time else (d + 1) % 7, "time": close_time}}
+        for d in days
+    ]
+    details = {
+        "ChIJ-b-5...MockID1": {"name": "Hotel Ritz Paris", "opening_hours": {"periods": [{"open": {"day": 0, "time": "0000"}}]}},
+        "ChIJ-b-5...MockID2": {"name": "Café de Flore", "opening_hours": {"periods": daily("0730", "0130")}},
+        # Musée d'Orsay: closed on Mondays, late opening on Thursdays
+        "ChIJ-b-5...MockID3": {"name": "Musée d'Orsay", "opening_hours": {"periods": daily("0930", "1800", [0, 2, 3, 5, 6]) + daily("0930", "2145", [4])}},
+        "ChIJ-b-5...MockID4": {"name": "Bateaux Parisiens", "opening_hours": {"periods": daily("1000", "2300")}},
+        # Galeries Lafayette: shorter hours on Sundays
+        "ChIJ-b-5...MockID5": {"name": "Galeries Lafayette Haussmann", "opening_hours": {"periods": daily("1000", "2030", range(1, 7)) + daily("1100", "2000", [0])}},
+    }
+    return details.get(place_id, {"name": place_id})
+
 # --- Google Maps Client ---
-# Initialize with a dummy key for now, or use env var
-# For production, replace 'YOUR_KEY' with os.getenv("GOOGLE_MAPS_API_KEY")
-try:
-    gmaps = googlemaps.Client(key='YOUR_GOOGLE_MAPS_API_KEY')
-except ValueError:
+# Shared asyncio client: pooled connections, concurrency cap and rate limit for all sessions
+gmaps = shared_maps_client(os.getenv("GOOGLE_MAPS_API_KEY"))
+if gmaps is None:
     print("Warning: Google Maps API Key not provided. Using mock mode.")
-    gmaps = None
+
+# Travel times are reused across audits (and restarts) for the same place pair and hour;
+# mock mode never queries Maps, so it keeps no file
+travel_time_cache = TravelTimeCache(path=os.getenv("TRAVEL_TIME_CACHE_PATH", "travel_time_cache.db") if gmaps else None)
+
+# All traffic checks of one audit go through a single batched lookup
+traffic_batcher = DistanceMatrixBatcher(gmaps, cache=travel_time_cache) if gmaps else None
+
+async def fetch_place_details(place_id: str) -> Dict[str, Any]:
+    if not gmaps:
+        return mock_place_details(place_id)
+    res = await gmaps.place(place_id, fields=["name", "opening_hours", "current_opening_hours"])
+    return res.get("result", {})
+
+# Weekly opening-hours tables, fetched once per place and cached on disk
+opening_hours_store = OpeningHoursStore(
+    fetch_place_details,
+    path=os.getenv("OPENING_HOURS_CACHE_PATH", "opening_hours_cache.json"),
+    closure_rules=mock_get_org_closures()
+)
 
 # --- Auditor Logic ---
 
+def compare_travel_time(act_a: Activity, act_b: Activity, real_duration: float) -> List[str]:
+    """Compare a measured travel time (minutes) against the planned gap between two activities."""
+    dt_a_end = datetime.combine(datetime.min, act_a.end_time)
+    dt_b_start = datetime.combine(datetime.min, act_b.start_time)
+    planned_gap = (dt_b_start - dt_a_end).seconds / 60
+
+    if real_duration > planned_gap:
+        return [f"交通冲突: 从 {act_a.title} 到 {act_b.title} 实测需 {int(real_duration)}分钟，但仅预留了 {int(planned_gap)}分钟。"]
+    return []
+
+def mock_travel_minutes(origin: str, destination: str) -> int:
+    """
+    Travel time used when there is no API key, by both the scheduler and the auditor
+    (so a schedule the solver fitted also passes the audit): 10-40 min, stable per place pair.
+    """
+    if origin == destination:
+        return 0
+    # crc32 is stable across processes (unlike hash())
+    return 10 + zlib.crc32(f"{origin}|{destination}".encode("utf-8")) % 31
+
 async def check_traffic_and_timing(act_a: Activity, act_b: Activity, date_str: str) -> List[str]:
-    issue = []
     # Mock logic if no API key
     if not gmaps:
         await asyncio.sleep(0.2) # Simulate network
-        # Hardcoded logic for demo purpose:
-        # If going from Cafe to Museum, pretend there is traffic
-        if "Café" in act_a.title and "Musée" in act_b.title:
-             # Let's say planned gap is 2.5 hours (10:30 to 13:00), which is fine.
-             # But let's randomly inject a delay
-             if random.random() < 0.3:
-                 issue.append(f"交通冲突 (Mock): 从 {act_a.title} 到 {act_b.title} 预计拥堵，建议提前出发。")
-        return issue
+        return compare_travel_time(act_a, act_b, mock_travel_minutes(act_a.location.place_id, act_b.location.place_id))
+
+    issue = []
 
     departure_time = datetime.combine(datetime.strptime(date_str, "%Y-%m-%d"), act_a.end_time)
+    cache_key = make_key(act_a.location.place_id, act_b.location.place_id, departure_time)
+    cached_seconds = await travel_time_cache.aget(cache_key)
+    if cached_seconds is not None:
+        return compare_travel_time(act_a, act_b, cached_seconds / 60)
     
     try:
-        # Run synchronous gmaps call in executor
-        loop = asyncio.get_running_loop()
-        res = await loop.run_in_executor(
-            None, 
-            lambda: gmaps.distance_matrix(
-                origins=f"place_id:{act_a.location.place_id}",
-                destinations=f"place_id:{act_b.location.place_id}",
-                departure_time=departure_time,
-                traffic_model="pessimistic"
-            )
+        res = await gmaps.distance_matrix(
+            origins=f"place_id:{act_a.location.place_id}",
+            destinations=f"place_id:{act_b.location.place_id}",
+            departure_time=departure_time,
+            traffic_model="pessimistic"
         )
         
         if res['rows'][0]['elements'][0]['status'] == 'OK':
             element = res['rows'][0]['elements'][0]
+            await travel_time_cache.aput(cache_key, element['duration_in_traffic']['value'])
             real_duration = element['duration_in_traffic']['value'] / 60
-            
-            # Calculate gap
-            dt_a_end = datetime.combine(datetime.min, act_a.end_time)
-            dt_b_start = datetime.combine(datetime.min, act_b.start_time)
-            planned_gap = (dt_b_start - dt_a_end).seconds / 60
-            
-            if real_duration > planned_gap:
-                issue.append(f"交通冲突: 从 {act_a.title} 到 {act_b.title} 实测需 {int(real_duration)}分钟，但仅预留了 {int(planned_gap)}分钟。")
+            issue.extend(compare_travel_time(act_a, act_b, real_duration))
                 
     except Exception as e:
         issue.append(f"API调用失败: {str(e)}")
         
     return issue
 
+class LegCheck(NamedTuple):
+    key: str            # DailyPlan.leg_keys entry
+    act_a: Activity
+    act_b: Activity
+    leg: Leg
+
+def itinerary_legs(plan: Itinerary) -> List[LegCheck]:
+    """Consecutive activity pairs of each day, with the leg between them."""
+    pairs = []
+    for day in plan.daily_plans:
+        date = datetime.strptime(day.date, "%Y-%m-%d")
+        for key, act_a, act_b in zip(day.leg_keys(), day.activities, day.activities[1:]):
+            leg = Leg(act_a.location.place_id, act_b.location.place_id, datetime.combine(date, act_a.end_time))
+            pairs.append(LegCheck(key, act_a, act_b, leg))
+    return pairs
+
+def leg_result_issues(check: LegCheck, res) -> List[str]:
+    if res.error:
+        return [f"API调用失败: {res.error}"]
+    if res.status == 'OK' and res.duration_in_traffic is not None:
+        return compare_travel_time(check.act_a, check.act_b, res.duration_in_traffic / 60)
+    return []
+
+async def check_traffic_shared(plans: List[Itinerary], memo: Optional[Dict[str, List[str]]] = None) -> List[List[str]]:
+    """
+    Traffic check of several itineraries at once. Only legs missing from `memo`
+    are checked, each once even when candidates share it (one batched lookup in
+    total, or one mock check per leg); their results are added to `memo`.
+    """
+    memo = {} if memo is None else memo
+    pairs = [itinerary_legs(plan) for plan in plans]
+    pending = {check.key: check for plan_pairs in pairs for check in plan_pairs if check.key not in memo}
+
+    failed: Dict[str, List[str]] = {}   # failed lookups are reported, not memoized (the next audit retries them)
+    if pending and traffic_batcher:
+        results = await traffic_batcher.resolve(list(dict.fromkeys(check.leg for check in pending.values())))
+        for key, check in pending.items():
+            (failed if results[check.leg].error else memo)[key] = leg_result_issues(check, results[check.leg])
+    elif pending:
+        outcomes = await asyncio.gather(*(
+            check_traffic_and_timing(check.act_a, check.act_b, f"{check.leg.departure_time:%Y-%m-%d}")
+            for check in pending.values()
+        ))
+        memo.update(zip(pending, outcomes))
+
+    return [[issue for check in plan_pairs for issue in (memo[check.key] if check.key in memo else failed[check.key])]
+            for plan_pairs in pairs]
+
+def opening_hours_conflict(activity: Activity, date_str: str) -> str:
+    return f"营业时间冲突: {activity.title} 在 {date_str} {activity.start_time:%H:%M}-{activity.end_time:%H:%M} 不在营业时间内。"
+
 async def check_opening_hours(activity: Activity, date_str: str) -> List[str]:
     issue = []
-    if not gmaps:
-        await asyncio.sleep(0.1)
-        # Mock logic: Museum closed on Mondays
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
-        if "Musée" in activity.title and dt.weekday() == 0: # Monday
-             issue.append(f"营业时间冲突 (Mock): {activity.title} 周一闭馆。")
-        return issue
-
-    # Real API logic would go here
-    # ...
+    await opening_hours_store.ensure_places({activity.location.place_id: activity.title})
+    if opening_hours_store.is_open(activity.location.place_id, date_str, activity.start_time, activity.end_time) is False:
+        issue.append(opening_hours_conflict(activity, date_str))
     return issue
 
+async def check_opening_hours_shared(plans: List[Itinerary], memo: Optional[Dict[str, List[str]]] = None) -> List[List[str]]:
+    """
+    Opening-hours check of several itineraries in one pass. Only activities missing
+    from `memo` are checked (places fetched once for all of them); their results are added to `memo`.
+    """
+    memo = {} if memo is None else memo
+    keyed = [[(key, activity, day.date) for day in plan.daily_plans for key, activity in zip(day.activity_keys(), day.activities)]
+             for plan in plans]
+    pending = {key: (activity, date_str) for plan_keyed in keyed for key, activity, date_str in plan_keyed if key not in memo}
+
+    if pending:
+        await opening_hours_store.ensure_places([(a.location.place_id, a.title) for a, _ in pending.values()])
+        is_open = opening_hours_store.check_windows([
+            ActivityWindow(a.title, a.location.place_id, date_str, a.start_time, a.end_time)
+            for a, date_str in pending.values()
+        ])
+        for (key, (activity, date_str)), ok in zip(pending.items(), is_open):
+            memo[key] = [] if ok else [opening_hours_conflict(activity, date_str)]
+
+    return [[issue for key, _, _ in plan_keyed for issue in memo[key]] for plan_keyed in keyed]
+
+# --- Scheduling ---
+
+def minutes_of(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+def clock_time(minutes: int) -> time:
+    return time((minutes // 60) % 24, minutes % 60)
+
+async def day_travel_matrix(day: DailyPlan, consecutive_only: bool = False) -> np.ndarray:
+    """
+    Minutes between every ordered pair of the day's activities (or only between consecutive
+    ones, the rest left 0), departing at the origin's planned end (one batched lookup).
+    Failed lookups count as 0; the auditor reports them.
+    """
+    acts = day.activities
+    date = datetime.strptime(day.date, "%Y-%m-%d")
+    pairs = [(i, i + 1) for i in range(len(acts) - 1)] if consecutive_only else \
+        [(i, j) for i in range(len(acts)) for j in range(len(acts)) if i != j]
+    legs = {
+        (i, j): Leg(acts[i].location.place_id, acts[j].location.place_id, datetime.combine(date, acts[i].end_time))
+        for i, j in pairs
+    }
+    travel = np.zeros((len(acts), len(acts)))
+    if traffic_batcher:
+        results = await traffic_batcher.resolve(list(dict.fromkeys(legs.values())))
+        for (i, j), leg in legs.items():
+            if results[leg].status == 'OK' and results[leg].duration_in_traffic is not None:
+                travel[i, j] = results[leg].duration_in_traffic / 60
+    else:
+        for (i, j), leg in legs.items():
+            travel[i, j] = mock_travel_minutes(leg.origin, leg.destination)
+    # Schedules are in whole minutes; rounding up keeps every planned gap long enough
+    return np.ceil(travel)
+
+async def schedule_day(day: DailyPlan) -> Tuple[DailyPlan, List[str]]:
+    """
+    The day as drafted when it has no conflicts; otherwise re-ordered and re-timed by
+    the feasibility solver (opening hours within each activity's flex_minutes).
+    Notes say what changed, or which activities cannot be fitted (the draft is then kept).
+    """
+    acts = day.activities
+    if not acts:
+        return day, []
+
+    await opening_hours_store.ensure_places([(a.location.place_id, a.title) for a in acts])
+    stops = []
+    for a in acts:
+        start, end = minutes_of(a.start_time), minutes_of(a.end_time)
+        if end < start:
+            end += MINUTES_PER_DAY
+        opening = opening_hours_store.day_windows(a.location.place_id, day.date)
+        if opening is None:     # hours unknown: any time; a known closed day stays []
+            opening = [(0, 2 * MINUTES_PER_DAY)]
+        low, high = start - a.flex_minutes, end + a.flex_minutes
+        windows = [(max(s, low), min(e, high)) for s, e in opening if min(e, high) > max(s, low)]
+        stops.append(Stop(a.title, end - start, windows, preferred_start=start))
+    # The draft's own legs first (the auditor looks them up anyway); all pairs only when it has conflicts
+    conflicts = check(stops, await day_travel_matrix(day, consecutive_only=True), range(len(acts)),
+                      [stop.preferred_start for stop in stops])
+    if not conflicts:
+        return day, []
+    travel = await day_travel_matrix(day)
+    schedule = solve(stops, travel)
+    if not schedule.feasible:
+        return day, [f"Scheduler: {day.date} {v.key}: {v.reason}" for v in schedule.dropped]
+
+    activities = [
+        acts[j].model_copy(update={"start_time": clock_time(start), "end_time": clock_time(start + stops[j].duration)})
+        for j, start in zip(schedule.order, schedule.starts)
+    ]
+    moved = [f"{a.title} {a.start_time:%H:%M}" for a, b in zip(activities, [acts[j] for j in schedule.order])
+             if a.start_time != b.start_time]
+    reordered = schedule.order != list(range(len(acts)))
+    return day.model_copy(update={"activities": activities}), [
+        f"Scheduler: {day.date} {'re-ordered and ' if reordered else ''}re-timed to clear {len(conflicts)} "
+        f"conflicts ({schedule.method}): {', '.join(moved) or 'same times'}."
+    ]
+
+async def schedule_itinerary(plan: Itinerary) -> Tuple[Itinerary, List[str]]:
+    """All days scheduled concurrently."""
+    days = await asyncio.gather(*(schedule_day(day) for day in plan.daily_plans))
+    return Itinerary(daily_plans=[day for day, _ in days]), [note for _, notes in days for note in notes]
+
 # --- Node Functions ---
 
-async def planner(state: AgentState):
+def state_candidates(state: AgentState) -> List[Candidate]:
+    """The state's candidates; threads planned before the fan-out carry a single itinerary."""
+    if state.get("candidates"):
+        return state["candidates"]
+    if not state.get("itinerary"):
+        return []
+    return [Candidate(
+        agent_version=state.get("agent_version", "v1-balanced"),
+        itinerary=state["itinerary"],
+        itinerary_raw=state.get("itinerary_raw", []),
+        errors=state.get("errors") or []
+    )]
+
+async def plan_variant(state: AgentState, agent_version: str) -> Candidate:
     """
-    AI Planner: Generates the initial itinerary.
+    One planner branch: the shared memory context, the variant's own priorities.
+    The draft goes through the feasibility solver, so conflicts are fixed here instead of by a replan.
     """
-    print("--- Planner Node ---")
+    started = perf_counter()
     await asyncio.sleep(1.0)
-    
+
+    # In a real app, LLM would generate this structure (memory context + the variant's profile in the prompt)
+    draft = create_mock_itinerary(agent_version)
+    drafted = perf_counter()
+    itinerary, notes = await schedule_itinerary(draft)
+    return Candidate(
+        agent_version=agent_version,
+        itinerary=itinerary,
+        itinerary_raw=mock_itinerary_display(agent_version),
+        schedule_notes=notes,
+        timings={"plan": round(drafted - started, 3), "schedule": round(perf_counter() - drafted, 3)}
+    )
+
+async def planner(state: AgentState):
+    """
+    AI Planner: Drafts one itinerary per planner variant, concurrently.
+    """
+    print("--- Planner Node (Fan-out) ---")
+
     # Check for memory context
     memory_context = state.get("system_instruction_add_on", "")
     print(f"Planner Context: {memory_context}")
-    
-    # In a real app, LLM would generate this structure
-    structured_plan = create_mock_itinerary()
-    
-    initial_itinerary_display = [
-        "Day 1: Arrive in Paris, check into Hotel Ritz.",
-        "Day 2: Morning coffee at Café de Flore, afternoon visit to Musée d'Orsay.",
-        "Day 3: Day trip to Giverny to see Monet's gardens.",
-        "Day 4: Sunset cruise on the Seine, dinner at Le Jules Verne."
-    ]
-    
+
+    versions = state.get("candidate_versions") or [state.get("agent_version", "v1-balanced")]
+    started = perf_counter()
+    candidates = list(await asyncio.gather(*(plan_variant(state, version) for version in versions)))
+    elapsed = perf_counter() - started
+
+    messages = []
+    for c in candidates:
+        messages.append(f"Planner ({c.agent_version}): Drafted {sum(len(day.activities) for day in c.itinerary.daily_plans)} "
+                        f"activities in {c.timings['plan']:.2f}s, scheduled in {c.timings['schedule']:.2f}s.")
+        messages.extend(f"{note} [{c.agent_version}]" for note in c.schedule_notes)
+    messages.append(f"Planner: {len(candidates)} candidates in {elapsed:.2f}s.")
     # If memory exists, we might want to "modify" the plan to show it's working
-    msg = "Planner: Drafted initial structured itinerary."
     if "卢浮宫" in memory_context:
-         msg += " (Note: Checked organizational memory for Louvre opening hours)"
-    
+         messages[0] += " (Note: Checked organizational memory for Louvre opening hours)"
+
+    # The routed version's draft stays the thread's itinerary until the arbiter picks one
     return {
-        "itinerary": structured_plan,
-        "itinerary_raw": initial_itinerary_display,
-        "messages": [msg]
+        "candidates": candidates,
+        "itinerary": candidates[0].itinerary,
+        "itinerary_raw": candidates[0].itinerary_raw,
+        "messages": messages
     }
 
 async def auditor(state: AgentState):
     """
-    Auditor: Checks for logistical conflicts using concurrent API calls.
+    Auditor: Checks every candidate for logistical conflicts, all at once.
+    Legs and places shared by the candidates are looked up once, and only activities
+    and legs that changed since the previous audit of the thread are checked again.
     """
     print("--- Auditor Node (Concurrent) ---")
-    
-    plan = state.get("itinerary")
-    if not plan:
-        return {"errors": ["No itinerary found to audit."]}
 
-    errors = []
-    tasks = []
-    
-    # 1. Traffic Checks
-    for day in plan.daily_plans:
-        for i in range(len(day.activities) - 1):
-            tasks.append(
-                check_traffic_and_timing(
-                    day.activities[i],
-                    day.activities[i+1],
-                    day.date
-                )
-            )
-            
-    # 2. Opening Hours Checks
-    for day in plan.daily_plans:
-        for activity in day.activities:
-            tasks.append(check_opening_hours(activity, day.date))
-
-    # 3. Execute all tasks concurrently
-    if tasks:
-        results = await asyncio.gather(*tasks)
-        for res in results:
-            if res:
-                errors.extend(res)
-    
-    # Add random error for demo visual effect if none found (optional)
-    if not errors and random.random() < 0.2:
-         errors.append("Traffic Alert (Simulated): Giverny route has heavy construction delays.")
+    candidates = state_candidates(state)
+    if not candidates:
+        return {"errors": ["No itinerary found to audit."]}
 
-    # Generate feedback
-    feedback_msg = "Auditor: Logic check passed."
-    if errors:
-        feedback_msg = f"Auditor: Found {len(errors)} issues."
+    # Traffic (batched) and opening hours (precompiled weekly tables) for all candidates concurrently
+    started = perf_counter()
+    plans = [c.itinerary for c in candidates]
+    memo = dict(state.get("audit_memo") or {})
+    current = {key for plan in plans for day in plan.daily_plans for key in (*day.activity_keys(), *day.leg_keys())}
+    checked = len(current - memo.keys())
+    traffic, hours = await asyncio.gather(check_traffic_shared(plans, memo), check_opening_hours_shared(plans, memo))
+    elapsed = round(perf_counter() - started, 3)
+    # Keep the results of the current plans only, so the memo stays the size of the candidates
+    memo = {key: issues for key, issues in memo.items() if key in current}
+
+    audited, messages = [], []
+    for candidate, traffic_errors, hours_errors in zip(candidates, traffic, hours):
+        errors = traffic_errors + hours_errors
+        # Add random error for demo visual effect if none found (optional)
+        if not errors and random.random() < 0.2:
+             errors.append("Traffic Alert (Simulated): Giverny route has heavy construction delays.")
+        audited.append(candidate.model_copy(update={"errors": errors}))
+
+        # Generate feedback
+        feedback_msg = "Logic check passed." if not errors else f"Found {len(errors)} issues."
+        messages.append(f"Auditor ({candidate.agent_version}): {feedback_msg}")
+    messages.append(f"Auditor: {len(audited)} candidates audited together in {elapsed:.2f}s "
+                    f"({checked} of {len(current)} activity/leg checks run, the rest reused).")
 
     return {
-        "errors": errors,
-        "messages": [feedback_msg]
+        "candidates": audited,
+        "errors": audited[0].errors,
+        "audit_memo": memo,
+        "messages": messages
     }
 
-async def commercial_arbiter(state: AgentState):
+def pick_candidate(candidates: List[Candidate], weights: Tuple[float, float]) -> Tuple[int, np.ndarray]:
+    """
+    Index of the frontier candidate with the best weighted (aesthetic, profit) score,
+    both scaled to [0, 1] over the eligible candidates, and the frontier mask. Only
+    candidates without audit errors are eligible, unless every candidate has some.
+    Ties go to the earlier candidate (the routed version).
     """
-    Commercial Arbiter: Balances profit and aesthetics.
+    points = np.array([[c.aesthetic_score, c.profit_margin] for c in candidates], dtype=np.float64)
+    eligible = np.array([not c.errors for c in candidates])
+    if not eligible.any():
+        eligible[:] = True
+    on_frontier = np.zeros(len(candidates), dtype=bool)
+    on_frontier[eligible] = pareto_mask(points[eligible])
+    low, span = points[eligible].min(axis=0), np.ptp(points[eligible], axis=0)
+    scaled = (points - low) / np.where(span > 0, span, 1.0)
+    utility = np.where(on_frontier, scaled @ np.asarray(weights), -np.inf)
+    return int(np.argmax(utility)), on_frontier
+
+# Frontier of the plans priced so far in this process, keyed by thread_id (a re-priced thread replaces its plan)
+live_frontier = LiveFrontier()
+
+async def commercial_arbiter(state: AgentState, config: RunnableConfig):
+    """
+    Commercial Arbiter: Prices every candidate and picks one from their Pareto frontier,
+    trading profit against aesthetics with the routed version's weights.
     """
     print("--- Commercial Arbiter Node ---")
     await asyncio.sleep(0.5) # Simulate calculation
-    
+
+    candidates = state_candidates(state)
+    if not candidates:
+        return {"errors": ["No itinerary found to price."]}
+
     # Simulate profit/aesthetic calculation
-    base_profit = 15.0
-    base_aesthetic = 9.0
-    
-    if state.get("errors"):
-        base_profit -= 2.0 # Penalty for errors
-        base_aesthetic -= 1.0
-        
+    priced = []
+    for candidate in candidates:
+        profile = planner_profile(candidate.agent_version)
+        base_profit = profile.base_profit
+        base_aesthetic = profile.base_aesthetic
+        if candidate.errors:
+            base_profit -= 2.0 # Penalty for errors
+            base_aesthetic -= 1.0
+        priced.append(candidate.model_copy(update={"profit_margin": base_profit, "aesthetic_score": base_aesthetic}))
+
+    routed = planner_profile(state.get("agent_version") or priced[0].agent_version)
+    best, on_frontier = pick_candidate(priced, (routed.aesthetic_weight, routed.profit_weight))
+    priced = [c.model_copy(update={"on_frontier": bool(f)}) for c, f in zip(priced, on_frontier)]
+    chosen = priced[best]
+    excluded = "" if all(c.errors for c in priced) else " (excluded: audit issues)"
+
+    plan_id = config.get("configurable", {}).get("thread_id") or state.get("request_hash")
+    update = live_frontier.insert(plan_id, chosen.aesthetic_score, chosen.profit_margin)
+    if update.on_frontier:
+        frontier_msg = f"on the live Pareto frontier (evicted {len(update.evicted)} plans)"
+    else:
+        frontier_msg = f"dominated by plan {update.dominated_by}"
+
     return {
-        "profit_margin": base_profit,
-        "aesthetic_score": base_aesthetic,
-        "messages": [f"Arbiter: Calculated Profit Margin: {base_profit}%, Aesthetic Score: {base_aesthetic}"]
+        "candidates": priced,
+        "selected_version": chosen.agent_version,
+        "itinerary": chosen.itinerary,
+        "itinerary_raw": chosen.itinerary_raw,
+        "errors": chosen.errors,
+        "profit_margin": chosen.profit_margin,
+        "aesthetic_score": chosen.aesthetic_score,
+        "messages": [
+            *(f"Arbiter ({c.agent_version}): Profit {c.profit_margin}%, Aesthetic {c.aesthetic_score}"
+              f"{'' if c.on_frontier else excluded if c.errors else ' (dominated)'}" for c in priced),
+            f"Arbiter: Picked {chosen.agent_version} from {int(on_frontier.sum())} frontier candidates of {len(priced)}.",
+            f"Arbiter: Calculated Profit Margin: {chosen.profit_margin}%, Aesthetic Score: {chosen.aesthetic_score}",
+            f"Arbiter: Plan is {frontier_msg}."
+        ]
     }
 
 # --- Graph Construction ---
@@ -308,9 +712,12 @@ workflow.add_edge("auditor", "commercial_arbiter")
 workflow.add_edge("commercial_arbiter", END)
 
 # Setup SQLite Persistence
-# check_same_thread=False is needed for FastAPI async environment
-conn = sqlite3.connect("checkpoints.db", check_same_thread=False)
-memory = SqliteSaver(conn)
+# Async saver: pooled WAL readers + one batching writer, so FastAPI handlers never block the event loop.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")
+memory = PooledAsyncSqliteSaver(
+    CHECKPOINT_DB_PATH,
+    pool_size=int(os.getenv("CHECKPOINT_POOL_SIZE", "8"))
+)
 
 # Compile the graph with Checkpointer and Interrupt
 # We interrupt BEFORE commercial_arbiter to allow Human-in-the-loop approval
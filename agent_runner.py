@@ -0,0 +1,110 @@
+"""
+Background runner for agent graph runs started from synchronous code (the
+Streamlit dashboard).
+
+One daemon thread per process owns a long-lived asyncio event loop. Runs are
+submitted with asyncio.run_coroutine_threadsafe and come back as AgentRuns
+wrapping a concurrent Future, so the caller's thread never blocks on the graph
+(or on the nodes' asyncio.sleep calls) and never creates a loop of its own.
+Every dashboard session shares the loop, and with it the loop-bound resources
+of the graph (the pooled checkpoint saver, the Maps batcher).
+
+A run records its stream updates as they arrive; the script thread renders
+AgentRun.updates() whenever it polls, so progress shows up incrementally.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+Update = Tuple[str, Any]    # (node name, the node's state update)
+
+
+class AgentRun:
+    def __init__(self, thread_id: Optional[str], history: Optional[List[Update]] = None):
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.future: Optional[Future] = None
+        self._lock = threading.Lock()
+        self._updates: List[Update] = list(history or [])
+
+    def _record(self, node: str, data: Any):
+        with self._lock:
+            self._updates.append((node, data))
+
+    def updates(self, start: int = 0) -> List[Update]:
+        """Updates received so far (from index `start`), in stream order."""
+        with self._lock:
+            return self._updates[start:]
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self.future.exception() if self.done and not self.future.cancelled() else None
+
+    @property
+    def paused_before(self) -> Tuple[str, ...]:
+        """Nodes the graph is interrupted before (e.g. commercial_arbiter awaiting approval); () while running."""
+        if not self.done or self.future.cancelled() or self.future.exception() is not None:
+            return ()
+        return self.future.result()
+
+    def cancel(self) -> bool:
+        return self.future is not None and self.future.cancel()
+
+
+class AgentRunner:
+    def __init__(self, name: str = "agent-runner"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, name=name, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, graph, inputs: Optional[Dict[str, Any]], config: Optional[Dict[str, Any]] = None,
+               history: Optional[List[Update]] = None) -> AgentRun:
+        """
+        Stream `graph` on the runner's loop; inputs=None resumes the config's thread
+        (e.g. after an interrupt), `history` carries the updates of the run it continues.
+        Returns immediately.
+        """
+        run = AgentRun((config or {}).get("configurable", {}).get("thread_id"), history)
+
+        async def consume() -> Tuple[str, ...]:
+            async for event in graph.astream(inputs, config, stream_mode="updates"):
+                for node, data in event.items():
+                    run._record(node, data)
+            if getattr(graph, "checkpointer", None) is None:
+                return ()
+            state = await graph.aget_state(config)
+            return tuple(state.next)
+
+        run.future = asyncio.run_coroutine_threadsafe(consume(), self._loop)
+        return run
+
+    def shutdown(self, timeout: Optional[float] = 5.0):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+
+_runner: Optional[AgentRunner] = None
+_runner_lock = threading.Lock()
+
+
+def shared_runner() -> AgentRunner:
+    """The process-wide runner, started on first use."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AgentRunner()
+        return _runner
@@ -1,57 +1,114 @@
-import pandas as pd
-import numpy as np
-
-# Load Data
-df = pd.read_csv('travel_data_p2_routing.csv')
-
-print("=== P2 阶段：动态路由与算法反哺效果分析 ===\n")
-
-# 1. 整体指标概览
-total_plans = len(df)
-overall_conversion = df['is_converted'].mean()
-total_profit = df[df['is_converted']]['net_profit'].sum()
-avg_profit_per_plan = total_profit / total_plans
-
-print(f"总方案数: {total_plans}")
-print(f"整体转化率: {overall_conversion:.2%}")
-print(f"总实现利润: ${total_profit:,.2f}")
-print(f"单方案期望利润 (Earning Per Plan): ${avg_profit_per_plan:.2f}")
-
-# 2. 细分用户群体的路由效果
-print("\n--- 用户群体 x Agent 版本表现 ---")
-segment_stats = df.groupby(['user_segment', 'agent_version']).agg(
-    count=('plan_id', 'count'),
-    conversion_rate=('is_converted', 'mean'),
-    avg_profit_margin=('profit_margin', 'mean'),
-    avg_aesthetic=('aesthetic_score', 'mean'),
-    total_realized_profit=('net_profit', lambda x: x[df.loc[x.index, 'is_converted']].sum())
-).reset_index()
-
-# 计算各组的利润贡献占比
-segment_stats['profit_contribution'] = segment_stats['total_realized_profit'] / total_profit
-segment_stats['avg_profit_margin'] = (segment_stats['avg_profit_margin'] * 100).round(2)
-segment_stats['conversion_rate'] = (segment_stats['conversion_rate'] * 100).round(2)
-segment_stats['profit_contribution'] = (segment_stats['profit_contribution'] * 100).round(2)
-
-print(segment_stats.to_string())
-
-# 3. v3 版本改进验证 (对比 P1 的历史数据特征)
-# P1 v3: 转化率 ~23%, 审美 ~5.7, 利润率 ~36%
-v3_stats = df[df['agent_version'] == 'v3-profit-seeker-p2-patched']
-print("\n--- v3 (P2 Patched) 核心指标验证 ---")
-print(f"v3 P2 转化率: {v3_stats['is_converted'].mean():.2%} (目标: > 25%)")
-print(f"v3 P2 平均审美: {v3_stats['aesthetic_score'].mean():.2f} (目标: > 6.0)")
-print(f"v3 P2 平均利润率: {v3_stats['profit_margin'].mean():.2%} (目标: 保持在 25% 以上)")
-
-# 4. 结论生成
-print("\n=== 决策验证结论 ===")
-if v3_stats['is_converted'].mean() > 0.25 and v3_stats['aesthetic_score'].mean() > 6.0:
-    print("✅ 算法反哺成功：v3 在保持高利润的同时，通过提升审美底线显著改善了转化率。")
-else:
-    print("⚠️ 警告：v3 改进效果未达预期，需进一步调整惩罚权重。")
-
-high_worth_v2 = df[(df['user_segment'] == 'high_net_worth') & (df['agent_version'] == 'v2-aesthetic-first')]
-if high_worth_v2['is_converted'].mean() > 0.4:
-    print("✅ 动态路由成功：高净值用户在 v2 版本下表现出极高的转化意愿。")
-else:
-    print("⚠️ 警告：高净值用户对 v2 的响应不如预期，请检查价格弹性。")
+import sys
+
+from plan_metrics import COLUMNS, aggregate, finalize, rollup, routing_shares
+from plan_stats import bootstrap, permutation_test
+from plan_store import load_plans
+from streaming_analytics import SampleSpec, stream_analyze
+from routing_policy import load_policy
+
+SEED = 42       # bootstrap / 置换检验的随机种子，保证报告可复现
+SAMPLE_ROWS = 50_000    # --stream: 每个 segment x version 格子保留的样本数上限
+CI_FORMATS = {'conversion_rate': '{:.2%}', 'avg_profit_margin': '{:.2%}', 'expected_profit_per_plan': '${:.2f}'}
+
+def main(stream: bool = False):
+    # 所有分组指标一次聚合得到，下面的视图都由这张小表汇总
+    # --stream: 分块 + 多进程读取，内存与日志大小无关
+    # 检验所需的明细在 --stream 模式下来自每格至多 SAMPLE_ROWS 条的均匀随机样本
+    samples = {}
+    if stream:
+        result = stream_analyze(['p2'], sample=SampleSpec(SAMPLE_ROWS, seed=SEED))
+        df, sums, samples['p2'] = None, result.sums, result.sample
+    else:
+        df = load_plans('p2', columns=COLUMNS)
+        sums = aggregate(df)
+
+    def cell(phase, **equals):
+        """某一阶段中满足 equals 的方案明细；--stream 模式下为该阶段的随机样本"""
+        if not stream:
+            return load_plans(phase, columns=COLUMNS, filters=[(c, '==', v) for c, v in equals.items()])
+        if phase not in samples:
+            samples[phase] = stream_analyze([phase], sample=SampleSpec(SAMPLE_ROWS, seed=SEED)).sample
+        rows = samples[phase]
+        for column, value in equals.items():
+            rows = rows[rows[column] == value]
+        return rows
+
+    segment_stats = finalize(sums)
+    overall = finalize(rollup(sums)).iloc[0]
+
+    print("=== P2 阶段：动态路由与算法反哺效果分析 ===\n")
+
+    # 1. 整体指标概览
+    total_plans = int(overall['count'])
+    total_profit = overall['total_realized_profit']
+
+    print(f"总方案数: {total_plans}")
+    print(f"整体转化率: {overall['conversion_rate']:.2%}")
+    print(f"总实现利润: ${total_profit:,.2f}")
+    print(f"单方案期望利润 (Earning Per Plan): ${overall['expected_profit_per_plan']:.2f}")
+
+    # 2. 细分用户群体的路由效果
+    print("\n--- 用户群体 x Agent 版本表现 ---")
+    report = segment_stats[['user_segment', 'agent_version', 'count', 'conversion_rate', 'avg_profit_margin',
+                            'avg_aesthetic', 'total_realized_profit', 'profit_contribution', 'expected_profit_per_plan']].copy()
+    report['avg_profit_margin'] = (report['avg_profit_margin'] * 100).round(2)
+    report['conversion_rate'] = (report['conversion_rate'] * 100).round(2)
+    report['profit_contribution'] = (report['profit_contribution'] * 100).round(2)
+    report['expected_profit_per_plan'] = report['expected_profit_per_plan'].round(2)
+
+    print(report.to_string())
+
+    if df is not None:
+        # 每个格子的 95% bootstrap 置信区间 (--stream 模式不保留明细，跳过)
+        print("\n--- 95% 置信区间 (bootstrap) ---")
+        print(bootstrap(df, seed=SEED).interval_table(CI_FORMATS).to_string())
+
+    # 路由策略一致性：实际分流占比 vs routing_policies.json 中的 p2-routing
+    policy = load_policy('p2-routing')
+    routing_check = routing_shares(segment_stats, policy)
+    print(f"\n--- 路由策略一致性 ({policy.name} v{policy.version}) ---")
+    print(routing_check.to_string())
+    print(f"最大偏差: {(routing_check['observed'] - routing_check['policy']).abs().max():.2f} 个百分点")
+
+    # 3. v3 版本改进验证：目标值看 95% 置信区间，与 P1 的 v3 做置换检验
+    v3_metrics = ['conversion_rate', 'avg_aesthetic', 'avg_profit_margin']
+    v3_p2 = cell('p2', agent_version='v3-profit-seeker-p2-patched')
+    v3_p1 = cell('p1', agent_version='v3-profit-seeker')
+    v3_ci = bootstrap(v3_p2, by=(), metrics=v3_metrics, seed=SEED)
+    v3_test = permutation_test(v3_p2, v3_p1, metrics=v3_metrics, seed=SEED).set_index('metric')
+    conversion, conversion_low, conversion_high = v3_ci.interval('conversion_rate')
+    aesthetic, aesthetic_low, aesthetic_high = v3_ci.interval('avg_aesthetic')
+    margin, margin_low, margin_high = v3_ci.interval('avg_profit_margin')
+    print("\n--- v3 (P2 Patched) 核心指标验证 ---")
+    if stream:
+        print(f"(--stream: 区间与置换检验基于每格至多 {SAMPLE_ROWS} 条的随机样本)")
+    print(f"v3 P2 转化率: {conversion:.2%} [{conversion_low:.2%}, {conversion_high:.2%}] (目标: > 25%; "
+          f"P1: {v3_test.loc['conversion_rate', 'b']:.2%}, p = {v3_test.loc['conversion_rate', 'p_value']:.3f})")
+    print(f"v3 P2 平均审美: {aesthetic:.2f} [{aesthetic_low:.2f}, {aesthetic_high:.2f}] (目标: > 6.0; "
+          f"P1: {v3_test.loc['avg_aesthetic', 'b']:.2f}, p = {v3_test.loc['avg_aesthetic', 'p_value']:.3f})")
+    print(f"v3 P2 平均利润率: {margin:.2%} [{margin_low:.2%}, {margin_high:.2%}] (目标: 保持在 25% 以上; "
+          f"P1: {v3_test.loc['avg_profit_margin', 'b']:.2%}, p = {v3_test.loc['avg_profit_margin', 'p_value']:.3f})")
+
+    # 4. 结论生成：区间下限越过目标才算达成，点估计达标而区间覆盖目标视为样本不足
+    print("\n=== 决策验证结论 ===")
+    if conversion_low > 0.25 and aesthetic_low > 6.0:
+        print("✅ 算法反哺成功：v3 在保持高利润的同时，通过提升审美底线显著改善了转化率。")
+    elif conversion > 0.25 and aesthetic > 6.0:
+        print("⚠️ 警告：v3 点估计达标，但 95% 置信区间仍覆盖目标值，需继续积累样本。")
+    else:
+        print("⚠️ 警告：v3 改进效果未达预期，需进一步调整惩罚权重。")
+
+    high_worth_v2 = cell('p2', user_segment='high_net_worth', agent_version='v2-aesthetic-first')
+    hnw_conversion, hnw_low, hnw_high = bootstrap(high_worth_v2, by=(), metrics=['conversion_rate'],
+                                                  seed=SEED).interval('conversion_rate')
+    print(f"高净值 x v2 转化率: {hnw_conversion:.2%} [{hnw_low:.2%}, {hnw_high:.2%}] (目标: > 40%)")
+    if hnw_low > 0.4:
+        print("✅ 动态路由成功：高净值用户在 v2 版本下表现出极高的转化意愿。")
+    elif hnw_conversion > 0.4:
+        print("⚠️ 警告：高净值用户对 v2 的转化率点估计达标，但置信区间仍覆盖 40%。")
+    else:
+        print("⚠️ 警告：高净值用户对 v2 的响应不如预期，请检查价格弹性。")
+
+
+if __name__ == "__main__":
+    main(stream="--stream" in sys.argv)
@@ -1,66 +1,122 @@
-import pandas as pd
-import numpy as np
-
-# Load Data
-df = pd.read_csv('travel_data_p3_refined.csv')
-
-print("=== P3 阶段：阶梯惩罚与 v2 扩量效果验证 ===\n")
-
-# 1. 整体指标概览
-total_plans = len(df)
-overall_conversion = df['is_converted'].mean()
-total_profit = df[df['is_converted']]['net_profit'].sum()
-avg_profit_per_plan = total_profit / total_plans
-
-print(f"总方案数: {total_plans}")
-print(f"整体转化率: {overall_conversion:.2%}")
-print(f"总实现利润: ${total_profit:,.2f}")
-print(f"单方案期望利润 (Earning Per Plan): ${avg_profit_per_plan:.2f}")
-
-# 2. 细分用户群体的路由效果
-print("\n--- 用户群体 x Agent 版本表现 ---")
-segment_stats = df.groupby(['user_segment', 'agent_version']).agg(
-    count=('plan_id', 'count'),
-    conversion_rate=('is_converted', 'mean'),
-    avg_profit_margin=('profit_margin', 'mean'),
-    avg_aesthetic=('aesthetic_score', 'mean'),
-    total_realized_profit=('net_profit', lambda x: x[df.loc[x.index, 'is_converted']].sum())
-).reset_index()
-
-# 格式化
-segment_stats['profit_contribution'] = (segment_stats['total_realized_profit'] / total_profit * 100).round(2)
-segment_stats['avg_profit_margin'] = (segment_stats['avg_profit_margin'] * 100).round(2)
-segment_stats['conversion_rate'] = (segment_stats['conversion_rate'] * 100).round(2)
-segment_stats['avg_aesthetic'] = segment_stats['avg_aesthetic'].round(2)
-
-print(segment_stats.to_string())
-
-# 3. 验证 v2 在 Standard 用户中的扩量效果
-standard_v2 = df[(df['user_segment'] == 'standard') & (df['agent_version'] == 'v2-aesthetic-first')]
-standard_v1 = df[(df['user_segment'] == 'standard') & (df['agent_version'] == 'v1-balanced')]
-
-print("\n--- 重点验证 1: Standard 用户扩量 v2 效果 ---")
-print(f"Standard - v2 样本数: {len(standard_v2)} (P2 约 25% -> P3 目标 45%)")
-print(f"Standard - v2 转化率: {standard_v2['is_converted'].mean():.2%} (对比 v1: {standard_v1['is_converted'].mean():.2%})")
-v2_profit = standard_v2[standard_v2['is_converted']]['net_profit'].sum()
-v2_epp = v2_profit / len(standard_v2) if len(standard_v2) > 0 else 0
-v1_profit = standard_v1[standard_v1['is_converted']]['net_profit'].sum()
-v1_epp = v1_profit / len(standard_v1) if len(standard_v1) > 0 else 0
-print(f"Standard - v2 单方案期望利润: ${v2_epp:.2f} vs v1: ${v1_epp:.2f}")
-
-if v2_epp > v1_epp:
-    print("✅ 结论：扩量 v2 是正确的，虽然利润率低，但高转化带来了更高的期望收益。")
-else:
-    print("⚠️ 结论：v2 扩量并未带来更高的期望收益，需权衡品牌价值与短期利润。")
-
-# 4. 验证 v3 阶梯惩罚效果
-v3_stats = df[df['agent_version'] == 'v3-profit-seeker-p3-tiered']
-print("\n--- 重点验证 2: v3 阶梯惩罚效果 ---")
-print(f"v3 P3 转化率: {v3_stats['is_converted'].mean():.2%} (P2: ~23.5%)")
-print(f"v3 P3 平均审美: {v3_stats['aesthetic_score'].mean():.2f} (P2: ~6.48)")
-print(f"v3 P3 平均利润率: {v3_stats['profit_margin'].mean():.2%} (P2: ~24.4%)")
-
-if v3_stats['is_converted'].mean() > 0.24 and v3_stats['profit_margin'].mean() > 0.24:
-    print("✅ 结论：阶梯惩罚奏效！v3 成功实现了“软着陆”，在维持利润的同时提升了转化。")
-else:
-    print("⚠️ 结论：v3 指标仍需观察。")
+import sys
+
+from plan_metrics import COLUMNS, aggregate, finalize, lookup, rollup, routing_shares
+from plan_stats import bootstrap, permutation_test
+from plan_store import load_plans
+from streaming_analytics import SampleSpec, stream_analyze
+from routing_policy import load_policy
+
+ALPHA = 0.05    # 显著性水平
+SEED = 42       # bootstrap / 置换检验的随机种子，保证报告可复现
+SAMPLE_ROWS = 50_000    # --stream: 每个 segment x version 格子保留的样本数上限
+CI_FORMATS = {'conversion_rate': '{:.2%}', 'avg_profit_margin': '{:.2%}', 'expected_profit_per_plan': '${:.2f}'}
+
+def main(stream: bool = False):
+    # 所有分组指标一次聚合得到，下面的视图都由这张小表汇总
+    # --stream: 分块 + 多进程读取，内存与日志大小无关
+    # 检验所需的明细在 --stream 模式下来自每格至多 SAMPLE_ROWS 条的均匀随机样本
+    samples = {}
+    if stream:
+        result = stream_analyze(['p3'], sample=SampleSpec(SAMPLE_ROWS, seed=SEED))
+        df, sums, samples['p3'] = None, result.sums, result.sample
+    else:
+        df = load_plans('p3', columns=COLUMNS)
+        sums = aggregate(df)
+
+    def cell(phase, **equals):
+        """某一阶段中满足 equals 的方案明细；--stream 模式下为该阶段的随机样本"""
+        if not stream:
+            return load_plans(phase, columns=COLUMNS, filters=[(c, '==', v) for c, v in equals.items()])
+        if phase not in samples:
+            samples[phase] = stream_analyze([phase], sample=SampleSpec(SAMPLE_ROWS, seed=SEED)).sample
+        rows = samples[phase]
+        for column, value in equals.items():
+            rows = rows[rows[column] == value]
+        return rows
+
+    segment_stats = finalize(sums)
+    overall = finalize(rollup(sums)).iloc[0]
+
+    print("=== P3 阶段：阶梯惩罚与 v2 扩量效果验证 ===\n")
+
+    # 1. 整体指标概览
+    total_plans = int(overall['count'])
+    total_profit = overall['total_realized_profit']
+
+    print(f"总方案数: {total_plans}")
+    print(f"整体转化率: {overall['conversion_rate']:.2%}")
+    print(f"总实现利润: ${total_profit:,.2f}")
+    print(f"单方案期望利润 (Earning Per Plan): ${overall['expected_profit_per_plan']:.2f}")
+
+    # 2. 细分用户群体的路由效果
+    print("\n--- 用户群体 x Agent 版本表现 ---")
+    report = segment_stats[['user_segment', 'agent_version', 'count', 'conversion_rate', 'avg_profit_margin',
+                            'avg_aesthetic', 'total_realized_profit', 'profit_contribution', 'expected_profit_per_plan']].copy()
+    report['avg_profit_margin'] = (report['avg_profit_margin'] * 100).round(2)
+    report['conversion_rate'] = (report['conversion_rate'] * 100).round(2)
+    report['profit_contribution'] = (report['profit_contribution'] * 100).round(2)
+    report['avg_aesthetic'] = report['avg_aesthetic'].round(2)
+    report['expected_profit_per_plan'] = report['expected_profit_per_plan'].round(2)
+
+    print(report.to_string())
+
+    if df is not None:
+        # 每个格子的 95% bootstrap 置信区间 (--stream 模式不保留明细，跳过)
+        print("\n--- 95% 置信区间 (bootstrap) ---")
+        print(bootstrap(df, seed=SEED).interval_table(CI_FORMATS).to_string())
+
+    # 路由策略一致性：实际分流占比 vs routing_policies.json 中的 p3-refined
+    policy = load_policy('p3-refined')
+    routing_check = routing_shares(segment_stats, policy)
+    print(f"\n--- 路由策略一致性 ({policy.name} v{policy.version}) ---")
+    print(routing_check.to_string())
+    print(f"最大偏差: {(routing_check['observed'] - routing_check['policy']).abs().max():.2f} 个百分点")
+
+    # 3. 验证 v2 在 Standard 用户中的扩量效果
+    standard_v2 = lookup(segment_stats, user_segment='standard', agent_version='v2-aesthetic-first')
+    standard_v1 = lookup(segment_stats, user_segment='standard', agent_version='v1-balanced')
+
+    print("\n--- 重点验证 1: Standard 用户扩量 v2 效果 ---")
+    print(f"Standard - v2 样本数: {int(standard_v2['count'])} (P2 约 25% -> P3 目标 45%)")
+    print(f"Standard - v2 转化率: {standard_v2['conversion_rate']:.2%} (对比 v1: {standard_v1['conversion_rate']:.2%})")
+    v2_epp = standard_v2['expected_profit_per_plan']
+    v1_epp = standard_v1['expected_profit_per_plan']
+    # 置换检验只需要这两个格子的明细，过滤条件下推到 plan store
+    epp_test = permutation_test(cell('p3', user_segment='standard', agent_version='v2-aesthetic-first'),
+                                cell('p3', user_segment='standard', agent_version='v1-balanced'),
+                                metrics=['expected_profit_per_plan'], seed=SEED).iloc[0]
+    if stream:
+        print(f"(--stream: 置换检验基于每格至多 {SAMPLE_ROWS} 条的随机样本)")
+    print(f"Standard - v2 单方案期望利润: ${v2_epp:.2f} vs v1: ${v1_epp:.2f} (置换检验 p = {epp_test['p_value']:.3f})")
+
+    if v2_epp > v1_epp and epp_test['p_value'] < ALPHA:
+        print("✅ 结论：扩量 v2 是正确的，虽然利润率低，但高转化带来了更高的期望收益。")
+    elif v2_epp > v1_epp:
+        print(f"⚠️ 结论：v2 期望收益略高，但差异不显著 (p ≥ {ALPHA})，需继续积累样本。")
+    else:
+        print("⚠️ 结论：v2 扩量并未带来更高的期望收益，需权衡品牌价值与短期利润。")
+
+    # 4. 验证 v3 阶梯惩罚效果
+    # 与 P2 的 v3 (固定惩罚) 逐项做置换检验，代替固定阈值
+    v3_p3 = cell('p3', agent_version='v3-profit-seeker-p3-tiered')
+    v3_p2 = cell('p2', agent_version='v3-profit-seeker-p2-patched')
+    v3_test = permutation_test(v3_p3, v3_p2, metrics=['conversion_rate', 'avg_aesthetic', 'avg_profit_margin'],
+                               seed=SEED).set_index('metric')
+    conversion, aesthetic, margin = (v3_test.loc[m] for m in ['conversion_rate', 'avg_aesthetic', 'avg_profit_margin'])
+    print("\n--- 重点验证 2: v3 阶梯惩罚效果 ---")
+    if stream:
+        print(f"(--stream: 置换检验基于每格至多 {SAMPLE_ROWS} 条的随机样本)")
+    print(f"v3 P3 转化率: {conversion['a']:.2%} (P2: {conversion['b']:.2%}, p = {conversion['p_value']:.3f})")
+    print(f"v3 P3 平均审美: {aesthetic['a']:.2f} (P2: {aesthetic['b']:.2f}, p = {aesthetic['p_value']:.3f})")
+    print(f"v3 P3 平均利润率: {margin['a']:.2%} (P2: {margin['b']:.2%}, p = {margin['p_value']:.3f})")
+
+    conversion_up = conversion['difference'] > 0 and conversion['p_value'] < ALPHA
+    margin_down = margin['difference'] < 0 and margin['p_value'] < ALPHA
+    if conversion_up and not margin_down:
+        print("✅ 结论：阶梯惩罚奏效！v3 成功实现了“软着陆”，在维持利润的同时提升了转化。")
+    else:
+        print("⚠️ 结论：v3 指标仍需观察。")
+
+
+if __name__ == "__main__":
+    main(stream="--stream" in sys.argv)
@@ -3,25 +3,35 @@ import folium
 from streamlit_folium import st_folium
 import os
 from dotenv import load_dotenv
-import googlemaps
 import time
+from maps_client import shared_maps_client, run_sync
 
 # 1. 初始化
 load_dotenv(".env.local")
-gmaps = googlemaps.Client(key=os.getenv("GOOGLE_MAPS_API_KEY"))
+# 进程内共享的异步客户端 (连接池 + 限流)，Streamlit 每次重跑脚本都复用同一个
+gmaps = shared_maps_client(os.getenv("GOOGLE_MAPS_API_KEY"))
 
 st.set_page_config(page_title="AI 航海家", layout="wide")
 st.title("📍 实时路径可视化系统")
 
-# 模拟获取景点的经纬度 (实际开发中调用 gmaps.geocode)
+# 获取景点的经纬度：常用景点用固定坐标，其余调用 geocode
 def get_coordinates(place_name):
-    # 这里为了演示，给几个固定坐标，实际请用 gmaps.geocode(place_name)
     coords = {
         "卢浮宫": [48.8606, 2.3376],
         "埃菲尔铁塔": [48.8584, 2.2945],
         "巴黎圣母院": [48.8530, 2.3499]
     }
-    return coords.get(place_name, [48.8566, 2.3522]) # 找不到就返回巴黎市中心
+    if place_name in coords:
+        return coords[place_name]
+    if gmaps:
+        try:
+            results = run_sync(gmaps.geocode(place_name), timeout=15)
+            if results:
+                location = results[0]["geometry"]["location"]
+                return [location["lat"], location["lng"]]
+        except Exception as e:
+            st.warning(f"地理编码失败: {e}")
+    return [48.8566, 2.3522] # 找不到就返回巴黎市中心
 
 # --- 侧边栏：行程输入 ---
 with st.sidebar:
@@ -1,13 +1,19 @@
-import json
+import os
+import hashlib
 import asyncio
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional
 
 # Import our graph
-from agent_graph import graph_app, AgentState
+from agent_graph import graph_app, AgentState, memory, CHECKPOINT_DB_PATH, travel_time_cache, traffic_batcher
+from checkpoint_compaction import CheckpointCompactor
+from event_bus import InMemoryEventBus
+from run_registry import RunRegistry
+from sse_encoding import EventEncoder
+from sse_protocol import DeltaWriter, StepRecord
 
 app = FastAPI(title="Omni Travel Guide API")
 
@@ -20,91 +26,217 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Keeps checkpoints.db bounded: latest N checkpoints per thread, idle threads expire
+compactor = CheckpointCompactor(
+    CHECKPOINT_DB_PATH,
+    keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "20")),
+    ttl_hours=float(os.getenv("CHECKPOINT_TTL_HOURS", "72"))
+)
+
+# Node updates of resumed runs, keyed by thread_id. Replace with another
+# event_bus.EventBus implementation when running several workers.
+event_bus = InMemoryEventBus()
+# Graph runs in the background, shared by every connection of a thread
+runs = RunRegistry(event_bus)
+
+@app.on_event("startup")
+async def start_compaction():
+    interval = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "600"))
+    app.state.compaction_task = asyncio.create_task(compactor.run_periodically(interval))
+
+@app.on_event("shutdown")
+async def close_checkpointer():
+    app.state.compaction_task.cancel()
+    runs.cancel_all()
+    # Flush batched checkpoint writes before the process exits
+    await memory.aclose()
+
 @app.get("/")
 async def root():
     return {"message": "Omni Travel Guide API is running"}
 
+@app.get("/stats/travel-time-cache")
+async def travel_time_cache_stats():
+    """
+    Hit/miss counters of the travel-time cache, plus Maps API usage of the batched auditor.
+    """
+    # stats() counts the SQLite rows; keep it off the event loop
+    stats = {"cache": await asyncio.to_thread(travel_time_cache.stats)}
+    if traffic_batcher:
+        stats["maps_api"] = dict(traffic_batcher.stats)
+    return stats
+
+@app.get("/stats/checkpoints")
+async def checkpoint_stats():
+    """
+    Database size and per-thread checkpoint counts.
+    """
+    return await compactor.report()
+
+# orjson + cached Pydantic serialization; records shared by several tabs are encoded once
+encoder = EventEncoder()
+
+async def run_records(inputs, config) -> AsyncGenerator[StepRecord, None]:
+    """
+    Run the graph and turn it into StepRecords: one per checkpoint (with the
+    output of the node that produced it and the full state), then an
+    interrupt or EOF record. The interrupt is read from the update stream
+    itself, so no extra state fetch is needed.
+    """
+    previous, pending, seq = None, None, -1
+    try:
+        # "updates" yields each node's output, e.g. {'planner': {'itinerary': ..., ...}},
+        # and {'__interrupt__': ...} when paused; "checkpoints" yields the state saved after it
+        async for mode, event in graph_app.astream(inputs, config=config, stream_mode=["updates", "checkpoints"]):
+            if mode == "updates":
+                if "__interrupt__" in event:
+                    yield StepRecord("interrupt", seq)
+                    return
+                pending = next(iter(event.items()))
+                continue
+            seq = event["metadata"]["step"]
+            if pending is None and previous is not None:
+                pending = ("__start__", None) # The run's inputs were applied
+            node, data = pending or (None, None)
+            previous = StepRecord.state(seq, event["values"], event["next"], previous, node, data)
+            pending = None
+            yield previous
+    except Exception as e:
+        print(f"Run of {config['configurable']['thread_id']} failed: {e}")
+        yield StepRecord("error", seq, data=str(e))
+    yield StepRecord("eof", seq)
+
+DEFAULT_USER_REQUEST = "我想去巴黎看日落，注重审美，不差钱"
+# Checkpoints scanned when replaying a thread (a run writes about five)
+REPLAY_HISTORY_LIMIT = 50
+
+def request_hash(user_request: str) -> str:
+    return hashlib.sha256(user_request.encode("utf-8")).hexdigest()[:16]
+
+async def history_records(config, after_seq: Optional[int] = None) -> List[StepRecord]:
+    """
+    Records rebuilt from the checkpoint history: each checkpoint holds the
+    results of the node that ran from it. Covers the thread's latest run, or
+    everything after `after_seq` (Last-Event-ID). Ends with an interrupt
+    record if the run is paused, EOF otherwise.
+    """
+    snapshots = []
+    async for snapshot in graph_app.aget_state_history(config, limit=REPLAY_HISTORY_LIMIT):
+        snapshots.append(snapshot)
+        if after_seq is not None and snapshot.metadata.get("step", -1) <= after_seq:
+            break # The client's base
+        if after_seq is None and snapshot.metadata.get("source") == "input":
+            break # Start of the run
+    snapshots.reverse()
+
+    records, previous = [], None
+    for i, snapshot in enumerate(snapshots):
+        node, data = None, None
+        if i > 0:
+            for task in snapshots[i - 1].tasks:
+                if task.result is not None:
+                    node, data = task.name, task.result
+        previous = StepRecord.state(snapshot.metadata.get("step", -1), snapshot.values, snapshot.next,
+                                    previous, node, data)
+        records.append(previous)
+
+    latest = snapshots[-1] if snapshots else None
+    paused = latest is not None and latest.next and all(task.result is None for task in latest.tasks)
+    records.append(StepRecord("interrupt" if paused else "eof", previous.seq if previous else -1))
+    return records
+
 @app.get("/stream-trip/{user_id}")
-async def stream_trip_planning(user_id: str, request: Request):
+async def stream_trip_planning(user_id: str, request: Request, user_request: Optional[str] = None,
+                               protocol: int = 1, last_event_id: Optional[int] = None):
     """
     Stream the trip planning process using Server-Sent Events (SSE).
+
+    - a run of this thread is in progress: attach to it (events so far, then live)
+    - the thread already has a result: replay it from the checkpoint
+    - a new run starts only for a new thread, or when `user_request` is given
+      and its hash differs from the one the thread was planned for
+
+    protocol=1 sends node outputs; protocol=2 sends versioned state deltas
+    (see sse_protocol.py) and resumes from the Last-Event-ID header (or the
+    last_event_id parameter) by replaying only the missing deltas.
+
+    The connection stays open across the approval interrupt: updates of the
+    resumed run are received from the event bus.
     """
-    async def event_generator() -> AsyncGenerator[str, None]:
-        # Config with thread_id for persistence
-        config = {"configurable": {"thread_id": user_id}}
-        
-        # Initial state
-        # Only initialize if it's a new thread or we want to restart
-        # But for this demo, we assume every GET request is a "new run" or "resume" if state exists?
-        # LangGraph with SqliteSaver will load existing state if thread_id matches.
-        # We should only provide inputs if we are starting fresh or updating.
-        
-        # Check if state exists
-        current_state = graph_app.get_state(config)
-        
-        if not current_state.values:
-            # New conversation
+    # Config with thread_id for persistence
+    config = {"configurable": {"thread_id": user_id}}
+    requested = request_hash(user_request) if user_request is not None else None
+    header_id = request.headers.get("last-event-id", "")
+    if protocol >= 2 and last_event_id is None and header_id.lstrip("-").isdigit():
+        last_event_id = int(header_id)
+    writer = DeltaWriter(last_event_id) if protocol >= 2 else None
+
+    run = runs.active(user_id)
+    # Resumes (request_hash None) are never preempted
+    attach = run is not None and (requested is None or run.request_hash in (None, requested))
+    if not attach:
+        current_state = await graph_app.aget_state(config)
+        stored = current_state.values.get("request_hash") if current_state.values else None
+        # A concurrent request (another tab, a reconnect) may have started a run while the state was read
+        latest = runs.active(user_id)
+        if latest is not None and latest is not run and (requested is None or latest.request_hash in (None, requested)):
+            run = latest
+        elif run is not None or not current_state.values or requested not in (None, stored):
+            # New conversation, or a different request for this thread (else the result is replayed)
+            user_request = user_request or DEFAULT_USER_REQUEST
             inputs = {
                 "user_id": user_id,
-                "user_request": "我想去巴黎看日落，注重审美，不差钱",
-                "iteration_count": 0,
-                "errors": [],
-                "messages": []
-            }
-        else:
-            # Resuming or re-running (but usually we don't want to re-run from scratch if state exists)
-            # If we want to force a new run, we'd need to update configuration or inputs.
-            # For this demo, let's assume if we call stream-trip, we might want to send a new request
-            # OR just view the current progress.
-            # Let's simple pass None to inputs if we just want to "view" or "resume".
-            # BUT, if the user wants to start a NEW plan with the same thread_id, we pass inputs.
-            # Let's assume for now we always start/restart the flow for the demo purpose.
-             inputs = {
-                "user_id": user_id,
-                "user_request": "我想去巴黎看日落，注重审美，不差钱",
+                "user_request": user_request,
+                "request_hash": request_hash(user_request),
                 "iteration_count": 0,
+                # Audit verdicts are reused within a run only; a new run re-checks (through the travel-time cache's TTL)
+                "audit_memo": {},
                 "errors": [],
                 "messages": []
             }
+            # Pass config to enable checkpointing
+            run = runs.start(user_id, run_records(inputs, config), inputs["request_hash"])
 
-        # Use graph_app.astream to listen to node updates
-        # stream_mode="updates" yields the output of each node after it finishes
-        # Pass config to enable checkpointing
-        async for event in graph_app.astream(inputs, config=config, stream_mode="updates"):
-            # Check for client disconnection
-            if await request.is_disconnected():
-                print(f"Client {user_id} disconnected.")
-                break
-
-            # The event is a dictionary where key is node name and value is the output
-            # e.g., {'planner': {'itinerary': [...], ...}}
-            node_name = list(event.keys())[0]
-            node_data = event[node_name]
-
-            # Construct payload for UI
-            payload = {
-                "node": node_name,
-                "status": "completed", # Node finished
-                "data": node_data,
-                "timestamp": str(asyncio.get_event_loop().time())
-            }
+    def frames(events) -> List[bytes]:
+        return [encoder.sse(payload, event_id) for payload, event_id in events]
 
-            # Send as SSE event
-            yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
-            
-        # Check if we are interrupted (waiting for human approval)
-        state = graph_app.get_state(config)
-        if state.next:
-            payload = {
-                "node": "human_interrupt",
-                "status": "waiting",
-                "data": {"message": "Waiting for commercial approval..."},
-                "timestamp": str(asyncio.get_event_loop().time())
-            }
-            yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    def legacy_frames(record: StepRecord) -> List[bytes]:
+        payload = record.legacy_payload()
+        return [encoder.sse(payload)] if payload is not None else []
+
+    async def event_generator() -> AsyncGenerator[bytes, None]:
+        # Subscribed only once the response is iterated, so an unread response leaks nothing
+        if run is not None:
+            subscription, replay = runs.attach(run)
         else:
-            # Send a final 'done' event if finished
-            yield f"data: {json.dumps({'node': 'EOF', 'status': 'done'}, ensure_ascii=False)}\n\n"
+            subscription, replay = event_bus.subscribe(user_id), None
+        async with subscription:
+            if replay is None:
+                replay = await history_records(config, last_event_id if writer else None)
+            if writer is not None:
+                for frame in frames(writer.replay(replay)):
+                    yield frame
+            else:
+                for record in replay:
+                    for frame in legacy_frames(record):
+                        yield frame
+
+            # Live events until the run ends; an interrupt keeps the
+            # connection open for the run resumed by /approve-trip
+            waiting = not replay or replay[-1].kind != "eof"
+            while waiting:
+                record = await subscription.get(timeout=15)
+                # Check for client disconnection (the run itself keeps going)
+                if await request.is_disconnected():
+                    print(f"Client {user_id} disconnected.")
+                    return
+                if record is None:
+                    # SSE comment, keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                for frame in (frames(writer.events(record)) if writer is not None else legacy_frames(record)):
+                    yield frame
+                waiting = record.kind != "eof"
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -112,40 +244,29 @@ async def stream_trip_planning(user_id: str, request: Request):
 async def approve_trip(user_id: str):
     """
     Resume the graph execution after human approval.
+
+    With an SSE connection of this thread open, returns immediately: the
+    remaining nodes run in the background and their updates are published on
+    the event bus, so the stream (still open at the interrupt) receives them,
+    and final_state is null. With nobody streaming, waits for the resumed run
+    and returns its final_state, as before the event bus.
     """
+    if runs.active(user_id) is not None:
+        return {"status": "already_running", "final_state": None}
+
     config = {"configurable": {"thread_id": user_id}}
-    
-    # Just passing None as input to resume
-    # In LangGraph, passing None to astream when interrupted resumes execution
-    # But here we can't easily stream the response back in a POST request if we want to keep the SSE connection separate.
-    # Typically, the frontend would receive the "human_interrupt" event, show a button, 
-    # and when clicked, call this POST endpoint.
-    # This endpoint should trigger the graph to continue. 
-    # However, since the SSE connection might be closed or waiting, we need a way to push updates.
-    # For this demo, we'll just return a success message, and the Frontend can RE-CONNECT to the stream 
-    # or we can assume the graph state is updated and the next stream call will pick it up.
-    
-    # Actually, a better pattern for SSE + Interrupt is:
-    # 1. SSE stream pauses at interrupt.
-    # 2. UI calls POST /approve.
-    # 3. POST /approve runs the next step(s) and updates state.
-    # 4. BUT, to stream the *result* of the approval back to the UI, 
-    #    the UI usually needs to keep listening or reconnect.
-    
-    # Let's execute the remainder of the graph here and return the final result, 
-    # OR just return "Approved" and let the user re-trigger the stream?
-    
-    # Simplified approach for this demo:
-    # The POST request will run the rest of the graph and return the final state.
-    # Real-time updates for this part won't go through the *original* SSE connection unless we use a pub/sub system.
-    # But we can return the final result in the response.
-    
-    async for event in graph_app.astream(None, config=config, stream_mode="updates"):
-         pass # Just run it to completion
-         
-    final_state = graph_app.get_state(config)
-    return {"status": "approved", "final_state": final_state.values}
 
+    # Carry the paused run's records, so clients attaching now see the whole plan
+    previous = runs.get(user_id)
+    history = [r for r in previous.history if r.kind != "interrupt"] if previous else []
+    # Passing None as input resumes an interrupted thread; request_hash None: a stream with
+    # a new request attaches to the resume instead of cancelling it halfway
+    run = runs.start(user_id, run_records(None, config), None, history)
+    if event_bus.subscriber_count(user_id) > 0:
+        return {"status": "approved", "streaming": True, "final_state": None}
+    await run.task
+    final_state = await graph_app.aget_state(config)
+    return {"status": "approved", "streaming": False, "final_state": final_state.values}
 
 if __name__ == "__main__":
     uvicorn.run("backend_api:app", host="0.0.0.0", port=8000, reload=True)
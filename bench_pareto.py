@@ -0,0 +1,144 @@
+"""
+Benchmark and cross-check of pareto.py against the original O(n^2) loop,
+and of live_frontier.LiveFrontier against full recomputation.
+
+    python bench_pareto.py              # 1k .. 10M rows
+    python bench_pareto.py --max-rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from live_frontier import LiveFrontier
+from pareto import pareto_mask, pareto_ranks
+
+
+def identify_pareto_loop(aesthetic: np.ndarray, profit: np.ndarray) -> np.ndarray:
+    """The original analyze_pareto.identify_pareto, kept as the reference."""
+    population_size = len(aesthetic)
+    is_pareto = np.ones(population_size, dtype=bool)
+    for i in range(population_size):
+        if is_pareto[i]:
+            is_dominated = np.logical_and(
+                aesthetic >= aesthetic[i],
+                profit >= profit[i]
+            ) & np.logical_or(
+                aesthetic > aesthetic[i],
+                profit > profit[i]
+            )
+            if np.any(is_dominated):
+                is_pareto[i] = False
+    return is_pareto
+
+
+def reference_mask(matrix: np.ndarray) -> np.ndarray:
+    ge = (matrix[None, :, :] >= matrix[:, None, :]).all(axis=2)
+    gt = (matrix[None, :, :] > matrix[:, None, :]).any(axis=2)
+    return ~(ge & gt).any(axis=1)
+
+
+def reference_ranks(matrix: np.ndarray) -> np.ndarray:
+    ranks = np.zeros(len(matrix), dtype=np.int64)
+    remaining = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+    layer = 0
+    while len(remaining):
+        front = reference_mask(matrix[remaining])
+        ranks[remaining[front]] = layer
+        remaining = remaining[~front]
+        layer += 1
+    return ranks
+
+
+def make_plans(n: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    # Same shape as the plan logs: aesthetic 0-10 with 2 decimals, margin with 4 decimals (many ties)
+    columns = [np.round(rng.normal(7.5, 1.2, n), 2), np.round(rng.normal(0.18, 0.07, n), 4)]
+    for _ in range(k - 2):
+        columns.append(np.round(rng.uniform(0, 10, n), 2))
+    return np.column_stack(columns[:k])
+
+
+def check(rng: np.random.Generator):
+    for trial in range(200):
+        n = int(rng.integers(1, 300))
+        k = int(rng.integers(2, 5))
+        matrix = rng.integers(0, 6, size=(n, k)).astype(float)   # heavy ties and duplicates
+        if trial % 3 == 0:
+            matrix[rng.random(n) < 0.1, int(rng.integers(0, k))] = np.nan
+        expected = reference_mask(matrix)
+        if k == 2:
+            assert np.array_equal(identify_pareto_loop(matrix[:, 0], matrix[:, 1]), expected)
+        assert np.array_equal(pareto_mask(matrix), expected), f"mask mismatch (n={n}, k={k})"
+        assert np.array_equal(pareto_ranks(matrix), reference_ranks(matrix)), f"rank mismatch (n={n}, k={k})"
+    print("Cross-check passed: masks and ranks match the reference on 200 random tie-heavy inputs.")
+
+
+def check_live(rng: np.random.Generator):
+    for trial in range(100):
+        frontier, points = LiveFrontier(), {}
+        for step in range(200):
+            if points and rng.random() < 0.35:
+                plan_id = list(points)[int(rng.integers(len(points)))]
+                before = {p for p in points if frontier.is_on_frontier(p)}
+                promoted = frontier.remove(plan_id)
+                del points[plan_id]
+                assert set(promoted) == {p for p in points if frontier.is_on_frontier(p)} - before
+            else:
+                plan_id = int(rng.integers(0, 150))
+                a, b = rng.integers(0, 6, 2).astype(float)
+                if rng.random() < 0.05:
+                    a = np.nan
+                update = frontier.insert(plan_id, a, b)
+                points[plan_id] = (a, b)
+                assert update.on_frontier == frontier.is_on_frontier(plan_id)
+                assert not any(frontier.is_on_frontier(p) for p in update.evicted)
+            ids = list(points)
+            expected = pareto_mask(np.array([points[p] for p in ids]).reshape(-1, 2))
+            got = np.array([frontier.is_on_frontier(p) for p in ids], dtype=bool)
+            assert np.array_equal(got, expected), f"live frontier mismatch (trial={trial}, step={step})"
+    print("Cross-check passed: LiveFrontier matches full recomputation over 100 random insert/remove streams.")
+
+
+def stream_inserts(matrix: np.ndarray) -> LiveFrontier:
+    frontier = LiveFrontier()
+    for plan_id, (a, b) in enumerate(matrix.tolist()):
+        frontier.insert(plan_id, a, b)
+    return frontier
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-rows", type=int, default=10_000_000)
+    parser.add_argument("--loop-max-rows", type=int, default=20_000, help="largest size run with the O(n^2) loop")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    check(rng)
+    check_live(rng)
+
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000, 10_000_000) if n <= args.max_rows]
+    print(f"\n{'rows':>10} {'loop (2D)':>12} {'sweep (2D)':>12} {'block (3D)':>12} {'ranks (2D)':>12} {'live (2D)':>12} {'frontier':>9}")
+    for n in sizes:
+        matrix = make_plans(n, 3, rng)
+        mask, t_sweep = timed(pareto_mask, matrix[:, :2])
+        if n <= args.loop_max_rows:
+            loop_mask, t_loop = timed(identify_pareto_loop, matrix[:, 0], matrix[:, 1])
+            assert np.array_equal(loop_mask, mask)
+            loop = f"{t_loop:11.3f}s"
+        else:
+            loop = f"{'-':>12}"
+        _, t_block = timed(pareto_mask, matrix)
+        ranks = f"{timed(pareto_ranks, matrix[:, :2])[1]:11.3f}s" if n <= 1_000_000 else f"{'-':>12}"
+        if n <= 1_000_000:
+            live, t_live = timed(stream_inserts, matrix[:, :2])
+            assert np.array_equal([live.is_on_frontier(i) for i in range(n)], mask)
+            live_col = f"{t_live:11.3f}s"
+        else:
+            live_col = f"{'-':>12}"
+        print(f"{n:>10} {loop} {t_sweep:11.3f}s {t_block:11.3f}s {ranks} {live_col} {int(mask.sum()):>9}")
@@ -0,0 +1,241 @@
+"""
+Compaction and retention for checkpoints.db.
+
+Every new trip request appends a run to its thread, so the
+checkpoint history grows without bound. A compaction pass:
+1. expires threads idle for longer than the TTL (unless they are waiting
+   for approval at commercial_arbiter)
+2. keeps only the latest N checkpoints of every other thread
+3. drops pending writes whose checkpoint is gone
+4. returns freed pages to the OS with an incremental vacuum (the first pass
+   switches the file to auto_vacuum=INCREMENTAL, with a one-off full VACUUM)
+
+Usage:
+    python checkpoint_compaction.py --report
+    python checkpoint_compaction.py --keep 20 --ttl-hours 72
+or in-process via `run_periodically` (see backend_api.py).
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiosqlite
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+DELETE_CHUNK = 500
+
+InterruptCheck = Callable[[aiosqlite.Connection, str], Awaitable[bool]]
+
+
+def waiting_at(node: str = "commercial_arbiter", serde=None) -> InterruptCheck:
+    """
+    Interrupt detector working on the stored checkpoint alone (no graph needed):
+    a thread is waiting when its latest checkpoint still has a pending
+    `branch:to:<node>` trigger, i.e. it stopped in front of `node`.
+    """
+    serde = serde or JsonPlusSerializer()
+
+    async def check(conn: aiosqlite.Connection, thread_id: str) -> bool:
+        async with conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+            "ORDER BY checkpoint_id DESC LIMIT 1",
+            (thread_id,),
+        ) as cur:
+            row = await cur.fetchone()
+        if row is None:
+            return False
+        checkpoint = serde.loads_typed((row[0], row[1]))
+        return f"branch:to:{node}" in checkpoint.get("channel_values", {})
+
+    return check
+
+
+class CheckpointCompactor:
+    """
+    keep_last: checkpoints kept per thread (and namespace).
+    ttl_hours: threads idle for longer are deleted entirely.
+    vacuum_pages: free pages released per pass (incremental vacuum).
+    is_interrupted: async (conn, thread_id) -> bool; such threads are never trimmed or expired.
+    """
+
+    def __init__(self, path: str = "checkpoints.db", keep_last: int = 20, ttl_hours: float = 72.0,
+                 vacuum_pages: int = 2000, is_interrupted: Optional[InterruptCheck] = None):
+        self.path = path
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_hours * 3600
+        self.vacuum_pages = vacuum_pages
+        self.is_interrupted = is_interrupted or waiting_at("commercial_arbiter")
+        self._incremental = False   # auto_vacuum=INCREMENTAL confirmed for the file
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        await conn.execute("PRAGMA busy_timeout=5000")
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+        await conn.commit()
+        return conn
+
+    async def _delete_rowids(self, conn: aiosqlite.Connection, table: str, rowids: List[int]) -> int:
+        # Small transactions so the live writer is never locked out for long
+        for i in range(0, len(rowids), DELETE_CHUNK):
+            chunk = rowids[i:i + DELETE_CHUNK]
+            await conn.execute(f"DELETE FROM {table} WHERE rowid IN ({','.join('?' * len(chunk))})", chunk)
+            await conn.commit()
+        return len(rowids)
+
+    async def _ensure_incremental_vacuum(self, conn: aiosqlite.Connection):
+        """
+        Switch the file to auto_vacuum=INCREMENTAL, without which incremental_vacuum
+        does nothing. A file created without it needs one full VACUUM (once per
+        database); if that fails (e.g. the writer is busy), the next pass retries.
+        """
+        if self._incremental:
+            return
+        async with conn.execute("PRAGMA auto_vacuum") as cur:
+            mode = (await cur.fetchone())[0]
+        if mode != 2:
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.execute("VACUUM")
+        self._incremental = True
+
+    async def _has_checkpoints(self, conn: aiosqlite.Connection) -> bool:
+        # The saver creates its tables on first use; a fresh file has none yet
+        async with conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('checkpoints', 'writes')") as cur:
+            return (await cur.fetchone())[0] == 2
+
+    async def compact(self) -> Dict[str, Any]:
+        started = time.time()
+        conn = await self._connect()
+        try:
+            if not await self._has_checkpoints(conn):
+                return {"expired_threads": 0, "expired_checkpoints": 0, "trimmed_checkpoints": 0,
+                        "orphan_writes": 0, "protected_threads": 0, "seconds": 0.0}
+
+            # Threads written before activity tracking existed start their TTL now
+            await conn.execute(
+                "INSERT OR IGNORE INTO thread_activity (thread_id, last_seen) "
+                "SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (started,),
+            )
+            await conn.commit()
+
+            async with conn.execute("SELECT thread_id, last_seen FROM thread_activity") as cur:
+                threads = await cur.fetchall()
+
+            protected, expired = set(), []
+            for thread_id, last_seen in threads:
+                if await self.is_interrupted(conn, thread_id):
+                    protected.add(thread_id)
+                elif started - last_seen > self.ttl_seconds:
+                    expired.append(thread_id)
+
+            # 1. Expire abandoned threads
+            expired_checkpoints = 0
+            for thread_id in expired:
+                async with conn.execute("SELECT rowid FROM checkpoints WHERE thread_id = ?", (thread_id,)) as cur:
+                    rowids = [r[0] for r in await cur.fetchall()]
+                expired_checkpoints += await self._delete_rowids(conn, "checkpoints", rowids)
+                await conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+                await conn.commit()
+
+            # 2. Keep the latest N checkpoints per thread
+            async with conn.execute(
+                "SELECT rowid, thread_id FROM ("
+                "  SELECT rowid, thread_id, ROW_NUMBER() OVER ("
+                "    PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC"
+                "  ) AS rn FROM checkpoints"
+                ") WHERE rn > ?",
+                (self.keep_last,),
+            ) as cur:
+                trimmed_rowids = [rowid for rowid, thread_id in await cur.fetchall() if thread_id not in protected]
+            trimmed = await self._delete_rowids(conn, "checkpoints", trimmed_rowids)
+
+            # 3. Pending writes of deleted checkpoints
+            async with conn.execute(
+                "SELECT w.rowid FROM writes w LEFT JOIN checkpoints c "
+                "ON c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id "
+                "WHERE c.checkpoint_id IS NULL"
+            ) as cur:
+                orphan_rowids = [r[0] for r in await cur.fetchall()]
+            orphan_writes = await self._delete_rowids(conn, "writes", orphan_rowids)
+
+            # 4. Release free pages. executescript steps the pragma to completion; execute() would free a single page
+            await self._ensure_incremental_vacuum(conn)
+            await conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+        finally:
+            await conn.close()
+
+        return {
+            "expired_threads": len(expired),
+            "expired_checkpoints": expired_checkpoints,
+            "trimmed_checkpoints": trimmed,
+            "orphan_writes": orphan_writes,
+            "protected_threads": len(protected),
+            "seconds": round(time.time() - started, 3),
+        }
+
+    async def report(self, top: int = 10) -> Dict[str, Any]:
+        conn = await self._connect()
+        try:
+            async def scalar(sql: str):
+                async with conn.execute(sql) as cur:
+                    return (await cur.fetchone())[0]
+
+            page_size = await scalar("PRAGMA page_size")
+            wal_path = f"{self.path}-wal"
+            stats = {
+                "db_bytes": page_size * await scalar("PRAGMA page_count"),
+                "free_bytes": page_size * await scalar("PRAGMA freelist_count"),
+                "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+                "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}.get(await scalar("PRAGMA auto_vacuum")),
+                "threads": 0,
+                "checkpoints": 0,
+                "writes": 0,
+                "largest_threads": [],
+            }
+            if not await self._has_checkpoints(conn):
+                return stats
+
+            async with conn.execute(
+                "SELECT thread_id, COUNT(*) AS n FROM checkpoints GROUP BY thread_id ORDER BY n DESC LIMIT ?", (top,)
+            ) as cur:
+                stats["largest_threads"] = [{"thread_id": t, "checkpoints": n} for t, n in await cur.fetchall()]
+            stats["threads"] = await scalar("SELECT COUNT(DISTINCT thread_id) FROM checkpoints")
+            stats["checkpoints"] = await scalar("SELECT COUNT(*) FROM checkpoints")
+            stats["writes"] = await scalar("SELECT COUNT(*) FROM writes")
+            return stats
+        finally:
+            await conn.close()
+
+    async def run_periodically(self, interval_seconds: float = 600.0):
+        """Background task: compact every `interval_seconds` until cancelled."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                result = await self.compact()
+                print(f"Checkpoint compaction: {result}")
+            except Exception as e:
+                print(f"Checkpoint compaction failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact checkpoints.db")
+    parser.add_argument("--db", default=os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db"))
+    parser.add_argument("--keep", type=int, default=20, help="checkpoints kept per thread")
+    parser.add_argument("--ttl-hours", type=float, default=72.0, help="expire threads idle for longer")
+    parser.add_argument("--vacuum-pages", type=int, default=2000)
+    parser.add_argument("--report", action="store_true", help="only print size and per-thread counts")
+    args = parser.parse_args()
+
+    compactor = CheckpointCompactor(args.db, keep_last=args.keep, ttl_hours=args.ttl_hours,
+                                    vacuum_pages=args.vacuum_pages)
+
+    async def main():
+        if not args.report:
+            print("Compaction:", await compactor.compact())
+        print("Report:", await compactor.report())
+
+    asyncio.run(main())
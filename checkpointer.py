@@ -0,0 +1,321 @@
+"""
+Async, connection-pooled SQLite checkpointer for the LangGraph app.
+
+Same tables as langgraph's SqliteSaver / AsyncSqliteSaver, so existing
+checkpoints.db files keep working, but:
+- WAL mode, so readers never wait for the writer
+- a pool of read connections serving get_state / history lookups concurrently
+- one writer connection; checkpoint and pending-write inserts from all
+  threads are group-committed in small batches instead of one commit each
+"""
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, cast
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.sqlite.utils import load_pending_writes, pending_writes_sql, search_where
+
+Statement = Tuple[str, Tuple[Any, ...]]
+
+
+class _LoopResources:
+    """aiosqlite connections, locks and the pending write batch are bound to the event loop that created them."""
+
+    def __init__(self):
+        self.conn: Optional[aiosqlite.Connection] = None   # writer
+        self.lock = asyncio.Lock()                          # guards the writer connection
+        self.setup_lock = asyncio.Lock()
+        self.is_setup = False
+        self.readers: asyncio.Queue = asyncio.Queue()
+        self.reader_conns: List[aiosqlite.Connection] = []
+        self.pending: List[Tuple[List[Statement], asyncio.Future]] = []
+        self.flusher: Optional[asyncio.Task] = None
+
+    def connections(self) -> List[aiosqlite.Connection]:
+        return [c for c in (self.conn, *self.reader_conns) if c is not None]
+
+
+class PooledAsyncSqliteSaver(AsyncSqliteSaver):
+    """
+    path: SQLite file (configurable, e.g. via CHECKPOINT_DB_PATH).
+    pool_size: number of read connections.
+    batch_window: seconds the writer waits to collect concurrent writes into one commit.
+    max_batch: maximum number of write requests per commit.
+
+    Connections are opened lazily on first use, so the saver can be created at
+    import time, and per event loop: a second asyncio.run() (or the dashboard's
+    background loop next to the API's) gets its own writer and reader pool, and
+    the connections of loops that have since closed are stopped. Sync methods
+    (get_state, ...) must be called from another thread than the event loop, as
+    with AsyncSqliteSaver, and go to the loop that set up last.
+
+    aiosqlite runs each connection on a non-daemon thread, which Python joins
+    before atexit handlers run. close() is registered with threading's own exit
+    hook, which runs before that join, so the process exits however its loops
+    ended. `await aclose()` (backend_api does so on shutdown) additionally
+    flushes writes still waiting for their batch.
+    """
+
+    def __init__(self, path: str = "checkpoints.db", pool_size: int = 8,
+                 batch_window: float = 0.002, max_batch: int = 256, serde=None):
+        # AsyncSqliteSaver.__init__ requires a running loop and an open connection; set up lazily instead
+        BaseCheckpointSaver.__init__(self, serde=serde)
+        self.jsonplus_serde = JsonPlusSerializer()
+        self.path = path
+        self.pool_size = pool_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._resources: Dict[asyncio.AbstractEventLoop, _LoopResources] = {}
+        self._last_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"commits": 0, "batched_writes": 0}
+        # Runs before the interpreter joins non-daemon threads (plain atexit runs after, too late)
+        threading._register_atexit(self.close)
+
+    # --- Per-loop state (AsyncSqliteSaver's conn / lock / loop / is_setup) ---
+
+    def _current(self) -> _LoopResources:
+        loop = asyncio.get_running_loop()
+        resources = self._resources.get(loop)
+        if resources is None:
+            # Connections of finished loops can no longer be awaited; stop their threads directly
+            for stale in [l for l in self._resources if l.is_closed()]:
+                for conn in self._resources.pop(stale).connections():
+                    conn.stop()
+            resources = self._resources[loop] = _LoopResources()
+        return resources
+
+    @property
+    def conn(self) -> Optional[aiosqlite.Connection]:
+        return self._current().conn
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        return self._current().lock
+
+    @property
+    def is_setup(self) -> bool:
+        return self._current().is_setup
+
+    @is_setup.setter
+    def is_setup(self, value: bool):
+        self._current().is_setup = value
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._last_loop
+
+    # --- Connection management ---
+
+    async def setup(self) -> None:
+        resources = self._current()
+        if resources.is_setup:
+            return
+        async with resources.setup_lock:
+            if resources.is_setup:
+                return
+            self._last_loop = asyncio.get_running_loop()
+            resources.conn = aiosqlite.connect(self.path)
+            # Creates the tables and switches the file to WAL mode
+            await super().setup()
+            await resources.conn.execute("PRAGMA synchronous=NORMAL")
+            await resources.conn.execute("PRAGMA busy_timeout=5000")
+            # Last write per thread, used by checkpoint_compaction for TTL expiry
+            await resources.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            await resources.conn.commit()
+
+            for _ in range(self.pool_size):
+                reader = await aiosqlite.connect(self.path)
+                await reader.execute("PRAGMA query_only=1")
+                await reader.execute("PRAGMA busy_timeout=5000")
+                resources.reader_conns.append(reader)
+                resources.readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        readers = self._current().readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+
+    async def aclose(self):
+        """Flush pending writes and close the current loop's connections."""
+        resources = self._resources.pop(asyncio.get_running_loop(), None)
+        if resources is None:
+            return
+        if resources.flusher is not None:
+            await resources.flusher
+        for conn in resources.connections():
+            await conn.close()
+
+    def close(self):
+        """Stop the connection threads of every loop, from synchronous code after the loops have ended."""
+        for resources in list(self._resources.values()):
+            for conn in resources.connections():
+                conn.stop()
+        self._resources.clear()
+
+    # --- Batched writer ---
+
+    async def _submit(self, statements: List[Statement]):
+        resources = self._current()
+        future = asyncio.get_running_loop().create_future()
+        resources.pending.append((statements, future))
+        if resources.flusher is None or resources.flusher.done():
+            resources.flusher = asyncio.create_task(self._flush(resources))
+        await future
+
+    async def _flush(self, resources: _LoopResources):
+        await asyncio.sleep(self.batch_window)
+        while resources.pending:
+            batch, resources.pending = resources.pending[:self.max_batch], resources.pending[self.max_batch:]
+            # Consecutive statements with the same SQL become one executemany
+            runs: List[Tuple[str, List[Tuple[Any, ...]]]] = []
+            for statements, _ in batch:
+                for sql, params in statements:
+                    if runs and runs[-1][0] == sql:
+                        runs[-1][1].append(params)
+                    else:
+                        runs.append((sql, [params]))
+            try:
+                async with resources.lock:
+                    for sql, rows in runs:
+                        await resources.conn.executemany(sql, rows)
+                    await resources.conn.commit()
+            except Exception as e:
+                await resources.conn.rollback()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["commits"] += 1
+            self.stats["batched_writes"] += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    # --- Reads (pooled) ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self.setup()
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        thread_id = str(config["configurable"]["thread_id"])
+        async with self._reader() as conn, conn.cursor() as cur:
+            if checkpoint_id := get_checkpoint_id(config):
+                await cur.execute(
+                    "SELECT thread_id, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+            else:
+                await cur.execute(
+                    "SELECT thread_id, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                )
+            value = await cur.fetchone()
+            if not value:
+                return None
+            thread_id, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata = value
+            await cur.execute(pending_writes_sql(self._has_task_path), (thread_id, checkpoint_ns, checkpoint_id))
+            return self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                                  type_, checkpoint, metadata, await cur.fetchall())
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        where, params = search_where(config, filter, before)
+        query = f"""SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata
+        FROM checkpoints
+        {where}
+        ORDER BY checkpoint_id DESC"""
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (*params, limit)
+        async with self._reader() as conn:
+            async with conn.execute(query, params) as cur:
+                rows = await cur.fetchall()
+            for thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata in rows:
+                async with conn.execute(pending_writes_sql(self._has_task_path),
+                                        (thread_id, checkpoint_ns, checkpoint_id)) as wcur:
+                    writes = await wcur.fetchall()
+                yield self._to_tuple(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                                     type_, checkpoint, metadata, writes)
+
+    def _to_tuple(self, thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                  type_, checkpoint, metadata, writes) -> CheckpointTuple:
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            self.serde.loads_typed((type_, checkpoint)),
+            cast(CheckpointMetadata, json.loads(metadata) if metadata is not None else {}),
+            (
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+            load_pending_writes(writes, self.serde),
+        )
+
+    # --- Writes (batched) ---
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        await self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = json.dumps(
+            get_checkpoint_metadata(config, metadata), ensure_ascii=False
+        ).encode("utf-8", "ignore")
+        await self._submit([
+            (
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(thread_id), checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, serialized_checkpoint, serialized_metadata),
+            ),
+            (
+                "INSERT OR REPLACE INTO thread_activity (thread_id, last_seen) VALUES (?, ?)",
+                (str(thread_id), time.time()),
+            ),
+        ])
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                          task_id: str, task_path: str = "") -> None:
+        await self.setup()
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        sql = (f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, value) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        await self._submit([
+            (sql, (
+                str(config["configurable"]["thread_id"]),
+                str(config["configurable"]["checkpoint_ns"]),
+                str(config["configurable"]["checkpoint_id"]),
+                task_id,
+                task_path,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            ))
+            for idx, (channel, value) in enumerate(writes)
+        ])
@@ -0,0 +1,86 @@
+"""
+Convergence control for planner/auditor replan loops.
+
+A replan loop ends when the auditor accepts the plan, and nothing else stops
+it: a planner that keeps proposing plans it already proposed (A -> B -> A ...)
+loops forever, and every round spends planner time and Maps quota. decide()
+looks at what the loop recorded so far and returns one of
+
+- DONE:    the auditor accepted the plan
+- REPLAN:  another round is allowed
+- STALLED: the latest plan was proposed before (the loop is in a cycle), or
+           the iteration / wall-clock budget is spent
+
+A stalled loop goes to human review: a node the graph is interrupted before,
+like commercial_arbiter in agent_graph. Plans are compared by fingerprint
+(blake2b of their canonical JSON), so the history is a short list of strings
+kept in the graph state, and decisions survive checkpoints and restarts.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+DONE, REPLAN, STALLED = "done", "replan", "stalled"
+
+
+@dataclass
+class LoopBudget:
+    max_iterations: int = 5         # planner rounds, the first draft included
+    max_seconds: float = 60.0       # wall clock since the first draft
+
+
+@dataclass
+class LoopVerdict:
+    action: str                     # DONE / REPLAN / STALLED
+    reason: str = ""
+    iterations: int = 0
+    cycle_length: Optional[int] = None  # rounds between the latest plan and its earlier occurrence
+
+
+def fingerprint(itinerary: Any) -> str:
+    """Content hash of a plan: a Pydantic model, or anything JSON-serializable (e.g. a list of stops)."""
+    if hasattr(itinerary, "model_dump_json"):
+        payload = itinerary.model_dump_json()
+    else:
+        payload = json.dumps(itinerary, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def cycle_length(history: Sequence[str]) -> Optional[int]:
+    """Rounds since the latest fingerprint last occurred (1 = the same plan twice in a row), or None."""
+    if not history:
+        return None
+    latest = history[-1]
+    for back in range(1, len(history)):
+        if history[-1 - back] == latest:
+            return back
+    return None
+
+
+def decide(history: Sequence[str], valid: bool, started_at: Optional[float],
+           budget: Optional[LoopBudget] = None, now: Optional[float] = None) -> LoopVerdict:
+    """
+    Verdict after an audit. history: fingerprints of the plans proposed so far,
+    the audited one last; started_at: time.time() of the first draft.
+    """
+    budget = budget or LoopBudget()
+    iterations = len(history)
+    if valid:
+        return LoopVerdict(DONE, "plan accepted by the auditor", iterations)
+    cycle = cycle_length(history)
+    if cycle is not None:
+        what = "the same plan was proposed twice in a row" if cycle == 1 else f"the planner is cycling through {cycle} plans"
+        return LoopVerdict(STALLED, what, iterations, cycle)
+    if iterations >= budget.max_iterations:
+        return LoopVerdict(STALLED, f"iteration budget of {budget.max_iterations} rounds spent", iterations)
+    elapsed = (time.time() if now is None else now) - (started_at if started_at is not None else time.time())
+    if elapsed >= budget.max_seconds:
+        return LoopVerdict(STALLED, f"time budget of {budget.max_seconds:.0f}s spent ({elapsed:.0f}s)", iterations)
+    return LoopVerdict(REPLAN, "", iterations)
+
+
+def record(history: Optional[List[str]], itinerary: Any) -> List[str]:
+    """The history with the fingerprint of a newly proposed plan appended (a new list, for state updates)."""
+    return [*(history or []), fingerprint(itinerary)]
@@ -4,8 +4,14 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import random
+import threading
 import time
-import asyncio
+import uuid
+from agent_runner import shared_runner
+from live_frontier import LiveFrontier
+from pareto import pareto_mask
+from plan_kpis import compute_kpis, data_version as plan_data_version, load_kpis, proxy_note
+from plot_data import scatter_view, selection_ranges
 # Import local agent graph for simulation
 try:
     from agent_graph import graph_app
@@ -24,36 +30,115 @@ st.set_page_config(
 if 'deadlock_triggered' not in st.session_state:
     st.session_state['deadlock_triggered'] = False
 
-# --- 1. Data Loading & Enrichment ---
+# --- 1. Data Loading (KPIs are precomputed per data version, see plan_kpis.py) ---
 @st.cache_data
-def load_data():
-    try:
-        df = pd.read_csv('travel_data_p3_refined.csv')
-    except FileNotFoundError:
+def load_data(version):
+    # `version` is only the cache key: a regenerated plan log or a new KPI revision misses the cache
+    if version is None:
         # Fallback if P3 data missing
         df = pd.DataFrame({
             'aesthetic_score': np.random.normal(7, 1, 100),
             'profit_margin': np.random.normal(0.2, 0.05, 100),
+            'logic_score': np.random.uniform(5, 10, 100),
+            'is_converted': np.random.rand(100) < 0.3,
             'agent_version': ['v1-balanced']*100,
             'plan_id': [str(i) for i in range(100)],
             'net_profit': np.random.randint(100, 1000, 100),
+            'total_revenue': np.random.randint(3000, 20000, 100),
             'user_segment': ['standard']*100
         })
-    
-    # Mocking new KPIs for the dashboard
-    np.random.seed(42)
-    df['pareto_health'] = df.apply(lambda x: min(100, int((x['aesthetic_score'] * 10 + x['profit_margin'] * 100) / 1.5)), axis=1)
-    df['inventory_match'] = np.random.randint(40, 95, len(df))
-    df['audit_recurrence'] = np.random.randint(0, 5, len(df))
-    df['mood_consistency'] = df['aesthetic_score'].apply(lambda x: min(10, x + np.random.normal(0, 0.5)))
-    df['golden_hour_coverage'] = np.random.uniform(0.1, 0.8, len(df))
-    df['fatigue_index'] = np.random.choice(['Low', 'Medium', 'High'], len(df))
-    df['congestion_risk'] = np.random.uniform(0, 0.4, len(df))
-    df['buffer_flexibility'] = np.random.randint(10, 30, len(df)) # minutes
-    
-    return df
+        return pd.concat([df, compute_kpis(df)], axis=1)
+    return load_kpis('p3', version=version)
+
+try:
+    kpi_version = plan_data_version('p3')
+except FileNotFoundError:
+    kpi_version = None
+df = load_data(kpi_version)
+
+@st.cache_resource(max_entries=4)
+def live_frontier(version):
+    # Live Pareto frontier of the loaded plans, one per data version shared by every session; agent
+    # runs triggered below are inserted incrementally. Plans are never removed here, so plans already
+    # dominated in the log can never return to the frontier and are left out of the index.
+    on_frontier = pareto_mask(df[['aesthetic_score', 'profit_margin']])
+    frontier = LiveFrontier()
+    frontier.extend(zip(df['plan_id'][on_frontier], df['aesthetic_score'][on_frontier], df['profit_margin'][on_frontier]))
+    return frontier, threading.Lock()   # the lock serializes inserts from concurrent sessions
+
+frontier, frontier_lock = live_frontier(kpi_version)
+
+@st.cache_data(max_entries=32)
+def sidebar_view(version, x_range, y_range):
+    # `version` keys the cache to the loaded plan data, the ranges to the zoom region
+    return scatter_view(df, "aesthetic_score", "profit_margin", "agent_version",
+                        hover=["plan_id", "net_profit"], x_range=x_range, y_range=y_range)
 
-df = load_data()
+@st.cache_resource
+def agent_runner():
+    # One long-lived event loop thread per dashboard process, shared by every session
+    return shared_runner()
+
+def render_update(node_name, data, run):
+    # One caption per planner variant (planner: the branch's timing; auditor: its status, the audit is shared)
+    candidates = (data.get("candidates") if isinstance(data, dict) else None) or []
+    if node_name == "planner":
+        st.write(f"🗺️ **Planner**: 已并行生成 {len(candidates) or 1} 份行程草案...")
+        for c in candidates:
+            st.caption(f"{c.agent_version}: {sum(len(day.activities) for day in c.itinerary.daily_plans)} 个节点, {c.timings['plan']:.2f}s")
+    elif node_name == "auditor":
+        if candidates:
+            st.write(f"🔍 **Auditor**: 已并行审计 {len(candidates)} 份草案")
+            for c in candidates:
+                status = f"⚠️ {len(c.errors)} 个逻辑冲突" if c.errors else "✅ 通过"
+                st.caption(f"{c.agent_version}: {status}")
+        elif data.get("errors"):
+            st.write(f"🔍 **Auditor**: ⚠️ 发现 {len(data['errors'])} 个逻辑冲突!")
+        else:
+            st.write("🔍 **Auditor**: ✅ 行程逻辑校验通过")
+    elif node_name == "commercial_arbiter":
+        chosen = f" · 选中 {data['selected_version']}" if data.get("selected_version") else ""
+        st.write(f"⚖️ **Arbiter**: 最终定价完成 (Profit: {data['profit_margin']}%){chosen}")
+        # Inserted once per run (the panel re-renders every poll); arbiter reports percent, the plan log stores fractions
+        frontier_updates = st.session_state.setdefault('agent_frontier_updates', {})
+        if run.thread_id not in frontier_updates:
+            with frontier_lock:
+                frontier_updates[run.thread_id] = frontier.insert(
+                    run.thread_id, data['aesthetic_score'], data['profit_margin'] / 100
+                )
+        update = frontier_updates[run.thread_id]
+        if update.on_frontier:
+            st.write(f"📈 新方案进入帕累托前沿 (替换 {len(update.evicted)} 个方案)")
+
+def agent_progress():
+    run = st.session_state.get('agent_run')
+    if run is None:
+        return
+    paused = run.paused_before
+    if not run.done:
+        label, state = "AI Agent 正在协作中 (Real-time LangGraph)...", "running"
+    elif run.error is not None:
+        label, state = "AI Agent 运行失败", "error"
+    elif paused:
+        label, state = "⏸️ 方案等待人工审批定价", "complete"
+    else:
+        label, state = "数据流已更新！", "complete"
+    with st.status(label, expanded=not run.done or bool(paused), state=state):
+        for node_name, data in run.updates():
+            render_update(node_name, data, run)
+        if run.error is not None:
+            st.error(f"{type(run.error).__name__}: {run.error}")
+    if "commercial_arbiter" in paused and st.button("✅ 批准定价", key=f"approve-{run.thread_id}"):
+        # Resume the interrupted thread on the shared loop; the panel keeps the earlier steps
+        st.session_state['agent_run'] = agent_runner().submit(
+            graph_app, None, {"configurable": {"thread_id": run.thread_id}}, history=run.updates()
+        )
+        st.rerun()
+    if run.done and st.session_state.get('agent_run_finished') is not run:
+        st.session_state['agent_run_finished'] = run
+        if run.error is None:
+            st.toast("数据流已刷新 (Powered by LangGraph)", icon="✅")
+        st.rerun()
 
 # --- 2. Top Status Bar (Simulated) ---
 col_t1, col_t2, col_t3, col_t4 = st.columns([1, 1, 4, 2])
@@ -64,48 +149,17 @@ with col_t2:
 with col_t3:
     st.markdown("**当前任务**: 正在处理 P3 阶段高净值客户方案 (ID: 8821-X)")
 with col_t4:
-    # 需求 2：流式生成占位符
+    # 需求 2：流式生成 —— 图在后台事件循环线程上运行，这里只提交，进度由 agent_progress 轮询
     if st.button("🔄 刷新数据流"):
         if graph_app:
-            with st.status("AI Agent 正在协作中 (Real-time LangGraph)...", expanded=True) as status:
-                async def run_agent_stream():
-                    inputs = {
-                        "user_request": "Refine itinerary for high-net-worth client",
-                        "iteration_count": 0,
-                        "errors": [],
-                        "messages": []
-                    }
-                    # Run the graph
-                    async for event in graph_app.astream(inputs, stream_mode="updates"):
-                        node_name = list(event.keys())[0]
-                        data = event[node_name]
-                        
-                        if node_name == "planner":
-                            st.write("🗺️ **Planner**: 已生成初始行程草案...")
-                            st.caption(f"包含 {len(data['itinerary'])} 个节点")
-                        elif node_name == "auditor":
-                            if data.get("errors"):
-                                st.write(f"🔍 **Auditor**: ⚠️ 发现 {len(data['errors'])} 个逻辑冲突!")
-                            else:
-                                st.write("🔍 **Auditor**: ✅ 行程逻辑校验通过")
-                        elif node_name == "commercial_arbiter":
-                            st.write(f"⚖️ **Arbiter**: 最终定价完成 (Profit: {data['profit_margin']}%)")
-                        
-                        # Simulate a tiny bit of delay for visual pacing if needed, 
-                        # though the nodes themselves have sleep.
-                
-                # Run the async function
-                try:
-                    asyncio.run(run_agent_stream())
-                except RuntimeError:
-                    # Fallback for environments with running loop
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(run_agent_stream())
-                    loop.close()
-                
-                status.update(label="数据流已更新！", state="complete", expanded=False)
-            st.toast("数据流已刷新 (Powered by LangGraph)", icon="✅")
+            inputs = {
+                "user_request": "Refine itinerary for high-net-worth client",
+                "iteration_count": 0,
+                "errors": [],
+                "messages": []
+            }
+            config = {"configurable": {"thread_id": f"dashboard-{uuid.uuid4().hex[:12]}"}}
+            st.session_state['agent_run'] = agent_runner().submit(graph_app, inputs, config)
         else:
             # Fallback if graph_app not loaded
             with st.status("AI Agent 正在协作中...", expanded=True) as status:
@@ -117,6 +171,10 @@ with col_t4:
                 time.sleep(0.5)
                 status.update(label="数据流已更新！", state="complete", expanded=False)
             st.toast("数据流已刷新", icon="✅")
+    if graph_app:
+        # Poll only while a run is in flight; the finished run triggers one full rerun
+        run = st.session_state.get('agent_run')
+        st.fragment(run_every=0.5 if run is not None and not run.done else None)(agent_progress)()
 
 st.divider()
 
@@ -125,20 +183,72 @@ with st.sidebar:
     st.title("🎛️ 计调控制台")
     
     st.subheader("快速择优 (Pareto View)")
-    # Scatter Plot for Sidebar
-    fig_sidebar = px.scatter(
-        df, 
-        x="aesthetic_score", 
-        y="profit_margin", 
-        color="agent_version",
-        hover_data=["plan_id", "net_profit"],
-        title="方案分布 (左侧导航)",
-        labels={"aesthetic_score": "审美分", "profit_margin": "利润率"},
-        height=400
-    )
-    fig_sidebar.update_layout(margin=dict(l=0, r=0, t=30, b=0), showlegend=False)
-    # Highlight Frontier (Mock)
-    st.plotly_chart(fig_sidebar, use_container_width=True)
+    # Server-side view of the visible region: the plans themselves when few, density grid + LOD points otherwise
+    zoom = st.session_state.get('sidebar_zoom')
+    view = sidebar_view(kpi_version, *(zoom or (None, None)))
+    labels = {"aesthetic_score": "审美分", "profit_margin": "利润率"}
+    if view.binned:
+        fig_sidebar = px.scatter(
+            view.points,
+            x="aesthetic_score",
+            y="profit_margin",
+            color="agent_version",
+            size="count",
+            size_max=12,
+            hover_data=["plan_id", "net_profit", "count"],
+            title="方案分布 (左侧导航)",
+            labels=labels,
+            height=400
+        )
+        density = view.density.astype(float)
+        density[density == 0] = np.nan
+        fig_sidebar.add_trace(go.Heatmap(
+            x=view.x_centres, y=view.y_centres, z=density,
+            colorscale="Greys", opacity=0.5, showscale=False, hoverinfo="skip"
+        ))
+        # Density layer below the points
+        fig_sidebar.data = fig_sidebar.data[-1:] + fig_sidebar.data[:-1]
+    else:
+        fig_sidebar = px.scatter(
+            view.points,
+            x="aesthetic_score",
+            y="profit_margin",
+            color="agent_version",
+            hover_data=["plan_id", "net_profit"],
+            title="方案分布 (左侧导航)",
+            labels=labels,
+            height=400
+        )
+    fig_sidebar.update_layout(margin=dict(l=0, r=0, t=30, b=0), showlegend=False, dragmode="select")
+    fig_sidebar.update_xaxes(range=view.x_range)
+    fig_sidebar.update_yaxes(range=view.y_range)
+    # Highlight Frontier (live, no rescan of the plan log; never downsampled)
+    with frontier_lock:
+        frontier_rows = frontier.frontier()
+    fig_sidebar.add_trace(go.Scatter(
+        x=[row[1] for row in frontier_rows],
+        y=[row[2] for row in frontier_rows],
+        mode="lines+markers",
+        line=dict(color="black", shape="hv"),
+        marker=dict(symbol="star", size=10),
+        hovertext=[str(row[0]) for row in frontier_rows],
+        name="Pareto Frontier"
+    ))
+    # Box selection zooms in: the selected region is fetched again at finer detail.
+    # A new chart key per zoom level starts the next chart without the old selection.
+    zoom_level = st.session_state.get('sidebar_zoom_level', 0)
+    event = st.plotly_chart(fig_sidebar, use_container_width=True, on_select="rerun",
+                            selection_mode="box", key=f"sidebar_scatter_{zoom_level}")
+    selected = selection_ranges(event)
+    if selected:
+        st.session_state['sidebar_zoom'] = selected
+        st.session_state['sidebar_zoom_level'] = zoom_level + 1
+        st.rerun()
+    st.caption(f"显示 {len(view.points)} / {view.total} 个方案" + (" (密度网格 + 代表点，框选放大查看细节)" if view.binned else ""))
+    if zoom and st.button("🔍 重置缩放"):
+        st.session_state['sidebar_zoom'] = None
+        st.session_state['sidebar_zoom_level'] = zoom_level + 1
+        st.rerun()
     
     st.info("💡 提示: 点击左侧散点可快速定位高潜方案。")
 
@@ -234,7 +344,7 @@ with col_main:
     m1.metric("Agent 版本", plan_data['agent_version'])
     m2.metric("预计净利润", f"${plan_data['net_profit']}", delta=f"{random.randint(-5, 10)}% vs Market")
     m3.metric("审美评分", f"{plan_data['aesthetic_score']:.1f}/10")
-    m4.metric("转化概率预测", f"{random.randint(20, 80)}%")
+    m4.metric("转化概率预测", f"{plan_data['conversion_forecast']:.0%}", help="同用户群体 x Agent 版本其他方案的历史转化率（不含本方案）")
 
     # Tabs for specific KPI Groups
     tab1, tab2, tab3, tab4 = st.tabs([
@@ -259,12 +369,13 @@ with tab1:
     c1.plotly_chart(fig_health, use_container_width=True)
     
     with c2:
-        st.metric("📦 资源利用率 (Inventory Match)", f"{plan_data['inventory_match']}%", help="自有库存使用比例")
+        st.metric("📦 资源利用率 (Inventory Match, 代理)", f"{plan_data['inventory_match']}%", help=proxy_note('inventory_match'))
         st.progress(plan_data['inventory_match'] / 100)
         st.caption("自有车队与预签酒店的高利用率能显著降低成本。")
         
     with c3:
-        st.metric("🤖 逻辑纠错频次 (Audit Recurrence)", f"{plan_data['audit_recurrence']} 次", delta="-2 vs Avg", delta_color="inverse")
+        st.metric("🤖 逻辑纠错频次 (Audit Recurrence, 代理)", f"{plan_data['audit_recurrence']} 次", delta="-2 vs Avg", delta_color="inverse",
+                  help=proxy_note('audit_recurrence'))
         st.info("Auditor 已拦截 3 次路线冲突，为您节省约 15 分钟人工检查时间。")
 
 with tab2:
@@ -294,19 +405,21 @@ with tab3:
     c1, c2, c3 = st.columns(3)
     
     with c1:
-        st.metric("🎬 情绪连贯性 (Mood)", f"{plan_data['mood_consistency']:.1f}/10")
+        st.metric("🎬 情绪连贯性 (Mood, 代理)", f"{plan_data['mood_consistency']:.1f}/10", help=proxy_note('mood_consistency'))
         st.progress(min(plan_data['mood_consistency'] / 10, 1.0))
         st.caption("景点转场顺滑，无突兀风格跳变。")
         
     with c2:
-        st.metric("📸 黄金时刻覆盖 (Golden Hour)", f"{plan_data['golden_hour_coverage']:.0%}")
+        st.metric("📸 黄金时刻覆盖 (Golden Hour, 代理)", f"{plan_data['golden_hour_coverage']:.0%}",
+                  help=proxy_note('golden_hour_coverage'))
         st.progress(plan_data['golden_hour_coverage'])
         st.caption("关键景点已安排在日出/日落前后 1 小时。")
         
     with c3:
         fatigue = plan_data['fatigue_index']
         color = "green" if fatigue == "Low" else "orange" if fatigue == "Medium" else "red"
-        st.markdown(f"**🏃 疲劳度指数**: <span style='color:{color};font-size:1.2em'>{fatigue}</span>", unsafe_allow_html=True)
+        st.markdown(f"**🏃 疲劳度指数 (代理)**: <span style='color:{color};font-size:1.2em'>{fatigue}</span>", unsafe_allow_html=True,
+                    help=proxy_note('fatigue_index'))
         st.caption("基于步行距离与海拔升降计算。")
 
 with tab4:
@@ -315,7 +428,8 @@ with tab4:
     
     with c1:
         risk = plan_data['congestion_risk']
-        st.metric("🚗 拥堵风险系数", f"{risk:.1%}", delta=f"{'+' if risk > 0.2 else '-'}0.5%")
+        st.metric("🚗 拥堵风险系数 (代理)", f"{risk:.1%}", delta=f"{'+' if risk > 0.2 else '-'}0.5%",
+                  help=proxy_note('congestion_risk'))
         if risk > 0.3:
             st.warning("检测到 Day 3 下午返程高峰风险，建议推迟 30 分钟出发。")
         else:
@@ -323,7 +437,7 @@ with tab4:
             
     with c2:
         buffer = plan_data['buffer_flexibility']
-        st.metric("🛡️ 补位灵活度 (Buffer)", f"{buffer} min")
+        st.metric("🛡️ 补位灵活度 (Buffer, 代理)", f"{buffer} min", help=proxy_note('buffer_flexibility'))
         st.caption("预留的机动时间，足以应对一般性突发延误。")
 
 # --- 5. Itinerary Card Flow (Main Canvas - Bottom) ---
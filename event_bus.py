@@ -0,0 +1,97 @@
+"""
+In-process pub/sub for graph events, keyed by thread_id.
+
+/approve-trip resumes the graph in a background task and publishes every node
+update here; the /stream-trip connection of the same thread is subscribed and
+forwards them to the browser, so approval results arrive on the open SSE stream.
+
+EventBus is the interface; InMemoryEventBus serves a single process. A
+multi-worker deployment can swap in another implementation (e.g. Redis pub/sub)
+without touching the endpoints.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Set
+
+
+class Subscription:
+    """
+    Queue of events for one subscriber. When the subscriber falls behind by
+    more than `maxsize` events the oldest ones are dropped, so a stalled client
+    never blocks the publisher.
+    """
+
+    def __init__(self, bus: "EventBus", topic: str, maxsize: int = 256):
+        self.bus = bus
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def deliver(self, event: Any):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.bus.unsubscribe(self)
+
+
+class EventBus(ABC):
+    """Interface shared by all backends."""
+
+    @abstractmethod
+    def subscribe(self, topic: str) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription):
+        ...
+
+    @abstractmethod
+    async def publish(self, topic: str, event: Any) -> int:
+        """Returns the number of subscribers the event was delivered to."""
+
+    @abstractmethod
+    def subscriber_count(self, topic: str) -> int:
+        ...
+
+
+class InMemoryEventBus(EventBus):
+    """Single-process backend: events are handed over as Python objects, no serialization."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._topics: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, self.maxsize)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._topics[subscription.topic]
+
+    async def publish(self, topic: str, event: Any) -> int:
+        subscribers = self._topics.get(topic, ())
+        for subscription in list(subscribers):
+            subscription.deliver(event)
+        return len(subscribers)
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._topics.get(topic, ()))
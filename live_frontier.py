@@ -0,0 +1,279 @@
+"""
+Incremental Pareto frontier over (aesthetic_score, profit_margin), both maximized.
+
+Plans arrive one at a time from commercial_arbiter; instead of rescanning the
+whole log (pareto.pareto_mask), LiveFrontier answers on insert whether the new
+plan is dominated and which frontier plans it evicts. Same semantics as
+pareto.pareto_mask: identical plans both stay on the frontier, a plan with a NaN
+objective is never dominated and never dominates.
+
+- Frontier: parallel lists sorted by aesthetic ascending (profit is then
+  non-increasing), searched with bisect. A 2-objective frontier stays short,
+  so inserts and queries are O(log F).
+- Dominated plans: a treap keyed by aesthetic, each subtree holding its
+  highest-profit plan. Removing a frontier plan P can only promote plans in
+  the strip between its frontier neighbours L and R (aesthetic in (a_L, a_P],
+  profit in (b_R, b_P]); their staircase is read off the treap one step at a
+  time (highest profit in the remaining aesthetic range), so a removal touches
+  only the plans it promotes.
+
+insert and remove are O(log n) plus O(log n) for each plan they evict or
+promote.
+"""
+import bisect
+import math
+import random
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+PlanId = Hashable
+
+
+class FrontierUpdate(NamedTuple):
+    on_frontier: bool
+    dominated_by: Optional[PlanId]  # a frontier plan dominating the new one, if any
+    evicted: List[PlanId]           # frontier plans the new one dominates
+
+
+class _Node:
+    __slots__ = ("plan_id", "a", "b", "rank", "key", "priority", "left", "right", "best")
+
+    def __init__(self, plan_id: PlanId, a: float, b: float, seq: int):
+        self.plan_id = plan_id
+        self.a = a
+        self.b = b
+        self.rank = (b, a)              # order of the staircase query: profit, then aesthetic
+        self.key = (a, seq)             # unique among plans with the same aesthetic
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.best: "_Node" = self       # highest (profit, aesthetic) in the subtree
+
+
+def _higher(x: Optional[_Node], y: Optional[_Node]) -> Optional[_Node]:
+    if x is None:
+        return y
+    if y is None:
+        return x
+    return y if y.rank > x.rank else x
+
+
+def _update(node: _Node) -> _Node:
+    best = node
+    if node.left is not None:
+        best = _higher(best, node.left.best)
+    if node.right is not None:
+        best = _higher(best, node.right.best)
+    node.best = best
+    return node
+
+
+def _split(node: Optional[_Node], key: Tuple[float, int]) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """(keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _join(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """Join two treaps, every key of `left` below every key of `right`."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _join(left.right, right)
+        return _update(left)
+    right.left = _join(left, right.left)
+    return _update(right)
+
+
+def _erase(node: _Node, key: Tuple[float, int]) -> Optional[_Node]:
+    if node.key == key:
+        return _join(node.left, node.right)
+    if key < node.key:
+        node.left = _erase(node.left, key)
+    else:
+        node.right = _erase(node.right, key)
+    return _update(node)
+
+
+class _DominatedIndex:
+    """Dominated plans by aesthetic; answers "highest-profit plan with aesthetic in a range" in O(log n)."""
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._nodes: Dict[PlanId, _Node] = {}
+        self._seq = 0
+
+    def __contains__(self, plan_id: PlanId) -> bool:
+        return plan_id in self._nodes
+
+    def add(self, plan_id: PlanId, a: float, b: float):
+        self._seq += 1
+        node = self._nodes[plan_id] = _Node(plan_id, a, b, self._seq)
+        # Walk down to where the new node's priority puts it, then split only the subtree below
+        parent, child, went_left = None, self._root, False
+        while child is not None and child.priority > node.priority:
+            if node.rank > child.best.rank:
+                child.best = node
+            parent, went_left = child, node.key < child.key
+            child = child.left if went_left else child.right
+        node.left, node.right = _split(child, node.key)
+        _update(node)
+        if parent is None:
+            self._root = node
+        elif went_left:
+            parent.left = node
+        else:
+            parent.right = node
+
+    def discard(self, plan_id: PlanId):
+        node = self._nodes.pop(plan_id)
+        self._root = _erase(self._root, node.key)
+
+    def highest(self, low: float, high: float, include_low: bool = False) -> Optional[_Node]:
+        """The plan with the highest (profit, aesthetic) among aesthetic in (low, high] ([low, high])."""
+        def above_low(a):
+            return a >= low if include_low else a > low
+
+        node = self._root
+        while node is not None and not (above_low(node.a) and node.a <= high):
+            node = node.right if not above_low(node.a) else node.left
+        if node is None:
+            return None
+        best = node
+        # Left of the split node only the lower bound applies, right of it only the upper one
+        child = node.left
+        while child is not None:
+            if above_low(child.a):
+                best = _higher(_higher(best, child), child.right.best if child.right else None)
+                child = child.left
+            else:
+                child = child.right
+        child = node.right
+        while child is not None:
+            if child.a <= high:
+                best = _higher(_higher(best, child), child.left.best if child.left else None)
+                child = child.right
+            else:
+                child = child.left
+        return best
+
+
+class LiveFrontier:
+    def __init__(self):
+        self._a: List[float] = []
+        self._neg_b: List[float] = []
+        self._ids: List[PlanId] = []
+        self._points: Dict[PlanId, Tuple[float, float]] = {}
+        self._incomparable: Set[PlanId] = set()     # plans with a NaN objective
+        self._dominated = _DominatedIndex()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, plan_id: PlanId) -> bool:
+        return plan_id in self._points
+
+    def is_on_frontier(self, plan_id: PlanId) -> bool:
+        return plan_id in self._points and plan_id not in self._dominated
+
+    def frontier(self) -> List[Tuple[PlanId, float, float]]:
+        """(plan_id, aesthetic, profit) of the frontier, aesthetic ascending; NaN plans last."""
+        rows = [(plan_id, a, -neg_b) for plan_id, a, neg_b in zip(self._ids, self._a, self._neg_b)]
+        return rows + [(plan_id, *self._points[plan_id]) for plan_id in self._incomparable]
+
+    def dominator(self, aesthetic: float, profit: float) -> Optional[PlanId]:
+        """A frontier plan dominating the point (aesthetic, profit), or None. O(log F)."""
+        if math.isnan(aesthetic) or math.isnan(profit):
+            return None
+        # Among frontier plans with a >= aesthetic, the first one has the largest b
+        i = bisect.bisect_left(self._a, aesthetic)
+        if i == len(self._a):
+            return None
+        b = -self._neg_b[i]
+        if b > profit or (b == profit and self._a[i] > aesthetic):
+            return self._ids[i]
+        return None
+
+    def insert(self, plan_id: PlanId, aesthetic: float, profit: float) -> FrontierUpdate:
+        """Add a plan (an existing plan_id is replaced)."""
+        if plan_id in self._points:
+            self.remove(plan_id)
+        aesthetic, profit = float(aesthetic), float(profit)
+        self._points[plan_id] = (aesthetic, profit)
+        if math.isnan(aesthetic) or math.isnan(profit):
+            self._incomparable.add(plan_id)
+            return FrontierUpdate(True, None, [])
+
+        owner = self.dominator(aesthetic, profit)
+        if owner is not None:
+            self._dominated.add(plan_id, aesthetic, profit)
+            return FrontierUpdate(False, owner, [])
+
+        # Frontier plans with a <= aesthetic and b <= profit form one contiguous run [start, end)
+        end = bisect.bisect_right(self._a, aesthetic)
+        start = bisect.bisect_left(self._neg_b, -profit, 0, end)
+        if end > start and self._a[end - 1] == aesthetic and self._neg_b[end - 1] == -profit:
+            end = bisect.bisect_left(self._a, aesthetic, start, end)  # identical plans are kept
+        evicted = self._ids[start:end]
+        del self._a[start:end], self._neg_b[start:end], self._ids[start:end]
+        self._a.insert(start, aesthetic)
+        self._neg_b.insert(start, -profit)
+        self._ids.insert(start, plan_id)
+        for evicted_id in evicted:
+            self._dominated.add(evicted_id, *self._points[evicted_id])
+        return FrontierUpdate(True, None, evicted)
+
+    def extend(self, rows: Iterable[Tuple[PlanId, float, float]]):
+        """Bulk load. Best plans go first, so no insert evicts anything."""
+        def order(row):
+            a, b = float(row[1]), float(row[2])
+            return (math.isnan(a) or math.isnan(b), -a if a == a else 0.0, -b if b == b else 0.0)
+        for plan_id, aesthetic, profit in sorted(rows, key=order):
+            self.insert(plan_id, aesthetic, profit)
+
+    def remove(self, plan_id: PlanId) -> List[PlanId]:
+        """Drop a plan. Returns the plans promoted to the frontier by its removal."""
+        aesthetic, profit = self._points.pop(plan_id)
+        if plan_id in self._incomparable:
+            self._incomparable.discard(plan_id)
+            return []
+        if plan_id in self._dominated:
+            self._dominated.discard(plan_id)
+            return []
+
+        i = bisect.bisect_left(self._a, aesthetic)
+        while self._ids[i] != plan_id:
+            i += 1
+        del self._a[i], self._neg_b[i], self._ids[i]
+
+        # Plans left of the left neighbour or below the right one stay dominated by it
+        low = self._a[i - 1] if i > 0 else -math.inf
+        floor = -self._neg_b[i] if i < len(self._ids) else -math.inf
+        promoted = []
+        while True:
+            node = self._dominated.highest(low, aesthetic)
+            if node is None or node.b <= floor:
+                break
+            # The staircase step, plus any plans identical to it (they stay on the frontier together)
+            self._dominated.discard(node.plan_id)
+            step = [node]
+            while True:
+                twin = self._dominated.highest(node.a, node.a, include_low=True)
+                if twin is None or twin.b != node.b:
+                    break
+                self._dominated.discard(twin.plan_id)
+                step.append(twin)
+            for promoted_node in step:
+                self._a.insert(i, promoted_node.a)
+                self._neg_b.insert(i, -promoted_node.b)
+                self._ids.insert(i, promoted_node.plan_id)
+                promoted.append(promoted_node.plan_id)
+                i += 1
+            low = node.a
+        return promoted
@@ -0,0 +1,224 @@
+"""
+Batched Distance Matrix lookups for the Auditor.
+
+Instead of one request per pair of consecutive activities, every leg of the
+itinerary is collected first, grouped into departure-time buckets and sent as
+multi-origin / multi-destination requests that stay inside the API element
+limits. Results are mapped back to the individual legs.
+"""
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Distance Matrix API limits (per request)
+MAX_ELEMENTS_PER_REQUEST = 100
+MAX_ORIGINS_PER_REQUEST = 25
+MAX_DESTINATIONS_PER_REQUEST = 25
+
+# Legs departing within the same bucket share one departure_time
+DEPARTURE_BUCKET_MINUTES = 15
+
+
+@dataclass(frozen=True)
+class Leg:
+    origin: str            # place_id
+    destination: str       # place_id
+    departure_time: datetime
+
+
+@dataclass
+class LegResult:
+    status: str                       # Distance Matrix element status, or "ERROR"
+    duration_in_traffic: Optional[int] = None  # seconds
+    error: Optional[str] = None
+
+
+@dataclass
+class MatrixRequest:
+    departure_time: datetime    # start of the departure bucket, the key of the request's cells
+    origins: List[str]
+    destinations: List[str]
+
+    @property
+    def elements(self) -> int:
+        return len(self.origins) * len(self.destinations)
+
+
+def departure_bucket(departure_time: datetime, minutes: int = DEPARTURE_BUCKET_MINUTES) -> datetime:
+    """Floor a departure time to the start of its bucket."""
+    floored = departure_time.replace(second=0, microsecond=0)
+    return floored - timedelta(minutes=floored.minute % minutes)
+
+
+def request_departure(bucket_start: datetime) -> datetime:
+    """
+    departure_time sent to the API for a bucket: the API rejects past times, and
+    flooring puts legs leaving within the current bucket in the past.
+    """
+    return max(bucket_start, datetime.now(bucket_start.tzinfo))
+
+
+def plan_requests(legs: List[Leg],
+                  bucket_minutes: int = DEPARTURE_BUCKET_MINUTES,
+                  max_elements: int = MAX_ELEMENTS_PER_REQUEST) -> List[MatrixRequest]:
+    """
+    Pack legs into as few matrix requests as possible.
+
+    Within a bucket, origins are added to a request together with all of their
+    destinations as long as origins x destinations stays within the limits.
+    Every cell of the matrix is billed, so an origin is never split across
+    requests unless its own destinations exceed the limit.
+    """
+    by_bucket: Dict[datetime, Dict[str, List[str]]] = {}
+    for leg in legs:
+        origins = by_bucket.setdefault(departure_bucket(leg.departure_time, bucket_minutes), {})
+        destinations = origins.setdefault(leg.origin, [])
+        if leg.destination not in destinations:
+            destinations.append(leg.destination)
+
+    max_dest = min(MAX_DESTINATIONS_PER_REQUEST, max_elements)
+    requests: List[MatrixRequest] = []
+    for bucket in sorted(by_bucket):
+        current_origins: List[str] = []
+        current_dests: List[str] = []
+        for origin, destinations in by_bucket[bucket].items():
+            # An origin with too many destinations gets its own requests
+            if len(destinations) > max_dest:
+                for i in range(0, len(destinations), max_dest):
+                    requests.append(MatrixRequest(bucket, [origin], destinations[i:i + max_dest]))
+                continue
+
+            merged = current_dests + [d for d in destinations if d not in current_dests]
+            fits = (
+                len(current_origins) + 1 <= MAX_ORIGINS_PER_REQUEST
+                and len(merged) <= max_dest
+                and (len(current_origins) + 1) * len(merged) <= max_elements
+            )
+            if current_origins and not fits:
+                requests.append(MatrixRequest(bucket, current_origins, current_dests))
+                current_origins, merged = [], list(destinations)
+            current_origins.append(origin)
+            current_dests = merged
+        if current_origins:
+            requests.append(MatrixRequest(bucket, current_origins, current_dests))
+    return requests
+
+
+class DistanceMatrixBatcher:
+    """
+    Resolves many legs with the minimum number of Distance Matrix calls.
+
+    client: `googlemaps.Client` (sync, run in the default executor) or any
+    object whose `distance_matrix` is a coroutine function.
+    cache: optional TravelTimeCache; only legs it cannot answer are requested.
+    """
+
+    def __init__(self, client: Any, traffic_model: str = "pessimistic",
+                 bucket_minutes: int = DEPARTURE_BUCKET_MINUTES,
+                 max_elements: int = MAX_ELEMENTS_PER_REQUEST,
+                 cache: Any = None):
+        self.client = client
+        self.traffic_model = traffic_model
+        self.bucket_minutes = bucket_minutes
+        self.max_elements = max_elements
+        self.cache = cache
+        self.stats = {"legs": 0, "cache_hits": 0, "requests": 0, "elements": 0, "api_seconds": 0.0}
+
+    async def _distance_matrix(self, request: MatrixRequest) -> Dict[str, Any]:
+        kwargs = dict(
+            origins=[f"place_id:{p}" for p in request.origins],
+            destinations=[f"place_id:{p}" for p in request.destinations],
+            departure_time=request_departure(request.departure_time),
+            traffic_model=self.traffic_model,
+        )
+        if inspect.iscoroutinefunction(self.client.distance_matrix):
+            return await self.client.distance_matrix(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.client.distance_matrix(**kwargs))
+
+    async def _run_request(self, request: MatrixRequest) -> Dict[Tuple[datetime, str, str], LegResult]:
+        cells: Dict[Tuple[datetime, str, str], LegResult] = {}
+        started = time.perf_counter()
+        try:
+            res = await self._distance_matrix(request)
+        except Exception as e:
+            for origin in request.origins:
+                for destination in request.destinations:
+                    cells[(request.departure_time, origin, destination)] = LegResult("ERROR", error=str(e))
+            return cells
+
+        for row, origin in zip(res["rows"], request.origins):
+            for element, destination in zip(row["elements"], request.destinations):
+                seconds = None
+                if element["status"] == "OK":
+                    seconds = element.get("duration_in_traffic", element.get("duration", {})).get("value")
+                cells[(request.departure_time, origin, destination)] = LegResult(element["status"], seconds)
+        self.stats["api_seconds"] += time.perf_counter() - started
+        return cells
+
+    def _cache_key(self, leg: Leg):
+        # Imported lazily: travel_time_cache depends on this module for bucketing
+        from travel_time_cache import make_key
+        return make_key(leg.origin, leg.destination, leg.departure_time, self.traffic_model, self.bucket_minutes)
+
+    async def resolve(self, legs: List[Leg]) -> Dict[Leg, LegResult]:
+        """Look up every leg; one batch of concurrent matrix requests in total."""
+        self.stats["legs"] += len(legs)
+        results: Dict[Leg, LegResult] = {}
+
+        pending = legs
+        if self.cache is not None:
+            pending = []
+            for leg in legs:
+                seconds = await self.cache.aget(self._cache_key(leg))
+                if seconds is None:
+                    pending.append(leg)
+                else:
+                    results[leg] = LegResult("OK", seconds)
+                    self.stats["cache_hits"] += 1
+
+        requests = plan_requests(pending, self.bucket_minutes, self.max_elements)
+        self.stats["requests"] += len(requests)
+        self.stats["elements"] += sum(r.elements for r in requests)
+
+        cells: Dict[Tuple[datetime, str, str], LegResult] = {}
+        for partial in await asyncio.gather(*(self._run_request(r) for r in requests)):
+            cells.update(partial)
+
+        for leg in pending:
+            key = (departure_bucket(leg.departure_time, self.bucket_minutes), leg.origin, leg.destination)
+            result = cells.get(key, LegResult("NOT_FOUND", error="leg missing from matrix response"))
+            if self.cache is not None and result.status == "OK" and result.duration_in_traffic is not None:
+                await self.cache.aput(self._cache_key(leg), result.duration_in_traffic)
+            results[leg] = result
+        return results
+
+
+# --- Offline efficiency check ---
+if __name__ == "__main__":
+    import random
+    from maps_fakes import FakeMapsClient
+
+    random.seed(7)
+    places = [f"MockPlace{i}" for i in range(30)]
+    legs = []
+    for day in range(10):
+        date = datetime(2024, 6, 1) + timedelta(days=day)
+        stops = random.sample(places, 6)
+        for i in range(len(stops) - 1):
+            legs.append(Leg(stops[i], stops[i + 1], date + timedelta(hours=9 + 2 * i)))
+    # Two travellers sharing the same morning legs
+    legs += [Leg(l.origin, l.destination, l.departure_time + timedelta(minutes=5)) for l in legs[:10]]
+
+    fake = FakeMapsClient()
+    for leg in legs:
+        fake.distance_matrix(leg.origin, leg.destination, departure_time=leg.departure_time)
+    print(f"Per-pair : {len(legs)} legs -> {fake.requests} requests, {fake.elements} elements")
+
+    fake.reset_stats()
+    batcher = DistanceMatrixBatcher(fake)
+    asyncio.run(batcher.resolve(legs))
+    print(f"Batched  : {len(legs)} legs -> {fake.requests} requests, {fake.elements} elements")
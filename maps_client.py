@@ -0,0 +1,240 @@
+"""
+Shared asyncio Google Maps client.
+
+Replaces the synchronous `googlemaps.Client` + `run_in_executor` pattern:
+- httpx.AsyncClient with keep-alive and a bounded connection pool
+- a semaphore capping in-flight requests
+- a token bucket capping requests per second (API quota)
+- retries with jittered exponential backoff on OVER_QUERY_LIMIT / 5xx
+
+Sync callers (Streamlit pages, scripts) go through `run_sync`, which executes
+coroutines on one long-lived background event loop.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+GOOGLE_MAPS_BASE_URL = "https://maps.googleapis.com"
+
+RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+
+class MapsApiError(Exception):
+    """Non-OK status returned by the Maps API (same role as googlemaps.exceptions.ApiError)."""
+
+    def __init__(self, status: str, message: Optional[str] = None):
+        self.status = status
+        self.message = message
+        super().__init__(f"{status} ({message})" if message else status)
+
+
+class TokenBucket:
+    """
+    Requests-per-second limiter. Tokens may go negative: each caller reserves
+    a token immediately and sleeps off its own debt, so no lock is held while waiting.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _as_param(value: Union[str, List[str]]) -> str:
+    if isinstance(value, (list, tuple)):
+        return "|".join(value)
+    return value
+
+
+class _LoopResources:
+    """httpx pools and semaphores are bound to the event loop that created them."""
+
+    def __init__(self, client: "AsyncMapsClient"):
+        self.http = httpx.AsyncClient(
+            base_url=client.base_url,
+            timeout=client.timeout,
+            limits=httpx.Limits(
+                max_connections=client.max_connections,
+                max_keepalive_connections=client.max_connections,
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(client.max_concurrency)
+
+
+class AsyncMapsClient:
+    """
+    Native asyncio counterpart of the googlemaps.Client methods the agent uses.
+
+    One instance can be shared by every coroutine in the process; connection
+    pools are created lazily per event loop.
+    """
+
+    def __init__(self, key: str, base_url: str = GOOGLE_MAPS_BASE_URL,
+                 max_concurrency: int = 10, requests_per_second: float = 50.0,
+                 max_connections: int = 20, max_retries: int = 4,
+                 backoff_base: float = 0.2, backoff_cap: float = 5.0,
+                 timeout: float = 10.0):
+        if not key or (base_url == GOOGLE_MAPS_BASE_URL and not key.startswith("AIza")):
+            raise ValueError("Invalid API key provided.")
+        self.key = key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.stats = {"requests": 0, "retries": 0, "errors": 0}
+        self._resources: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopResources]" = weakref.WeakKeyDictionary()
+
+    def _loop_resources(self) -> _LoopResources:
+        loop = asyncio.get_running_loop()
+        resources = self._resources.get(loop)
+        if resources is None:
+            resources = self._resources[loop] = _LoopResources(self)
+        return resources
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        resources = self._loop_resources()
+        params = {k: v for k, v in params.items() if v is not None}
+        params["key"] = self.key
+
+        attempt = 0
+        while True:
+            async with resources.semaphore:
+                await self.rate_limiter.acquire()
+                self.stats["requests"] += 1
+                try:
+                    response = await resources.http.get(path, params=params)
+                    retryable = response.status_code == 429 or response.status_code >= 500
+                    body = None if retryable else response.json()
+                    status = body.get("status", "OK") if body else f"HTTP_{response.status_code}"
+                except httpx.TransportError as e:
+                    retryable, body, status = True, None, f"TRANSPORT_ERROR: {e}"
+
+            if body is not None and status not in RETRYABLE_STATUSES:
+                if status not in ("OK", "ZERO_RESULTS"):
+                    self.stats["errors"] += 1
+                    raise MapsApiError(status, body.get("error_message"))
+                return body
+
+            if attempt >= self.max_retries:
+                self.stats["errors"] += 1
+                raise MapsApiError(status, "retries exhausted")
+
+            # Full jitter: spreads retries of concurrent callers apart
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+
+    # --- API methods (signatures follow googlemaps.Client) ---
+
+    async def distance_matrix(self, origins, destinations, mode: Optional[str] = None,
+                              departure_time: Optional[datetime] = None,
+                              traffic_model: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        params = {
+            "origins": _as_param(origins),
+            "destinations": _as_param(destinations),
+            "mode": mode,
+            "traffic_model": traffic_model,
+            "departure_time": int(departure_time.timestamp()) if isinstance(departure_time, datetime) else departure_time,
+        }
+        params.update(kwargs)
+        return await self._get("/maps/api/distancematrix/json", params)
+
+    async def place(self, place_id: str, fields: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        params = {"place_id": place_id, "fields": ",".join(fields) if fields else None}
+        params.update(kwargs)
+        return await self._get("/maps/api/place/details/json", params)
+
+    async def geocode(self, address: str, **kwargs) -> List[Dict[str, Any]]:
+        params = {"address": address}
+        params.update(kwargs)
+        return (await self._get("/maps/api/geocode/json", params)).get("results", [])
+
+    async def aclose(self):
+        """Close the pool of the current event loop."""
+        loop = asyncio.get_running_loop()
+        resources = self._resources.pop(loop, None)
+        if resources:
+            await resources.http.aclose()
+
+
+# --- Process-wide sharing ---
+
+_shared_clients: Dict[str, AsyncMapsClient] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_maps_client(key: Optional[str], **kwargs) -> Optional[AsyncMapsClient]:
+    """
+    One AsyncMapsClient per API key and process (so rate limits are shared).
+    Returns None when no valid key is configured, which callers treat as mock mode.
+    """
+    if not key:
+        return None
+    with _shared_lock:
+        if key not in _shared_clients:
+            try:
+                _shared_clients[key] = AsyncMapsClient(key, **kwargs)
+            except ValueError:
+                return None
+        return _shared_clients[key]
+
+
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def run_sync(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the shared background loop from synchronous code."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="maps-client-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result(timeout)
+
+
+# --- Offline throughput check ---
+if __name__ == "__main__":
+    from maps_fakes import FakeMapsServer
+
+    async def main():
+        async with FakeMapsServer(latency=0.02, over_query_limit_rate=0.05) as server:
+            client = AsyncMapsClient("fake-key", base_url=server.base_url,
+                                     max_concurrency=20, requests_per_second=500, backoff_base=0.01)
+            n = 1000
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                client.distance_matrix(f"place_id:A{i % 50}", f"place_id:B{i % 37}") for i in range(n)
+            ))
+            elapsed = time.perf_counter() - started
+            await client.aclose()
+            print(f"{n} requests in {elapsed:.2f}s ({n / elapsed:.0f} req/s), "
+                  f"{server.connections} connections, {client.stats['retries']} retries, "
+                  f"max in-flight {server.max_in_flight}")
+
+    asyncio.run(main())
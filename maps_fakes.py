@@ -0,0 +1,206 @@
+"""
+Offline stand-ins for the Google Maps client.
+
+FakeMapsClient mirrors the parts of `googlemaps.Client` the agent uses and
+counts every request/element it serves, so batching and caching strategies
+can be measured without network access or API quota.
+
+FakeMapsServer is a local HTTP server speaking the same JSON endpoints, used
+to measure the throughput of maps_client.AsyncMapsClient.
+"""
+import asyncio
+import json
+import random
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+
+def _as_list(value: Union[str, List[str]]) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def fake_travel_seconds(origin: str, destination: str, departure_time: Optional[datetime] = None) -> int:
+    """
+    Deterministic pseudo travel time between two places.
+    Rush hours (8-10h, 17-19h) add 40% to simulate pessimistic traffic.
+    """
+    if origin == destination:
+        return 0
+    # crc32 is stable across processes (unlike hash()), so numbers are reproducible
+    base = 8 * 60 + zlib.crc32(f"{origin}|{destination}".encode("utf-8")) % (40 * 60)
+    if departure_time and departure_time.hour in (8, 9, 17, 18):
+        base = int(base * 1.4)
+    return base
+
+
+def distance_matrix_response(origins: List[str], destinations: List[str],
+                             departure_time: Optional[datetime] = None) -> Dict[str, Any]:
+    rows = []
+    for origin in origins:
+        elements = []
+        for destination in destinations:
+            seconds = fake_travel_seconds(origin, destination, departure_time)
+            elements.append({
+                "status": "OK",
+                "distance": {"value": seconds * 8, "text": f"{seconds * 8 / 1000:.1f} km"},
+                "duration": {"value": int(seconds / 1.2), "text": f"{int(seconds / 72)} mins"},
+                "duration_in_traffic": {"value": seconds, "text": f"{seconds // 60} mins"},
+            })
+        rows.append({"elements": elements})
+
+    return {
+        "status": "OK",
+        "origin_addresses": origins,
+        "destination_addresses": destinations,
+        "rows": rows,
+    }
+
+
+def geocode_response(address: str) -> Dict[str, Any]:
+    # Somewhere in central Paris, stable per address
+    h = zlib.crc32(address.encode("utf-8"))
+    lat = 48.80 + (h % 1000) / 10000
+    lng = 2.25 + (h // 1000 % 1500) / 10000
+    return {
+        "status": "OK",
+        "results": [{"formatted_address": address, "geometry": {"location": {"lat": lat, "lng": lng}}}],
+    }
+
+
+def place_details_response(place_id: str) -> Dict[str, Any]:
+    return {"status": "OK", "result": {"place_id": place_id, "name": place_id}}
+
+
+class FakeMapsClient:
+    """
+    Local replacement for `googlemaps.Client` (synchronous, like the real one).
+
+    latency: seconds slept per request to simulate a network round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self.elements = 0
+        self.calls: List[Dict[str, Any]] = []
+
+    def reset_stats(self):
+        self.requests = 0
+        self.elements = 0
+        self.calls = []
+
+    def distance_matrix(self, origins, destinations, mode=None, departure_time=None,
+                        traffic_model=None, **kwargs) -> Dict[str, Any]:
+        origins = _as_list(origins)
+        destinations = _as_list(destinations)
+        if self.latency:
+            time.sleep(self.latency)
+
+        self.requests += 1
+        self.elements += len(origins) * len(destinations)
+        self.calls.append({
+            "origins": origins,
+            "destinations": destinations,
+            "departure_time": departure_time,
+            "traffic_model": traffic_model,
+        })
+
+        return distance_matrix_response(origins, destinations, departure_time)
+
+    def place(self, place_id: str, fields=None, **kwargs) -> Dict[str, Any]:
+        self.requests += 1
+        return place_details_response(place_id)
+
+    def geocode(self, address: str, **kwargs) -> List[Dict[str, Any]]:
+        self.requests += 1
+        return geocode_response(address)["results"]
+
+
+class FakeMapsServer:
+    """
+    Minimal HTTP/1.1 server (keep-alive) serving the Maps JSON endpoints.
+
+    latency: seconds added to every response.
+    over_query_limit_rate: fraction of requests answered with OVER_QUERY_LIMIT.
+
+    Usage:
+        async with FakeMapsServer() as server:
+            client = AsyncMapsClient("fake-key", base_url=server.base_url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, over_query_limit_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.over_query_limit_rate = over_query_limit_rate
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _route(self, path: str, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        if random.random() < self.over_query_limit_rate:
+            return {"status": "OVER_QUERY_LIMIT", "error_message": "simulated quota exhaustion"}
+
+        arg = lambda name: query.get(name, [""])[0]
+        if path == "/maps/api/distancematrix/json":
+            departure = arg("departure_time")
+            departure_time = datetime.fromtimestamp(int(departure)) if departure.isdigit() else None
+            return distance_matrix_response(arg("origins").split("|"), arg("destinations").split("|"), departure_time)
+        if path == "/maps/api/geocode/json":
+            return geocode_response(arg("address"))
+        if path == "/maps/api/place/details/json":
+            return place_details_response(arg("place_id"))
+        return {"status": "INVALID_REQUEST", "error_message": f"unknown endpoint {path}"}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+                _, target, _ = request_line.split(" ", 2)
+                url = urlsplit(target)
+
+                self.requests += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    body = json.dumps(self._route(url.path, parse_qs(url.query))).encode("utf-8")
+                finally:
+                    self.in_flight -= 1
+
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
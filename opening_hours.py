@@ -0,0 +1,378 @@
+"""
+Opening-hours engine for the Auditor.
+
+Place details are fetched once per place and compiled into a compact weekly
+interval table (minutes since Monday 00:00). Exception dates (holidays,
+special hours) and organisational closure rules (e.g. "卢浮宫周二闭馆") are
+layered on top. Checks never call the API:
+
+- single activity: bisect on the place's sorted intervals, O(log n)
+- whole itinerary: one np.searchsorted over the flattened tables of all places
+
+Compiled tables are cached on disk (JSON) and refreshed after `max_age_days`.
+"""
+import asyncio
+import bisect
+import inspect
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# One week plus the following Monday, so windows running past Sunday midnight resolve
+TABLE_SPAN = MINUTES_PER_WEEK + MINUTES_PER_DAY
+
+Interval = Tuple[int, int]
+
+
+def _hhmm(value: str) -> int:
+    return int(value[:2]) * 60 + int(value[2:])
+
+
+def _google_day_to_weekday(day: int) -> int:
+    # Places API: 0 = Sunday; Python: 0 = Monday
+    return (day - 1) % 7
+
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals: List[Interval], cut_start: int, cut_end: int) -> List[Interval]:
+    result = []
+    for start, end in intervals:
+        if end <= cut_start or start >= cut_end:
+            result.append((start, end))
+            continue
+        if start < cut_start:
+            result.append((start, cut_start))
+        if end > cut_end:
+            result.append((cut_end, end))
+    return result
+
+
+def compile_weekly(periods: List[Dict[str, Any]]) -> List[Interval]:
+    """Compile Places API `opening_hours.periods` into merged minute-of-week intervals over TABLE_SPAN."""
+    intervals: List[Interval] = []
+    for period in periods:
+        opening = period["open"]
+        closing = period.get("close")
+        if closing is None:
+            # Documented encoding of "open 24/7"
+            return [(0, TABLE_SPAN)]
+        start = _google_day_to_weekday(opening["day"]) * MINUTES_PER_DAY + _hhmm(opening["time"])
+        end = _google_day_to_weekday(closing["day"]) * MINUTES_PER_DAY + _hhmm(closing["time"])
+        if end <= start:
+            end += MINUTES_PER_WEEK
+        intervals.append((start, end))
+
+    wrapped: List[Interval] = []
+    for start, end in intervals:
+        wrapped.append((start, min(end, TABLE_SPAN)))
+        if end > MINUTES_PER_WEEK:
+            # Sunday-night opening continues into Monday morning
+            wrapped.append((0, end - MINUTES_PER_WEEK))
+        if start < MINUTES_PER_DAY:
+            # Monday repeated after Sunday
+            wrapped.append((start + MINUTES_PER_WEEK, min(end + MINUTES_PER_WEEK, TABLE_SPAN)))
+    return _merge(wrapped)
+
+
+def compile_exceptions(details: Dict[str, Any]) -> Dict[str, List[Interval]]:
+    """
+    Exception dates from `current_opening_hours.special_days`.
+    Returns {YYYY-MM-DD: [(start, end) minutes of that day]}; an empty list means closed all day.
+    """
+    current = details.get("current_opening_hours") or {}
+    exceptions: Dict[str, List[Interval]] = {}
+    for special in current.get("special_days", []):
+        exceptions[special["date"]] = []
+    for period in current.get("periods", []):
+        opening = period.get("open", {})
+        date = opening.get("date")
+        if date not in exceptions:
+            continue
+        closing = period.get("close")
+        start = _hhmm(opening["time"])
+        end = MINUTES_PER_DAY if closing is None else _hhmm(closing["time"])
+        if closing is not None and closing.get("date", date) != date:
+            end += MINUTES_PER_DAY
+        exceptions[date].append((start, end))
+    return {date: _merge(intervals) for date, intervals in exceptions.items()}
+
+
+@dataclass
+class PlaceSchedule:
+    place_id: str
+    name: str = ""
+    weekly: Optional[List[Interval]] = None   # None: no opening hours published, treated as always open
+    exceptions: Dict[str, List[Interval]] = field(default_factory=dict)
+    closed_weekdays: List[int] = field(default_factory=list)  # from organisational rules, not persisted
+    fetched_at: float = 0.0
+
+    def effective_weekly(self) -> List[Interval]:
+        intervals = list(self.weekly) if self.weekly is not None else [(0, TABLE_SPAN)]
+        for weekday in self.closed_weekdays:
+            intervals = _subtract(intervals, weekday * MINUTES_PER_DAY, (weekday + 1) * MINUTES_PER_DAY)
+            if weekday == 0:
+                intervals = _subtract(intervals, MINUTES_PER_WEEK, TABLE_SPAN)
+        return intervals
+
+    def is_open(self, date_str: str, start: dtime, end: dtime) -> bool:
+        """Is the place open for the whole [start, end] window on date_str? O(log n)."""
+        begin = start.hour * 60 + start.minute
+        finish = end.hour * 60 + end.minute
+        if finish < begin:
+            finish += MINUTES_PER_DAY
+
+        if date_str in self.exceptions:
+            intervals = self.exceptions[date_str]
+        else:
+            offset = datetime.strptime(date_str, "%Y-%m-%d").weekday() * MINUTES_PER_DAY
+            begin, finish = begin + offset, finish + offset
+            intervals = self.effective_weekly()
+
+        starts = [s for s, _ in intervals]
+        i = bisect.bisect_right(starts, begin) - 1
+        return i >= 0 and intervals[i][1] >= finish
+
+    def day_windows(self, date_str: str) -> List[Interval]:
+        """Open intervals of date_str in minutes since its midnight (past 24:00 for overnight hours)."""
+        if date_str in self.exceptions:
+            return list(self.exceptions[date_str])
+        offset = datetime.strptime(date_str, "%Y-%m-%d").weekday() * MINUTES_PER_DAY
+        return [(max(start, offset) - offset, min(end, offset + 2 * MINUTES_PER_DAY) - offset)
+                for start, end in self.effective_weekly() if end > offset and start < offset + 2 * MINUTES_PER_DAY]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "weekly": self.weekly,
+            "exceptions": self.exceptions,
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_json(cls, place_id: str, data: Dict[str, Any]) -> "PlaceSchedule":
+        weekly = data.get("weekly")
+        return cls(
+            place_id=place_id,
+            name=data.get("name", ""),
+            weekly=[tuple(i) for i in weekly] if weekly is not None else None,
+            exceptions={d: [tuple(i) for i in v] for d, v in data.get("exceptions", {}).items()},
+            fetched_at=data.get("fetched_at", 0.0),
+        )
+
+    @classmethod
+    def from_details(cls, place_id: str, details: Dict[str, Any]) -> "PlaceSchedule":
+        hours = details.get("opening_hours")
+        return cls(
+            place_id=place_id,
+            name=details.get("name", ""),
+            weekly=compile_weekly(hours["periods"]) if hours and hours.get("periods") else None,
+            exceptions=compile_exceptions(details),
+            fetched_at=time.time(),
+        )
+
+
+@dataclass
+class ActivityWindow:
+    title: str
+    place_id: str
+    date: str          # YYYY-MM-DD
+    start_time: dtime
+    end_time: dtime
+
+
+class OpeningHoursStore:
+    """
+    Compiled schedules for every place the agent has seen.
+
+    fetch_details: callable(place_id) -> Places API `result` dict; sync or async.
+    closure_rules: [{"keywords": [...], "closed_weekdays": [...]}] matched against the place name and
+    every activity title seen for the place; all matching rules apply.
+    """
+
+    def __init__(self, fetch_details: Optional[Callable[[str], Any]] = None,
+                 path: Optional[str] = "opening_hours_cache.json",
+                 closure_rules: Optional[List[Dict[str, Any]]] = None,
+                 max_age_days: float = 7.0):
+        self.fetch_details = fetch_details
+        self.path = path
+        self.closure_rules = closure_rules or []
+        self.max_age_seconds = max_age_days * 86400
+        self.schedules: Dict[str, PlaceSchedule] = {}
+        self._index = None
+        self._titles: Dict[str, Set[str]] = {}
+        # One fetch per place at a time: concurrent callers (e.g. planner branches) await the same task
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for place_id, data in json.load(f).items():
+                    self.schedules[place_id] = PlaceSchedule.from_json(place_id, data)
+
+    def save(self):
+        if self.path:
+            self._write(self._snapshot())
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {pid: s.to_json() for pid, s in self.schedules.items()}
+
+    def _write(self, payload: Dict[str, Any]):
+        # Serialized: saves from concurrent audits run in worker threads and share the temp file
+        with self._save_lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def _apply_rules(self, schedule: PlaceSchedule) -> bool:
+        """True when the place's closed weekdays changed."""
+        # Rules matched by the place name or any title the place was planned under, merged
+        text = " ".join([schedule.name, *sorted(self._titles.get(schedule.place_id, ()))])
+        closed = set()
+        for rule in self.closure_rules:
+            if any(keyword in text for keyword in rule["keywords"]):
+                closed.update(rule["closed_weekdays"])
+        closed = sorted(closed)
+        changed = closed != schedule.closed_weekdays
+        schedule.closed_weekdays = closed
+        return changed
+
+    async def _fetch(self, place_id: str) -> Dict[str, Any]:
+        if inspect.iscoroutinefunction(self.fetch_details):
+            return await self.fetch_details(place_id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.fetch_details, place_id)
+
+    async def _refresh(self, place_id: str):
+        try:
+            details = await self._fetch(place_id)
+        finally:
+            self._inflight.pop((asyncio.get_running_loop(), place_id), None)
+        schedule = self.schedules[place_id] = PlaceSchedule.from_details(place_id, details or {})
+        self._apply_rules(schedule)
+        self._index = None
+
+    async def ensure_places(self, places: Union[Dict[str, str], Iterable[Tuple[str, str]]]):
+        """
+        Make sure every place_id (-> activity title, or (place_id, title) pairs
+        when several activities share a place) has a compiled schedule. Only
+        unknown or stale places hit the API, concurrently, and a place already
+        being fetched by another call is awaited rather than fetched again; the
+        disk cache is written in a worker thread.
+        """
+        pairs = list(places.items() if isinstance(places, dict) else places)
+        new_titles = set()
+        for pid, title in pairs:
+            titles = self._titles.setdefault(pid, set())
+            if title not in titles:
+                titles.add(title)
+                new_titles.add(pid)
+        places = {pid: title for pid, title in pairs}
+        now = time.time()
+        missing = [
+            pid for pid in places
+            if pid not in self.schedules or now - self.schedules[pid].fetched_at > self.max_age_seconds
+        ]
+        if missing and self.fetch_details:
+            loop = asyncio.get_running_loop()
+            tasks, started = [], False
+            for pid in missing:
+                task = self._inflight.get((loop, pid))
+                if task is None:
+                    task = self._inflight[(loop, pid)] = asyncio.create_task(self._refresh(pid))
+                    started = True
+                tasks.append(task)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for pid, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    print(f"Opening hours fetch failed for {pid}: {result}")
+            # The call that started fetches saves them
+            if started and self.path:
+                await asyncio.to_thread(self._write, self._snapshot())
+
+        # Fetched places got their rules in _refresh; otherwise rules change only with a new title,
+        # and the weekly index is rebuilt only when some place's closed weekdays did
+        changed = False
+        for pid in new_titles:
+            if pid in self.schedules:
+                changed |= self._apply_rules(self.schedules[pid])
+        if changed:
+            self._index = None
+
+    def is_open(self, place_id: str, date_str: str, start: dtime, end: dtime) -> Optional[bool]:
+        """None when the place has never been compiled."""
+        schedule = self.schedules.get(place_id)
+        if schedule is None:
+            return None
+        return schedule.is_open(date_str, start, end)
+
+    def day_windows(self, place_id: str, date_str: str) -> Optional[List[Interval]]:
+        """None when the place has never been compiled."""
+        schedule = self.schedules.get(place_id)
+        if schedule is None:
+            return None
+        return schedule.day_windows(date_str)
+
+    def _build_index(self):
+        # Flatten all weekly tables into one sorted array: key = place position * TABLE_SPAN + minute
+        positions, starts, ends = {}, [], []
+        for pos, (pid, schedule) in enumerate(self.schedules.items()):
+            positions[pid] = pos
+            for start, end in schedule.effective_weekly():
+                starts.append(pos * TABLE_SPAN + start)
+                ends.append(pos * TABLE_SPAN + end)
+        self._index = (positions, np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+        return self._index
+
+    def check_windows(self, windows: Sequence[ActivityWindow]) -> np.ndarray:
+        """
+        Vectorized check of many activities. Returns a boolean array, True = open
+        for the whole window. Places without a schedule count as open.
+        """
+        positions, starts, ends = self._index or self._build_index()
+        n = len(windows)
+        result = np.ones(n, dtype=bool)
+        if n == 0:
+            return result
+
+        pos = np.fromiter((positions.get(w.place_id, -1) for w in windows), dtype=np.int64, count=n)
+        weekday = np.fromiter((datetime.strptime(w.date, "%Y-%m-%d").weekday() for w in windows), dtype=np.int64, count=n)
+        begin = np.fromiter((w.start_time.hour * 60 + w.start_time.minute for w in windows), dtype=np.int64, count=n)
+        finish = np.fromiter((w.end_time.hour * 60 + w.end_time.minute for w in windows), dtype=np.int64, count=n)
+        finish = np.where(finish < begin, finish + MINUTES_PER_DAY, finish)
+
+        known = pos >= 0
+        base = pos * TABLE_SPAN + weekday * MINUTES_PER_DAY
+        key_begin = base + begin
+        key_finish = base + finish
+
+        idx = np.searchsorted(starts, key_begin, side="right") - 1
+        safe_idx = np.clip(idx, 0, max(len(starts) - 1, 0))
+        if len(starts):
+            covered = (idx >= 0) & (starts[safe_idx] >= pos * TABLE_SPAN) & (ends[safe_idx] >= key_finish)
+        else:
+            covered = np.zeros(n, dtype=bool)
+        result[known] = covered[known]
+
+        # Exception dates are rare: resolve them individually
+        for i, w in enumerate(windows):
+            schedule = self.schedules.get(w.place_id)
+            if schedule is not None and w.date in schedule.exceptions:
+                result[i] = schedule.is_open(w.date, w.start_time, w.end_time)
+        return result
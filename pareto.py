@@ -0,0 +1,166 @@
+"""
+Pareto frontier engine (all objectives are maximized).
+
+A plan is on the frontier when no other plan is >= in every objective and >
+in at least one. Same semantics as the original `identify_pareto` loop:
+identical plans do not dominate each other (both stay on the frontier) and a
+plan with a NaN objective is never dominated and never dominates.
+
+- 2 objectives: sort-and-sweep, O(n log n), fully vectorized
+- k objectives: plans sorted so that every dominator comes before the plans it
+  dominates, then compared block by block against the frontier found so far
+- pareto_ranks: layered non-dominated sorting (0 = frontier, 1 = frontier of
+  the rest, ...)
+
+To minimize an objective, pass its negation.
+"""
+import bisect
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Comparisons (block rows x frontier size x k) per block in the k-objective sweep
+BLOCK_ELEMENTS = 1 << 22
+
+ArrayLike = Union[np.ndarray, pd.DataFrame, Sequence[Sequence[float]]]
+
+
+def _as_matrix(values: ArrayLike) -> np.ndarray:
+    matrix = values.to_numpy(dtype=np.float64) if isinstance(values, pd.DataFrame) else np.asarray(values, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    return matrix
+
+
+def _mask_1d(a: np.ndarray) -> np.ndarray:
+    return a >= a.max()
+
+
+def _mask_2d(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Sort by a descending; points sharing a value of `a` form a group
+    order = np.lexsort((-b, -a))
+    a_sorted, b_sorted = a[order], b[order]
+    starts = np.flatnonzero(np.r_[True, a_sorted[1:] != a_sorted[:-1]])
+    group_max = np.maximum.reduceat(b_sorted, starts)
+    # Best b among strictly larger a (exclusive running max over the groups)
+    before = np.r_[-np.inf, np.maximum.accumulate(group_max)[:-1]]
+    sizes = np.diff(np.r_[starts, len(a_sorted)])
+    # Dominated by a larger a with b >= ours, or by the same a with a larger b
+    dominated_sorted = (np.repeat(before, sizes) >= b_sorted) | (np.repeat(group_max, sizes) > b_sorted)
+    mask = np.empty(len(a), dtype=bool)
+    mask[order] = ~dominated_sorted
+    return mask
+
+
+def _dominated_by(candidates: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """For each row of `points`: is it dominated by any row of `candidates`?"""
+    if len(candidates) == 0 or len(points) == 0:
+        return np.zeros(len(points), dtype=bool)
+    # One (points x candidates) comparison per objective; reducing over a short last axis is much slower
+    ge = np.ones((len(points), len(candidates)), dtype=bool)
+    gt = np.zeros((len(points), len(candidates)), dtype=bool)
+    for j in range(points.shape[1]):
+        c, p = candidates[None, :, j], points[:, None, j]
+        ge &= c >= p
+        gt |= c > p
+    return (ge & gt).any(axis=1)
+
+
+def _mask_kd(matrix: np.ndarray) -> np.ndarray:
+    n, k = matrix.shape
+    # Sum first (dominators have a sum >= ours), objectives lexicographically to break ties:
+    # any dominator of a point is ordered before it
+    keys = [-matrix[:, j] for j in reversed(range(k))] + [-matrix.sum(axis=1)]
+    order = np.lexsort(keys)
+    sorted_matrix = matrix[order]
+
+    dominated_sorted = np.zeros(n, dtype=bool)
+    frontier = np.empty((0, k))
+    # Survivors of a block are compared pairwise; keep that square within BLOCK_ELEMENTS
+    max_survivors = max(1, int(np.sqrt(BLOCK_ELEMENTS // k)))
+    size, i = 256, 0
+    while i < n:
+        block = sorted_matrix[i:i + size]
+        dominated = _dominated_by(frontier, block)
+        survivors = block[~dominated]
+        # Within the block only earlier points can dominate; comparing all pairs is equivalent
+        dominated[~dominated] = _dominated_by(survivors, survivors)
+        dominated_sorted[i:i + len(block)] = dominated
+        frontier = np.vstack([frontier, block[~dominated]])
+        i += len(block)
+        # Blocks grow while few plans survive the frontier filter (the usual case once it has formed)
+        limit = max(1, BLOCK_ELEMENTS // (max(len(frontier), 1) * k))
+        size = min(limit, size * 2 if len(survivors) <= max_survivors // 2 else max(1, size // 2))
+
+    mask = np.empty(n, dtype=bool)
+    mask[order] = ~dominated_sorted
+    return mask
+
+
+def pareto_mask(values: ArrayLike) -> np.ndarray:
+    """
+    values: (n, k) array or DataFrame of objectives, larger is better.
+    Returns a boolean array, True = on the Pareto frontier.
+    """
+    matrix = _as_matrix(values)
+    n, k = matrix.shape
+    mask = np.ones(n, dtype=bool)
+    valid = ~np.isnan(matrix).any(axis=1)
+    if valid.sum() <= 1:
+        return mask
+    finite = matrix[valid]
+    if k == 1:
+        mask[valid] = _mask_1d(finite[:, 0])
+    elif k == 2:
+        mask[valid] = _mask_2d(finite[:, 0], finite[:, 1])
+    else:
+        mask[valid] = _mask_kd(finite)
+    return mask
+
+
+def _ranks_2d(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Points in (a desc, b desc) order; each layer keeps its last point, whose b is the
+    # layer's largest. Layers are ordered, so the first layer not dominating a point is found by bisection.
+    order = np.lexsort((-b, -a))
+    ranks = np.empty(len(a), dtype=np.int64)
+    last_a, neg_last_b = [], []
+    for idx, x, y in zip(order.tolist(), a[order].tolist(), b[order].tolist()):
+        # Layer L dominates (x, y) iff its last b >= y, unless its last point equals (x, y)
+        layer = bisect.bisect_right(neg_last_b, -y)
+        if layer > 0 and last_a[layer - 1] == x and -neg_last_b[layer - 1] == y:
+            layer -= 1
+        if layer == len(last_a):
+            last_a.append(x)
+            neg_last_b.append(-y)
+        else:
+            last_a[layer] = x
+            neg_last_b[layer] = -y
+        ranks[idx] = layer
+    return ranks
+
+
+def pareto_ranks(values: ArrayLike) -> np.ndarray:
+    """
+    Layered non-dominated sorting. Returns an int array: 0 for the frontier,
+    1 for the frontier of the remaining plans, and so on. Rows with NaN get rank 0.
+    """
+    matrix = _as_matrix(values)
+    n, k = matrix.shape
+    ranks = np.zeros(n, dtype=np.int64)
+    valid_idx = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+    if len(valid_idx) <= 1:
+        return ranks
+    if k == 2:
+        ranks[valid_idx] = _ranks_2d(matrix[valid_idx, 0], matrix[valid_idx, 1])
+        return ranks
+
+    # k objectives: peel one frontier at a time
+    remaining = valid_idx
+    layer = 0
+    while len(remaining):
+        front = pareto_mask(matrix[remaining])
+        ranks[remaining[front]] = layer
+        remaining = remaining[~front]
+        layer += 1
+    return ranks
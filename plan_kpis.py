@@ -0,0 +1,148 @@
+"""
+Per-plan dashboard KPIs, materialized once per plan-store version.
+
+The KPIs are vectorized formulas over what the agent nodes log for each plan:
+the auditor's logic_score, the arbiter's aesthetic_score / profit_margin, and
+the conversion rate of the plan's segment x version cell. The plan log carries
+none of the quantities most KPIs are named after (replan counts, inventory
+sources, mood or golden-hour checks per activity), so those are proxies: a
+monotone rescaling of one logged score, listed in PROXY_SOURCES and labelled
+as such in the dashboard. conversion_forecast is the cell's conversion rate
+leaving the plan itself out, so a plan's own outcome never feeds its forecast.
+
+They are computed once per data version and written next to the plan data:
+
+    plan_store/_kpis/phase=p3/<version>.parquet
+
+The version is a hash of the phase's Parquet files (path, size, mtime) and
+KPI_REVISION, so regenerating a phase or changing a formula invalidates it;
+stale files are removed when the new one is written. The "_" prefix keeps the
+KPI files out of the plan dataset that load_plans scans.
+
+    python plan_kpis.py p3      # materialize (no-op when current)
+"""
+import argparse
+import hashlib
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from plan_store import STORE_PATH, load_plans, phase_files
+
+KPI_REVISION = 2    # bump when a formula below changes
+KPI_DIR = "_kpis"
+BASE_COLUMNS = ["plan_id", "user_segment", "agent_version", "total_revenue", "net_profit", "profit_margin",
+                "aesthetic_score", "logic_score", "is_converted"]
+KPI_COLUMNS = ["pareto_health", "inventory_match", "audit_recurrence", "mood_consistency", "golden_hour_coverage",
+               "fatigue_index", "congestion_risk", "buffer_flexibility", "conversion_forecast"]
+FATIGUE_LEVELS = ["Low", "Medium", "High"]
+# Proxy KPI -> the logged column it is rescaled from
+PROXY_SOURCES = {
+    "inventory_match": "profit_margin",
+    "audit_recurrence": "logic_score",
+    "mood_consistency": "aesthetic_score",
+    "golden_hour_coverage": "aesthetic_score",
+    "fatigue_index": "logic_score",
+    "congestion_risk": "logic_score",
+    "buffer_flexibility": "logic_score",
+}
+
+
+def proxy_note(kpi: str) -> str:
+    """Dashboard help text of a proxy KPI."""
+    return f"代理指标：由方案日志中的 {PROXY_SOURCES[kpi]} 换算，并非实测值。"
+
+
+def compute_kpis(df: pd.DataFrame) -> pd.DataFrame:
+    """KPI columns for a plan frame with BASE_COLUMNS; one vectorized expression per KPI."""
+    aesthetic = df["aesthetic_score"].to_numpy(dtype=np.float64)
+    margin = df["profit_margin"].to_numpy(dtype=np.float64)
+    # Auditor output on a 0-10 scale; 1.0 is a plan that passed every check
+    logic = np.clip(df["logic_score"].to_numpy(dtype=np.float64) / 10.0, 0.0, 1.0)
+
+    kpis = pd.DataFrame(index=df.index)
+    kpis["pareto_health"] = np.minimum(100, (aesthetic * 10 + margin * 100) / 1.5).astype(np.int64)
+    # Proxies (PROXY_SOURCES): margin mapped onto 40%..95% inventory use; one replan per two logic points lost
+    kpis["inventory_match"] = (40 + 55 * np.clip((margin - 0.05) / 0.40, 0.0, 1.0)).astype(np.int64)
+    kpis["audit_recurrence"] = np.clip(np.floor((1.0 - logic) * 5), 0, 4).astype(np.int64)
+    kpis["mood_consistency"] = np.clip(aesthetic, 0.0, 10.0)
+    kpis["golden_hour_coverage"] = 0.1 + 0.7 * np.clip((aesthetic - 1.0) / 9.0, 0.0, 1.0)
+    kpis["fatigue_index"] = pd.Categorical.from_codes(np.select([logic >= 0.8, logic >= 0.6], [0, 1], 2), FATIGUE_LEVELS)
+    kpis["congestion_risk"] = 0.4 * (1.0 - logic)
+    kpis["buffer_flexibility"] = (10 + 20 * logic).astype(np.int64)     # minutes
+
+    # Leave-one-out: (cell conversions - own) / (cell size - 1); single-plan cells get the overall rate
+    by = [c for c in ("user_segment", "agent_version") if c in df.columns]
+    converted = df["is_converted"].astype(np.float64)
+    if by:
+        grouped = converted.groupby([df[c] for c in by], observed=True, dropna=False)
+        total, count = grouped.transform("sum"), grouped.transform("count")
+    else:
+        total, count = converted.sum(), len(converted)
+    overall = (converted.sum() - converted) / max(len(converted) - 1, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        forecast = (total - converted) / (count - 1)
+    kpis["conversion_forecast"] = np.where(count > 1, forecast, overall)
+    return kpis
+
+
+def data_version(phase: str, path: str = STORE_PATH) -> str:
+    """Hash of the phase's plan files and KPI_REVISION."""
+    files = phase_files(phase, path=path)
+    if not files:
+        raise FileNotFoundError(f"no plans for phase {phase!r} in {path}")
+    digest = hashlib.blake2b(f"kpi-r{KPI_REVISION}".encode(), digest_size=8)
+    for file in files:
+        stat = os.stat(file)
+        digest.update(f"{os.path.relpath(file, path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def kpi_file(phase: str, version: str, path: str = STORE_PATH) -> str:
+    return os.path.join(path, KPI_DIR, f"phase={phase}", f"{version}.parquet")
+
+
+def materialize(phase: str, version: Optional[str] = None, path: str = STORE_PATH) -> str:
+    """Write the phase's plans + KPIs for the current data version, unless already there."""
+    version = version or data_version(phase, path)
+    target = kpi_file(phase, version, path)
+    if os.path.exists(target):
+        return target
+    plans = load_plans(phase, columns=BASE_COLUMNS, path=path)
+    table = pa.Table.from_pandas(pd.concat([plans, compute_kpis(plans)], axis=1), preserve_index=False)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Write-then-rename, so a concurrent reader never sees a partial file
+    partial = f"{target}.{os.getpid()}.tmp"
+    pq.write_table(table, partial)
+    os.replace(partial, target)
+    for name in os.listdir(os.path.dirname(target)):
+        if name.endswith(".parquet") and name != os.path.basename(target):
+            os.remove(os.path.join(os.path.dirname(target), name))
+    return target
+
+
+def load_kpis(phase: str, columns: Optional[List[str]] = None, version: Optional[str] = None,
+              path: str = STORE_PATH) -> pd.DataFrame:
+    """The phase's plans with KPI columns (materialized first if the data changed)."""
+    target = materialize(phase, version, path)
+    return pq.read_table(target, columns=columns, memory_map=True).to_pandas(self_destruct=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("phase")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    target = materialize(args.phase)
+    materialized = time.perf_counter() - started
+    started = time.perf_counter()
+    df = load_kpis(args.phase)
+    loaded = time.perf_counter() - started
+    print(f"{target}: {len(df)} plans, materialize {materialized:.2f}s, load {loaded:.2f}s")
+    print(df[KPI_COLUMNS].describe(include="all").round(3).to_string())
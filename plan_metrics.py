@@ -0,0 +1,133 @@
+"""
+Segment x version metrics of a plan log in one vectorized pass.
+
+Rows are mapped to one integer group code (categorical codes combined), and
+every metric is a sum over that code computed with np.bincount, so the cost is
+O(rows) with no Python callback or fancy-index lookup per group:
+
+    count, conversion rate, mean margin, mean aesthetic,
+    realized profit (net_profit of converted plans), expected profit per plan
+
+aggregate() keeps raw sums, so any coarser view (per version, per segment,
+overall) is a rollup of the small table instead of another pass over the rows.
+
+    python plan_metrics.py p3                   # any phase of the plan store
+    python plan_metrics.py my_plans.csv         # or a CSV/Parquet file
+"""
+import argparse
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BY = ("user_segment", "agent_version")
+COLUMNS = ["agent_version", "user_segment", "net_profit", "profit_margin", "aesthetic_score", "is_converted"]
+
+# Raw sums per group; everything else is derived from them
+SUMS = ["count", "converted", "profit_margin_sum", "aesthetic_sum", "realized_profit"]
+
+
+def aggregate(df: pd.DataFrame, by: Sequence[str] = DEFAULT_BY) -> pd.DataFrame:
+    """One row per observed group of `by`, with the SUMS columns."""
+    by = [c for c in by if c in df.columns]
+    codes = np.zeros(len(df), dtype=np.int64)
+    levels: List[pd.Index] = []
+    for column in by:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            column_codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            column_codes, categories = pd.factorize(values, sort=True)
+        if (column_codes < 0).any():
+            # Missing values (e.g. user_segment of P1 plans) form their own group
+            column_codes = np.where(column_codes < 0, len(categories), column_codes)
+            categories = pd.Index(categories).append(pd.Index([None]))
+        codes = codes * len(categories) + column_codes
+        levels.append(pd.Index(categories, name=column))
+    size = int(np.prod([len(level) for level in levels])) if levels else 1
+
+    converted = df["is_converted"].to_numpy(dtype=bool)
+    sums = {
+        "count": np.bincount(codes, minlength=size),
+        "converted": np.bincount(codes, weights=converted, minlength=size),
+        "profit_margin_sum": np.bincount(codes, weights=df["profit_margin"].to_numpy(dtype=np.float64), minlength=size),
+        "aesthetic_sum": np.bincount(codes, weights=df["aesthetic_score"].to_numpy(dtype=np.float64), minlength=size),
+        "realized_profit": np.bincount(codes, weights=np.where(converted, df["net_profit"].to_numpy(dtype=np.float64), 0.0), minlength=size),
+    }
+    index = pd.MultiIndex.from_product(levels) if len(levels) > 1 else (levels[0] if levels else pd.RangeIndex(1))
+    table = pd.DataFrame(sums, index=index)
+    return table[table["count"] > 0].reset_index(drop=not levels)
+
+
+def rollup(sums: pd.DataFrame, by: Sequence[str] = ()) -> pd.DataFrame:
+    """Re-aggregate a SUMS table to fewer keys; by=() gives the one-row total."""
+    if not by:
+        return sums[SUMS].sum().to_frame().T
+    return sums.groupby(list(by), observed=True, sort=True)[SUMS].sum().reset_index()
+
+
+def finalize(sums: pd.DataFrame, total_realized_profit: Optional[float] = None) -> pd.DataFrame:
+    """Add the rates to a SUMS table (fractions, not percentages)."""
+    out = sums.copy()
+    count = out["count"].to_numpy(dtype=np.float64)
+    out["count"] = out["count"].astype(np.int64)
+    out["conversion_rate"] = out["converted"] / count
+    out["avg_profit_margin"] = out["profit_margin_sum"] / count
+    out["avg_aesthetic"] = out["aesthetic_sum"] / count
+    out["total_realized_profit"] = out["realized_profit"]
+    out["expected_profit_per_plan"] = out["realized_profit"] / count
+    total = out["realized_profit"].sum() if total_realized_profit is None else total_realized_profit
+    out["profit_contribution"] = out["realized_profit"] / total if total else 0.0
+    return out.drop(columns=["converted", "profit_margin_sum", "aesthetic_sum", "realized_profit"])
+
+
+def segment_version_metrics(df: pd.DataFrame, by: Sequence[str] = DEFAULT_BY) -> pd.DataFrame:
+    return finalize(aggregate(df, by))
+
+
+def lookup(metrics: pd.DataFrame, **keys) -> pd.Series:
+    """The metrics row matching keys (e.g. user_segment='standard', agent_version='v1-balanced')."""
+    mask = np.ones(len(metrics), dtype=bool)
+    for column, value in keys.items():
+        mask &= (metrics[column] == value).to_numpy()
+    if not mask.any():
+        # Empty group: zero plans, NaN rates
+        return pd.Series({"count": 0, "conversion_rate": np.nan, "avg_profit_margin": np.nan, "avg_aesthetic": np.nan,
+                          "total_realized_profit": 0.0, "expected_profit_per_plan": 0.0})
+    return metrics[mask].iloc[0]
+
+
+def routing_shares(metrics: pd.DataFrame, policy) -> pd.DataFrame:
+    """Observed version share per segment next to a RoutingPolicy's probabilities, in percent."""
+    expected = pd.DataFrame(policy.probabilities()).T.stack()
+    observed = metrics.set_index(["user_segment", "agent_version"])["count"]
+    observed = observed / observed.groupby(level=0).transform("sum")
+    shares = pd.concat([observed, expected], axis=1, keys=["observed", "policy"]).fillna(0)
+    return (shares * 100).round(2)
+
+
+def load(source: str) -> pd.DataFrame:
+    """A plan-store phase ("p1".."p3") or a CSV/Parquet file."""
+    if source.endswith(".csv"):
+        return pd.read_csv(source, usecols=lambda c: c in COLUMNS)
+    if source.endswith(".parquet"):
+        return pd.read_parquet(source)
+    from plan_store import load_plans
+    return load_plans(source, columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="plan-store phase (p1/p2/p3) or a CSV/Parquet file")
+    args = parser.parse_args()
+
+    df = load(args.source)
+    started = time.perf_counter()
+    sums = aggregate(df)
+    metrics = finalize(sums)
+    elapsed = time.perf_counter() - started
+    pd.set_option("display.width", 200)
+    print(metrics.round(4).to_string(index=False))
+    print(finalize(rollup(sums)).round(4).to_string(index=False))
+    print(f"\n{len(df)} rows aggregated in {elapsed * 1000:.1f} ms")
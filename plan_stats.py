@@ -0,0 +1,278 @@
+"""
+Bootstrap confidence intervals and permutation tests for plan metrics.
+
+Every metric is a per-plan mean (conversion rate = mean of is_converted,
+expected profit per plan = mean of realized profit, ...), so a resample only
+needs weighted sums per segment x version cell:
+
+- bootstrap: Poisson(1) weights per plan and resample (the row-mergeable form
+  of the bootstrap)
+- permutation test: random relabelling of the pooled plans of two groups;
+  exact permutations for small groups, independent labels with P(A) = n_a / n
+  for large ones (the same null distribution up to O(1/sqrt(n)))
+
+Both draw a (draws x rows) weight matrix per row block from a uint16 lookup
+table, and one matmul with the block's one-hot (cell x metric) values
+gives the sums of every draw, cell and metric at once. Row blocks add up, so
+they run on a process pool, each from its own child seed (results depend on
+the seed, not on the number of workers).
+
+    python plan_stats.py p3 --resamples 2000 --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from math import exp, factorial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from plan_metrics import DEFAULT_BY
+
+# Metric name -> per-plan column it is the mean of
+METRICS: Dict[str, str] = {
+    "conversion_rate": "is_converted",
+    "avg_profit_margin": "profit_margin",
+    "expected_profit_per_plan": "realized_profit",
+    "avg_aesthetic": "aesthetic_score",
+}
+DEFAULT_METRICS = ("conversion_rate", "avg_profit_margin", "expected_profit_per_plan")
+DEFAULT_RESAMPLES = 1000
+TASK_ROWS = 1 << 18         # rows per pool task
+BLOCK_ROWS = 4096           # rows per weight matrix inside a task
+EXACT_PERMUTATION_ROWS = 20_000
+
+# Poisson(1) inverse CDF over uint16: P(k) is exact to 1/65536
+_cdf = np.cumsum([exp(-1.0) / factorial(k) for k in range(16)])
+POISSON_TABLE = np.searchsorted(_cdf, (np.arange(65536) + 0.5) / 65536, side="right").astype(np.float32)
+
+
+def metric_values(df: pd.DataFrame, metrics: Sequence[str] = DEFAULT_METRICS) -> np.ndarray:
+    """(rows, metrics) float64 matrix of the per-plan values behind each metric."""
+    columns = []
+    for metric in metrics:
+        column = METRICS[metric]
+        if column == "realized_profit":
+            values = np.where(df["is_converted"].to_numpy(dtype=bool), df["net_profit"].to_numpy(dtype=np.float64), 0.0)
+        else:
+            values = df[column].to_numpy(dtype=np.float64)
+        columns.append(values)
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+
+# --- Weighted sums, the one kernel behind both methods ---
+
+def _block_sums(codes: np.ndarray, values: np.ndarray, n_cells: int, n_draws: int,
+                table: np.ndarray, seed: np.random.SeedSequence) -> np.ndarray:
+    """
+    (draws, cells * (1 + metrics)) sums of weight and weight * value over one task's rows,
+    with weights table[u] for uniform uint16 u.
+    """
+    rng = np.random.default_rng(seed)
+    width = 1 + values.shape[1]
+    out = np.zeros((n_draws, n_cells * width))
+    for start in range(0, len(codes), BLOCK_ROWS):
+        rows = slice(start, start + BLOCK_ROWS)
+        block_codes, block_values = codes[rows], values[rows]
+        r = len(block_codes)
+        # One-hot layout: column cell * width holds the weight, the next ones weight * value
+        features = np.zeros((r, n_cells * width), dtype=np.float32)
+        base = block_codes * width
+        features[np.arange(r), base] = 1.0
+        for j in range(values.shape[1]):
+            features[np.arange(r), base + 1 + j] = block_values[:, j]
+        # 4 uint16 per 64-bit draw; the odd tail of the last word is dropped
+        raw = rng.bit_generator.random_raw((n_draws * r + 3) // 4).view(np.uint16)[:n_draws * r]
+        weights = np.take(table, raw).reshape(n_draws, r)
+        out += weights @ features
+    return out
+
+
+def _pooled_sums(codes: np.ndarray, values: np.ndarray, n_cells: int, n_draws: int,
+                 table: np.ndarray, seed: Optional[int], workers: Optional[int]) -> np.ndarray:
+    tasks = [(codes[i:i + TASK_ROWS], values[i:i + TASK_ROWS]) for i in range(0, len(codes), TASK_ROWS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    args = [(c, v, n_cells, n_draws, table, s) for (c, v), s in zip(tasks, seeds)]
+    workers = min(workers or os.cpu_count() or 1, len(args))
+    if workers <= 1:
+        parts = [_block_sums(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_block_sums, *zip(*args)))
+    total = np.zeros((n_draws, n_cells * (1 + values.shape[1])))
+    for part in parts:
+        total += part
+    return total
+
+
+# --- Bootstrap ---
+
+@dataclass
+class BootstrapResult:
+    cells: pd.DataFrame          # one row per cell: the `by` columns and count
+    metrics: List[str]
+    estimate: np.ndarray         # (cells, metrics) plain means
+    samples: np.ndarray          # (resamples, cells, metrics) resampled means
+
+    def cell(self, **keys) -> int:
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, value in keys.items():
+            mask &= (self.cells[column] == value).to_numpy()
+        if not mask.any():
+            raise KeyError(f"no cell {keys}")
+        return int(np.flatnonzero(mask)[0])
+
+    def intervals(self, level: float = 0.95) -> pd.DataFrame:
+        """Per cell: each metric with its percentile interval (<metric>_low, <metric>_high)."""
+        low, high = np.nanquantile(self.samples, [(1 - level) / 2, (1 + level) / 2], axis=0)
+        out = self.cells.copy()
+        for j, metric in enumerate(self.metrics):
+            out[metric] = self.estimate[:, j]
+            out[f"{metric}_low"] = low[:, j]
+            out[f"{metric}_high"] = high[:, j]
+        return out
+
+    def interval_table(self, formats: Dict[str, str], level: float = 0.95) -> pd.DataFrame:
+        """Cell keys plus one "[low, high]" column per metric of `formats` (e.g. {"conversion_rate": "{:.2%}"})."""
+        intervals = self.intervals(level)
+        out = self.cells.drop(columns=["count"])
+        for metric, fmt in formats.items():
+            out[metric] = [f"[{fmt.format(lo)}, {fmt.format(hi)}]"
+                           for lo, hi in zip(intervals[f"{metric}_low"], intervals[f"{metric}_high"])]
+        return out
+
+    def interval(self, metric: str, level: float = 0.95, **keys) -> Tuple[float, float, float]:
+        """(estimate, low, high) of one cell."""
+        i, j = self.cell(**keys), self.metrics.index(metric)
+        low, high = np.nanquantile(self.samples[:, i, j], [(1 - level) / 2, (1 + level) / 2])
+        return float(self.estimate[i, j]), float(low), float(high)
+
+    def difference(self, metric: str, a: Dict[str, str], b: Dict[str, str],
+                   level: float = 0.95) -> Tuple[float, float, float]:
+        """(estimate, low, high) of metric(a) - metric(b) between two cells."""
+        i, k, j = self.cell(**a), self.cell(**b), self.metrics.index(metric)
+        diff = self.samples[:, i, j] - self.samples[:, k, j]
+        low, high = np.nanquantile(diff, [(1 - level) / 2, (1 + level) / 2])
+        return float(self.estimate[i, j] - self.estimate[k, j]), float(low), float(high)
+
+
+def bootstrap(df: pd.DataFrame, by: Sequence[str] = DEFAULT_BY, metrics: Sequence[str] = DEFAULT_METRICS,
+              n_resamples: int = DEFAULT_RESAMPLES, seed: Optional[int] = None,
+              workers: Optional[int] = None) -> BootstrapResult:
+    """Poisson bootstrap of every metric in every observed cell of `by`."""
+    by = [c for c in by if c in df.columns]
+    metrics = list(metrics)
+    if by:
+        grouped = df.groupby(by, observed=True, dropna=False, sort=True)
+        codes = grouped.ngroup().to_numpy()
+        cells = grouped.size().rename("count").reset_index()
+    else:
+        codes = np.zeros(len(df), dtype=np.int64)
+        cells = pd.DataFrame({"count": [len(df)]})
+    n_cells = len(cells)
+
+    values = metric_values(df, metrics)
+    counts = cells["count"].to_numpy(dtype=np.float64)
+    means = np.stack([np.bincount(codes, weights=values[:, j], minlength=n_cells) for j in range(len(metrics))], axis=1)
+    means /= counts[:, None]
+    # Centred per cell, so the float32 matmul only accumulates deviations
+    centred = (values - means[codes]).astype(np.float32)
+
+    sums = _pooled_sums(codes, centred, n_cells, n_resamples, POISSON_TABLE, seed, workers)
+    sums = sums.reshape(n_resamples, n_cells, 1 + len(metrics))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        samples = means[None] + sums[:, :, 1:] / sums[:, :, :1]
+    # A resampled mean stays within the cell's observed range; float32 rounding may step just outside
+    observed = pd.DataFrame(values).groupby(codes)
+    samples = np.clip(samples, observed.min().to_numpy(), observed.max().to_numpy())
+    return BootstrapResult(cells, metrics, means, samples)
+
+
+# --- Permutation test ---
+
+def _exact_permutation_sums(values: np.ndarray, n_a: int, n_permutations: int, seed: Optional[int]) -> np.ndarray:
+    """(permutations, metrics) sums of group A over exact random relabellings."""
+    rng = np.random.default_rng(seed)
+    out = np.empty((n_permutations, values.shape[1]))
+    batch = max(1, 2_000_000 // len(values))
+    for start in range(0, n_permutations, batch):
+        n = min(batch, n_permutations - start)
+        picked = np.argpartition(rng.random((n, len(values))), n_a - 1, axis=1)[:, :n_a]
+        out[start:start + n] = values[picked].sum(axis=1)
+    return out
+
+
+def permutation_test(a: pd.DataFrame, b: pd.DataFrame, metrics: Sequence[str] = DEFAULT_METRICS,
+                     n_permutations: int = DEFAULT_RESAMPLES, alternative: str = "two-sided",
+                     seed: Optional[int] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    H0: plans of a and b are exchangeable. One row per metric with both means, the
+    difference (a - b) and its p-value; alternative is "two-sided", "greater" (a > b) or "less".
+    """
+    metrics = list(metrics)
+    values_a, values_b = metric_values(a, metrics), metric_values(b, metrics)
+    n_a, n_b = len(values_a), len(values_b)
+    mean_a, mean_b = values_a.mean(axis=0), values_b.mean(axis=0)
+    observed = mean_a - mean_b
+
+    pooled = np.vstack([values_a, values_b])
+    n = n_a + n_b
+    centre = pooled.mean(axis=0)
+    pooled -= centre
+    total = pooled.sum(axis=0)
+    if n <= EXACT_PERMUTATION_ROWS:
+        sum_a, size_a = _exact_permutation_sums(pooled, n_a, n_permutations, seed), np.full((n_permutations, 1), float(n_a))
+    else:
+        labels = (np.arange(65536) < round(n_a / n * 65536)).astype(np.float32)
+        sums = _pooled_sums(np.zeros(n, dtype=np.int64), pooled.astype(np.float32), 1, n_permutations, labels, seed, workers)
+        size_a, sum_a = sums[:, :1], sums[:, 1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        null = sum_a / size_a - (total - sum_a) / (n - size_a)
+
+    if alternative == "greater":
+        extreme = null >= observed
+    elif alternative == "less":
+        extreme = null <= observed
+    elif alternative == "two-sided":
+        extreme = np.abs(null) >= np.abs(observed)
+    else:
+        raise ValueError(f"unknown alternative {alternative!r}")
+    p_value = (1 + extreme.sum(axis=0)) / (1 + n_permutations)
+    return pd.DataFrame({"metric": metrics, "a": mean_a, "b": mean_b, "difference": observed, "p_value": p_value,
+                         "n_a": n_a, "n_b": n_b})
+
+
+if __name__ == "__main__":
+    from plan_metrics import load
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", help="plan-store phase (p1/p2/p3) or a CSV/Parquet file")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = load(args.source)
+    started = time.perf_counter()
+    result = bootstrap(df, n_resamples=args.resamples, seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    pd.set_option("display.width", 250)
+    print(result.intervals().round(4).to_string(index=False))
+    print(f"\n{len(df)} rows x {args.resamples} resamples in {elapsed:.2f}s")
+
+    # Largest cell against the runner-up of the same segment, where there is one
+    if "user_segment" in result.cells and "agent_version" in result.cells:
+        top = result.cells.sort_values("count", ascending=False).iloc[0]
+        same = result.cells[(result.cells["user_segment"] == top["user_segment"]) & (result.cells.index != top.name)]
+        if len(same):
+            other = same.sort_values("count", ascending=False).iloc[0]
+            started = time.perf_counter()
+            test = permutation_test(df[(df["user_segment"] == top["user_segment"]) & (df["agent_version"] == top["agent_version"])],
+                                    df[(df["user_segment"] == other["user_segment"]) & (df["agent_version"] == other["agent_version"])],
+                                    n_permutations=args.resamples, seed=args.seed, workers=args.workers)
+            print(f"\n{top['user_segment']}: {top['agent_version']} vs {other['agent_version']}")
+            print(test.round(4).to_string(index=False))
+            print(f"permutation test in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,192 @@
+"""
+Columnar plan store shared by the analysis scripts and the dashboard.
+
+All phases share one typed schema and live in one Parquet dataset,
+hive-partitioned by phase and created_at month:
+
+    plan_store/phase=p3/month=2026-02/part-0-0.parquet
+
+- agent_version / user_segment are dictionary-encoded (pandas categoricals)
+- booleans and timestamps are typed once at write time, not inferred per load
+- load_plans reads only the requested columns; filters are pushed down to
+  partition pruning and Parquet row-group statistics
+- files are memory-mapped
+
+The per-phase CSVs are the import source: a phase missing from the store is
+imported from its CSV on first load (or run `python plan_store.py`).
+"""
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+STORE_PATH = os.getenv("PLAN_STORE_PATH", "plan_store")
+
+PHASE_CSVS = {
+    "p1": "travel_agent_tradeoff_data.csv",
+    "p2": "travel_data_p2_routing.csv",
+    "p3": "travel_data_p3_refined.csv",
+}
+
+SCHEMA = pa.schema([
+    ("plan_id", pa.string()),
+    ("user_segment", pa.dictionary(pa.int8(), pa.string())),  # null in p1 (no routing yet)
+    ("agent_version", pa.dictionary(pa.int8(), pa.string())),
+    ("total_revenue", pa.float64()),
+    ("net_profit", pa.float64()),
+    ("profit_margin", pa.float64()),
+    ("aesthetic_score", pa.float64()),
+    ("logic_score", pa.float64()),
+    ("is_converted", pa.bool_()),
+    ("created_at", pa.timestamp("s")),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("phase", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+
+# (column, op, value) tuples, or a list of such lists (OR of ANDs), as in pandas.read_parquet
+Filters = Sequence
+
+
+def _filesystem() -> pafs.LocalFileSystem:
+    return pafs.LocalFileSystem(use_mmap=True)
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    """Cast a plan frame of any phase to SCHEMA (missing columns become null)."""
+    columns = {}
+    for field in SCHEMA:
+        if field.name not in df.columns:
+            columns[field.name] = pa.nulls(len(df), field.type)
+            continue
+        values = df[field.name]
+        if field.name == "created_at":
+            values = pd.to_datetime(values)
+        elif field.name == "is_converted" and values.dtype == object:
+            values = values.map({"True": True, "False": False, True: True, False: False})
+        array = pa.array(values, from_pandas=True)
+        if pa.types.is_dictionary(field.type):
+            array = pc.cast(array, pa.string()).dictionary_encode().cast(field.type)
+        columns[field.name] = array.cast(field.type)
+    return pa.table(columns, schema=SCHEMA)
+
+
+def _months(created_at: pa.ChunkedArray) -> pa.Array:
+    """YYYY-MM partition keys; formats each distinct month once (pc.strftime formats every row)."""
+    key = pc.add(pc.multiply(pc.year(created_at), 100), pc.month(created_at)).to_numpy()
+    distinct, index = np.unique(key, return_inverse=True)
+    labels = pa.array([f"{k // 100:04d}-{k % 100:02d}" for k in distinct], pa.string())
+    return pa.DictionaryArray.from_arrays(pa.array(index.astype(np.int32)), labels).cast(pa.string())
+
+
+def write_phase(df: pd.DataFrame, phase: str, path: str = STORE_PATH):
+    """Replace a phase's plans in the store."""
+    write_phase_chunks([df], phase, path)
+
+
+def write_phase_chunks(chunks: Iterable[pd.DataFrame], phase: str, path: str = STORE_PATH) -> int:
+    """
+    Replace a phase's plans with a stream of frames, one set of files per chunk,
+    so memory stays bounded by the chunk size. Returns the number of rows written.
+    """
+    # Partitions of other phases are kept; this phase's old month files are removed first
+    phase_dir = os.path.join(path, f"phase={phase}")
+    if os.path.isdir(phase_dir):
+        _filesystem().delete_dir(phase_dir)
+    rows = 0
+    for k, df in enumerate(chunks):
+        table = to_table(df)
+        months = _months(table["created_at"])
+        table = table.append_column("phase", pa.repeat(pa.scalar(phase, pa.string()), len(table)))
+        table = table.append_column("month", months)
+        ds.write_dataset(
+            table, path,
+            format="parquet",
+            partitioning=PARTITIONING,
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template=f"part-{k}-{{i}}.parquet",
+        )
+        rows += len(table)
+    return rows
+
+
+def import_csvs(phases: Optional[Iterable[str]] = None, path: str = STORE_PATH):
+    for phase in phases or PHASE_CSVS:
+        write_phase(pd.read_csv(PHASE_CSVS[phase]), phase, path)
+
+
+def _ensure_phases(phases: Iterable[str], path: str):
+    missing = [p for p in phases if not os.path.isdir(os.path.join(path, f"phase={p}"))]
+    missing = [p for p in missing if p in PHASE_CSVS and os.path.exists(PHASE_CSVS[p])]
+    if missing:
+        import_csvs(missing, path)
+
+
+def _month_filter(since: Optional[datetime], until: Optional[datetime]) -> Optional[ds.Expression]:
+    expr = None
+    if since is not None:
+        expr = (ds.field("month") >= since.strftime("%Y-%m")) & (ds.field("created_at") >= pa.scalar(since, pa.timestamp("s")))
+    if until is not None:
+        upper = (ds.field("month") <= until.strftime("%Y-%m")) & (ds.field("created_at") < pa.scalar(until, pa.timestamp("s")))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+
+def phase_files(phase: Optional[str] = None, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, path: str = STORE_PATH) -> List[str]:
+    """Parquet files of a phase (or all phases), restricted to the months of [since, until)."""
+    _ensure_phases([phase] if phase else PHASE_CSVS, path)
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING, filesystem=_filesystem())
+    expr = ds.field("phase") == phase if phase else None
+    if since is not None or until is not None:
+        # Month pruning only; rows at the edges of the range are filtered by the reader
+        month = _month_filter(since, until)
+        expr = month if expr is None else expr & month
+    fragments = dataset.get_fragments(filter=expr) if expr is not None else dataset.get_fragments()
+    return sorted(fragment.path for fragment in fragments)
+
+
+def load_plans(phase: Optional[str] = None,
+               columns: Optional[List[str]] = None,
+               filters: Optional[Filters] = None,
+               since: Optional[datetime] = None,
+               until: Optional[datetime] = None,
+               path: str = STORE_PATH) -> pd.DataFrame:
+    """
+    phase: "p1" / "p2" / "p3", or None for all phases (add "phase" to columns to tell them apart).
+    columns: projection; None reads every SCHEMA column.
+    filters: e.g. [("logic_score", ">=", 8.0)].
+    since / until: created_at range [since, until); also prunes month partitions.
+    """
+    _ensure_phases([phase] if phase else PHASE_CSVS, path)
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING, filesystem=_filesystem())
+
+    expr = pq.filters_to_expression(filters) if filters else None
+    for extra in (ds.field("phase") == phase if phase else None, _month_filter(since, until)):
+        if extra is not None:
+            expr = extra if expr is None else expr & extra
+
+    columns = list(columns) if columns else SCHEMA.names
+    table = dataset.to_table(columns=columns, filter=expr)
+    # Dictionaries of different files are unified, so categoricals come out with one set of categories
+    df = table.unify_dictionaries().to_pandas(self_destruct=True)
+    # Sorted categories: groupby output is ordered as it was with the CSVs' string columns
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+    return df
+
+
+if __name__ == "__main__":
+    import_csvs()
+    for phase in PHASE_CSVS:
+        df = load_plans(phase)
+        print(f"{phase}: {len(df)} plans -> {os.path.join(STORE_PATH, 'phase=' + phase)}")
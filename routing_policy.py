@@ -0,0 +1,216 @@
+"""
+Segment -> agent-version routing policies, shared by the data generators, the
+analysis scripts and the live agent (memory_retrieval).
+
+Policies are versioned entries of routing_policies.json. Each one is compiled
+into alias tables (Vose), one row per segment over a shared version list, so a
+draw is one uniform number, one index and one comparison:
+
+- per request: RoutingPolicy.route(segment, key) in pure Python, a few
+  microseconds; with a key (user_id) the draw comes from its hash, so a user
+  keeps the same version while the policy is unchanged
+- bulk: sample_segments / sample_versions over whole NumPy arrays
+
+load_policy() caches compiled policies and reloads the file when it changes.
+
+    python routing_policy.py     # benchmark of both modes
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+POLICY_PATH = os.getenv("ROUTING_POLICY_PATH", "routing_policies.json")
+ANY_SEGMENT = "*"               # route used for segments without their own entry (and unsegmented policies)
+RELOAD_CHECK_SECONDS = 1.0      # how often load_policy looks at the file's mtime
+
+
+def _alias_table(weights: List[float]) -> Tuple[List[float], List[int]]:
+    """Vose's alias method: column i is kept with probability prob[i], otherwise alias[i] is used."""
+    n = len(weights)
+    total = float(sum(weights))
+    if total <= 0:
+        raise ValueError("routing weights must sum to a positive value")
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    # Leftovers are 1.0 up to rounding
+    return prob, alias
+
+
+class RoutingPolicy:
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.version = int(spec.get("version", 1))
+        self.description = spec.get("description", "")
+        routes: Dict[str, Dict[str, float]] = spec["routes"]
+        mix: Dict[str, float] = spec.get("segment_mix") or {}
+        self.segmented = bool(mix)
+
+        # Shared version list: first appearance order across routes
+        self.versions: List[str] = []
+        for weights in routes.values():
+            self.versions.extend(v for v in weights if v not in self.versions)
+        self.segments: List[str] = list(mix) if mix else [ANY_SEGMENT]
+        for segment in routes:
+            if segment not in self.segments:
+                self.segments.append(segment)
+        self._segment_index = {s: i for i, s in enumerate(self.segments)}
+
+        rows = []
+        for segment in self.segments:
+            weights = routes.get(segment, routes.get(ANY_SEGMENT))
+            if weights is None:
+                raise ValueError(f"policy {name}: no route for segment {segment!r} and no {ANY_SEGMENT!r} route")
+            rows.append(_alias_table([float(weights.get(v, 0.0)) for v in self.versions]))
+        # Python lists for the per-request path, arrays for bulk sampling
+        self._prob = [row[0] for row in rows]
+        self._alias = [row[1] for row in rows]
+        self.prob = np.array(self._prob)
+        self.alias = np.array(self._alias, dtype=np.intp)
+
+        if mix:
+            self.segment_prob, self.segment_alias = (np.array(t) for t in _alias_table([float(mix.get(s, 0.0)) for s in self.segments]))
+        else:
+            self.segment_prob, self.segment_alias = np.ones(1), np.zeros(1, dtype=np.intp)
+
+    def __repr__(self):
+        return f"RoutingPolicy({self.name!r}, version={self.version})"
+
+    # --- per request ---
+
+    def route(self, segment: Optional[str], key: Optional[str] = None) -> str:
+        """Agent version for one request. With `key` the choice is deterministic (sticky per user)."""
+        row = self._segment_index.get(segment)
+        if row is None:
+            row = self._segment_index.get(ANY_SEGMENT, 0)
+        if key is None:
+            u = random.random()
+        else:
+            digest = hashlib.blake2b(f"{self.name}:{key}".encode(), digest_size=8).digest()
+            u = int.from_bytes(digest, "big") / 2.0 ** 64
+        scaled = u * len(self.versions)
+        i = int(scaled)
+        if scaled - i >= self._prob[row][i]:
+            i = self._alias[row][i]
+        return self.versions[i]
+
+    # --- bulk ---
+
+    def sample_segments(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """Indices into self.segments, drawn from the policy's segment mix."""
+        return self._draw(np.zeros(n, dtype=np.intp), self.segment_prob[None, :], self.segment_alias[None, :], rng)
+
+    def sample_versions(self, segments: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Indices into self.versions for an array of segment indices."""
+        return self._draw(segments, self.prob, self.alias, rng)
+
+    @staticmethod
+    def _draw(rows: np.ndarray, prob: np.ndarray, alias: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        scaled = rng.random(len(rows)) * prob.shape[1]
+        column = scaled.astype(np.intp)
+        keep = (scaled - column) < prob[rows, column]
+        return np.where(keep, column, alias[rows, column])
+
+    def probabilities(self) -> Dict[str, Dict[str, float]]:
+        """Routing probabilities reconstructed from the alias tables (for reports and checks)."""
+        k = len(self.versions)
+        out = {}
+        for row, segment in enumerate(self.segments):
+            p = self.prob[row] / k
+            np.add.at(p, self.alias[row], (1.0 - self.prob[row]) / k)
+            out[segment] = {v: float(x) for v, x in zip(self.versions, p)}
+        return out
+
+
+class PolicyStore:
+    """Compiled policies of one file, reloaded when its mtime changes."""
+
+    def __init__(self, path: str = POLICY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._active: Optional[str] = None
+        self._policies: Dict[str, RoutingPolicy] = {}
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                spec = json.load(f)
+            self._policies = {name: RoutingPolicy(name, body) for name, body in spec["policies"].items()}
+            self._active = spec.get("active")
+            self._mtime = mtime
+
+    def get(self, name: Optional[str] = None) -> RoutingPolicy:
+        """A policy by name; None returns the file's active policy."""
+        self._refresh()
+        name = name or self._active
+        if name not in self._policies:
+            raise KeyError(f"unknown routing policy {name!r} in {self.path}")
+        return self._policies[name]
+
+    def names(self) -> List[str]:
+        self._refresh()
+        return list(self._policies)
+
+
+_stores: Dict[str, PolicyStore] = {}
+
+
+def load_policy(name: Optional[str] = None, path: str = POLICY_PATH) -> RoutingPolicy:
+    store = _stores.get(path)
+    if store is None:
+        store = _stores.setdefault(path, PolicyStore(path))
+    return store.get(name)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    for policy_name in PolicyStore().names():
+        policy = load_policy(policy_name)
+        print(f"{policy} versions={policy.versions}")
+
+        rng = np.random.default_rng(0)
+        n = 10_000_000
+        started = time.perf_counter()
+        segments = policy.sample_segments(n, rng)
+        versions = policy.sample_versions(segments, rng)
+        elapsed = time.perf_counter() - started
+        print(f"  bulk: {n} segment+version draws in {elapsed:.3f}s ({elapsed / n * 1e9:.1f} ns/row)")
+        # Empirical frequencies against the policy
+        expected = policy.probabilities()
+        worst = 0.0
+        for s, segment in enumerate(policy.segments):
+            picked = versions[segments == s]
+            if len(picked):
+                freq = np.bincount(picked, minlength=len(policy.versions)) / len(picked)
+                worst = max(worst, max(abs(freq[i] - expected[segment][v]) for i, v in enumerate(policy.versions)))
+        print(f"  bulk: max |frequency - probability| = {worst:.4f}")
+
+        segment = policy.segments[-1]
+        rounds = 200_000
+        t_random = timeit.timeit(lambda: policy.route(segment), number=rounds) / rounds
+        t_sticky = timeit.timeit(lambda: policy.route(segment, "user_123"), number=rounds) / rounds
+        t_lookup = timeit.timeit(lambda: load_policy(policy_name).route(segment, "user_123"), number=rounds) / rounds
+        print(f"  per request: route() {t_random * 1e6:.2f} us, sticky {t_sticky * 1e6:.2f} us, "
+              f"load_policy + sticky {t_lookup * 1e6:.2f} us")
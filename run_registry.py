@@ -0,0 +1,92 @@
+"""
+Registry of graph runs per thread_id.
+
+A run executes in a background task, independent of the HTTP connection that
+started it, and publishes everything it produces (StepRecords for backend_api)
+on the event bus. Other connections of the same thread (reloads, extra tabs,
+reconnects) attach to it instead of starting the graph again: they get the
+payloads produced so far, then the live ones.
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from event_bus import EventBus, Subscription
+
+
+class Run:
+    def __init__(self, thread_id: str, request_hash: Optional[str], history: Optional[List[Any]] = None):
+        self.thread_id = thread_id
+        self.request_hash = request_hash
+        self.history: List[Any] = list(history or [])
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+
+class RunRegistry:
+    """
+    bus: where payloads are published (topic = thread_id).
+    max_finished: finished runs remembered, so a resume can carry the payloads of the run it continues.
+    """
+
+    def __init__(self, bus: EventBus, max_finished: int = 1024):
+        self.bus = bus
+        self.max_finished = max_finished
+        self._runs: "OrderedDict[str, Run]" = OrderedDict()
+
+    def get(self, thread_id: str) -> Optional[Run]:
+        """Latest run of the thread, running or finished."""
+        return self._runs.get(thread_id)
+
+    def active(self, thread_id: str) -> Optional[Run]:
+        run = self._runs.get(thread_id)
+        return run if run is not None and not run.done else None
+
+    def start(self, thread_id: str, payloads: AsyncIterator[Any], request_hash: Optional[str] = None,
+              history: Optional[List[Any]] = None) -> Run:
+        """Run `payloads` in the background; an active run of the same thread is cancelled first."""
+        previous = self.active(thread_id)
+        if previous is not None:
+            previous.task.cancel()
+
+        run = Run(thread_id, request_hash, history)
+
+        async def consume():
+            # `payloads` reports its own failures as events; this only guards against bugs
+            try:
+                async for payload in payloads:
+                    run.history.append(payload)
+                    await self.bus.publish(thread_id, payload)
+            except Exception as e:
+                print(f"Run of {thread_id} failed: {e}")
+
+        run.task = asyncio.create_task(consume())
+        self._runs[thread_id] = run
+        self._runs.move_to_end(thread_id)
+        self._evict()
+        return run
+
+    def _evict(self):
+        excess = len(self._runs) - self.max_finished
+        for thread_id in list(self._runs):
+            if excess <= 0:
+                break
+            if self._runs[thread_id].done:
+                del self._runs[thread_id]
+                excess -= 1
+
+    def attach(self, run: Run) -> Tuple[Subscription, List[Any]]:
+        """
+        Subscribe to a run and snapshot what it has produced so far. Both happen
+        without yielding to the event loop, so no payload is missed or duplicated.
+        """
+        subscription = self.bus.subscribe(run.thread_id)
+        return subscription, list(run.history)
+
+    def cancel_all(self):
+        for run in self._runs.values():
+            if not run.done:
+                run.task.cancel()
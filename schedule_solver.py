@@ -0,0 +1,291 @@
+"""
+Feasibility solver for one day of an itinerary: ordering and start times as a
+time-windowed TSP.
+
+Input: the day's stops (duration, allowed windows in minutes since the day's
+midnight, e.g. opening hours intersected with the planner's flexibility), and a
+travel-time matrix in minutes. Output, in one pass: a schedule that visits
+every stop inside its windows, or, when there is none, the best schedule of the
+largest feasible subset plus the stops left out (the violations).
+
+- exact (up to EXACT_MAX_STOPS stops): dynamic programming over (visited set,
+  last stop) -> earliest finish. Waiting is allowed and the window function is
+  monotone, so the earliest finish dominates and each layer of visited sets is
+  a few NumPy reductions. Every subset is solved on the way, so the left-out
+  set is a minimum one.
+- heuristic (larger days): cheapest feasible insertion in deadline order, then
+  relocate moves while the finish time improves. Left-out stops are the ones no
+  insertion could place; not guaranteed minimal.
+
+Either way the finish time is minimized first; a stop then starts at its
+preferred start instead of the earliest one when the rest of the day still fits.
+
+    python schedule_solver.py      # exact vs heuristic on random days
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EXACT_MAX_STOPS = 15        # 2^15 x 15 DP table, ~4 MB
+
+Interval = Tuple[int, int]  # minutes since the day's midnight, may run past 24:00
+
+
+@dataclass
+class Stop:
+    key: str                            # caller's label, e.g. the activity title
+    duration: int                       # minutes
+    windows: List[Interval]             # allowed [start, end] of the visit, sorted, non-overlapping
+    preferred_start: Optional[int] = None
+
+
+@dataclass
+class Violation:
+    key: str
+    reason: str
+
+
+@dataclass
+class Schedule:
+    order: List[int]                    # stop indices in visiting order
+    starts: List[int]                   # start minute per entry of order
+    dropped: List[Violation] = field(default_factory=list)   # stops that could not be placed
+    method: str = "exact"
+
+    @property
+    def feasible(self) -> bool:
+        return not self.dropped
+
+
+def _finish(stop: Stop, arrival: np.ndarray) -> np.ndarray:
+    """Earliest end of the visit for arrival times (inf where no window fits); waiting is allowed."""
+    result = np.full(np.shape(arrival), np.inf)
+    for start, end in reversed(stop.windows):   # earliest fitting window wins
+        begin = np.maximum(arrival, start)
+        result = np.where(begin + stop.duration <= end, begin + stop.duration, result)
+    return result
+
+
+def _finish_at(stop: Stop, arrival: float) -> float:
+    for start, end in stop.windows:
+        begin = max(arrival, start)
+        if begin + stop.duration <= end:
+            return begin + stop.duration
+    return np.inf
+
+
+def simulate(order: Sequence[int], stops: Sequence[Stop], travel: np.ndarray, day_start: float = 0,
+             first_start: Optional[float] = None) -> Optional[List[float]]:
+    """Earliest finish of each stop visited in `order`, or None if one does not fit."""
+    finishes, t, prev = [], day_start, None
+    for position, j in enumerate(order):
+        arrival = t if prev is None else t + travel[prev, j]
+        if position == 0 and first_start is not None:
+            arrival = max(arrival, first_start)
+        t = _finish_at(stops[j], arrival)
+        if t == np.inf:
+            return None
+        finishes.append(t)
+        prev = j
+    return finishes
+
+
+def check(stops: Sequence[Stop], travel: np.ndarray, order: Sequence[int], starts: Sequence[float]) -> List[Violation]:
+    """Violations of a given schedule (window misses and too-short gaps), in one pass."""
+    violations = []
+    for position, (j, start) in enumerate(zip(order, starts)):
+        stop = stops[j]
+        if not any(s <= start and start + stop.duration <= e for s, e in stop.windows):
+            violations.append(Violation(stop.key, "outside its allowed windows"))
+        if position:
+            prev, prev_start = order[position - 1], starts[position - 1]
+            gap = start - (prev_start + stops[prev].duration)
+            if travel[prev, j] > gap:
+                violations.append(Violation(stop.key, f"needs {travel[prev, j]:.0f} min from {stops[prev].key}, "
+                                                      f"{gap:.0f} min planned"))
+    return violations
+
+
+def _settle(order: List[int], stops: Sequence[Stop], travel: np.ndarray, day_start: float) -> List[int]:
+    """Start times for a feasible order: each as close to its preferred start as the rest allows."""
+    starts, t, prev = [], day_start, None
+    for position, j in enumerate(order):
+        arrival = t if prev is None else t + travel[prev, j]
+        stop = stops[j]
+        finish = _finish_at(stop, arrival)
+        preferred = stop.preferred_start
+        if preferred is not None and preferred > finish - stop.duration:
+            # Later start only if it fits a window and the remaining stops still fit after it
+            later = _finish_at(stop, preferred)
+            rest = order[position + 1:]
+            if later - stop.duration == preferred and (
+                    not rest or simulate(rest, stops, travel, first_start=later + travel[j, rest[0]]) is not None):
+                finish = later
+        starts.append(int(round(finish - stop.duration)))
+        t, prev = finish, j
+    return starts
+
+
+def _unplaceable_reason(stop: Stop) -> str:
+    if not any(e - s >= stop.duration for s, e in stop.windows):
+        return f"no allowed window of {stop.duration} min"
+    return "does not fit with the other stops (travel time and windows)"
+
+
+def _solve_exact(stops: Sequence[Stop], travel: np.ndarray, day_start: float,
+                 first: Optional[int]) -> Tuple[List[int], List[int]]:
+    """(order, dropped stop indices) from the DP over visited sets."""
+    n = len(stops)
+    size = 1 << n
+    finish = np.full((size, n), np.inf)
+    parent = np.full((size, n), -1, dtype=np.int8)
+    for j in ([first] if first is not None else range(n)):
+        finish[1 << j, j] = _finish(stops[j], np.float64(day_start))
+
+    masks = np.arange(size)
+    popcount = np.zeros(size, dtype=np.int8)
+    for bit in range(n):
+        popcount += ((masks >> bit) & 1).astype(np.int8)
+
+    for k in range(2, n + 1):
+        layer = masks[popcount == k]
+        for j in range(n):
+            if j == first:
+                continue
+            with_j = layer[(layer >> j) & 1 == 1]
+            previous = with_j ^ (1 << j)
+            arrival = finish[previous] + travel[:, j]
+            best = np.argmin(arrival, axis=1)
+            finish[with_j, j] = _finish(stops[j], arrival[np.arange(len(with_j)), best])
+            parent[with_j, j] = best
+
+    # The full set if reachable, else the largest reachable subset; earliest finish among those
+    best_finish = finish.min(axis=1)
+    reachable = np.isfinite(best_finish)
+    top = popcount[reachable].max() if reachable.any() else 0
+    if top == 0:
+        return [], list(range(n))
+    candidates = np.flatnonzero(reachable & (popcount == top))
+    mask = int(candidates[np.argmin(best_finish[candidates])])
+
+    order, last = [], int(np.argmin(finish[mask]))
+    visited = mask
+    while last >= 0:
+        order.append(last)
+        previous = int(parent[visited, last])
+        visited ^= 1 << last
+        last = previous
+    order.reverse()
+    return order, [j for j in range(n) if not mask >> j & 1]
+
+
+def _solve_heuristic(stops: Sequence[Stop], travel: np.ndarray, day_start: float,
+                     first: Optional[int], passes: int = 2) -> Tuple[List[int], List[int]]:
+    """(order, dropped stop indices) from deadline-ordered cheapest insertion plus relocate moves."""
+    def end_of(order):
+        finishes = simulate(order, stops, travel, day_start)
+        if finishes is None:
+            return np.inf
+        return finishes[-1] if finishes else day_start
+
+    def insert(order, j):
+        lowest = 1 if first is not None else 0      # a pinned first stop stays first
+        best, best_end = None, np.inf
+        for position in range(lowest, len(order) + 1):
+            trial = order[:position] + [j] + order[position:]
+            end = end_of(trial)
+            if end < best_end:
+                best, best_end = trial, end
+        return best
+
+    def deadline(j):
+        fitting = [e - stops[j].duration for s, e in stops[j].windows if e - s >= stops[j].duration]
+        return max(fitting) if fitting else np.inf
+
+    order = []
+    if first is not None:
+        if end_of([first]) == np.inf:
+            return [], list(range(len(stops)))
+        order = [first]
+    dropped = []
+    for j in sorted((j for j in range(len(stops)) if j != first), key=deadline):
+        placed = insert(order, j)
+        if placed is None:
+            dropped.append(j)
+        else:
+            order = placed
+
+    for _ in range(passes):
+        improved = False
+        for j in list(order):
+            if j == first:
+                continue
+            rest = [i for i in order if i != j]
+            placed = insert(rest, j)
+            if placed is not None and end_of(placed) < end_of(order):
+                order, improved = placed, True
+        for j in list(dropped):
+            placed = insert(order, j)
+            if placed is not None:
+                order = placed
+                dropped.remove(j)
+                improved = True
+        if not improved:
+            break
+    return order, dropped
+
+
+def solve(stops: Sequence[Stop], travel: np.ndarray, day_start: float = 0, first: Optional[int] = None,
+          exact_max_stops: int = EXACT_MAX_STOPS) -> Schedule:
+    """
+    Schedule the stops (travel[i, j] = minutes from stop i to stop j). `first`
+    pins the stop the day starts at (e.g. the hotel). Days up to exact_max_stops
+    are solved exactly, larger ones heuristically.
+    """
+    travel = np.asarray(travel, dtype=np.float64)
+    if not stops:
+        return Schedule([], [])
+    if len(stops) <= exact_max_stops:
+        order, dropped, method = *_solve_exact(stops, travel, day_start, first), "exact"
+    else:
+        order, dropped, method = *_solve_heuristic(stops, travel, day_start, first), "heuristic"
+    starts = _settle(order, stops, travel, day_start) if order else []
+    return Schedule(order, starts, [Violation(stops[j].key, _unplaceable_reason(stops[j])) for j in dropped], method)
+
+
+if __name__ == "__main__":
+    import time
+
+    def random_day(n, rng):
+        stops = []
+        for i in range(n):
+            duration = int(rng.integers(20, 60))
+            opens = int(rng.integers(7 * 60, 12 * 60))
+            stops.append(Stop(f"stop{i}", duration, [(opens, opens + int(rng.integers(4 * 60, 12 * 60)))]))
+        xy = rng.uniform(0, 10, (n, 2))
+        travel = np.round(np.linalg.norm(xy[:, None] - xy[None], axis=2) * 2 + 5)
+        np.fill_diagonal(travel, 0)
+        return stops, travel
+
+    def end_of_day(schedule, stops):
+        end = schedule.starts[-1] + stops[schedule.order[-1]].duration
+        return f"{end // 60:02d}:{end % 60:02d}"
+
+    rng = np.random.default_rng(0)
+    for n in (6, 10, 12, 15):
+        stops, travel = random_day(n, rng)
+        started = time.perf_counter()
+        exact = solve(stops, travel)
+        exact_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        heuristic = solve(stops, travel, exact_max_stops=0)
+        heuristic_seconds = time.perf_counter() - started
+        print(f"n={n:3d} exact: {len(exact.dropped)} dropped, ends {end_of_day(exact, stops)}, {exact_seconds * 1000:6.1f} ms | "
+              f"heuristic: {len(heuristic.dropped)} dropped, ends {end_of_day(heuristic, stops)}, {heuristic_seconds * 1000:6.1f} ms")
+    for n in (30, 60):
+        stops, travel = random_day(n, rng)
+        started = time.perf_counter()
+        heuristic = solve(stops, travel)
+        print(f"n={n:3d} {heuristic.method}: {len(heuristic.dropped)} dropped, ends {end_of_day(heuristic, stops)}, "
+              f"{(time.perf_counter() - started) * 1000:6.1f} ms")
@@ -0,0 +1,140 @@
+"""
+Event encoding for the SSE stream of backend_api.
+
+- orjson as JSON backend (falls back to the json module when not installed)
+- Pydantic models (the planner's Itinerary) go through pydantic-core's compiled
+  serializer (`model_dump_json`) and are embedded as pre-encoded fragments
+- an encoded model is cached per instance, so the same itinerary is not
+  serialized again for replays or reconnects
+- an encoded event is cached per payload object, so a payload fanned out to
+  several subscribers (tabs attached to one run) is encoded once
+
+Run `python sse_encoding.py` for the micro-benchmark.
+"""
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class EventEncoder:
+    """
+    max_cached: encoded models / events kept (LRU).
+
+    Cached entries hold a reference to their object, so ids are not reused while
+    cached. Models and payloads are treated as immutable once emitted, which is
+    how the graph uses them (every node returns new objects).
+    """
+
+    def __init__(self, max_cached: int = 512):
+        self.max_cached = max_cached
+        self._models: "OrderedDict[int, tuple]" = OrderedDict()
+        self._events: "OrderedDict[int, tuple]" = OrderedDict()
+        self.stats = {"events": 0, "event_hits": 0, "models": 0, "model_hits": 0}
+
+    def _cached(self, cache: "OrderedDict[int, tuple]", obj: Any) -> Optional[bytes]:
+        entry = cache.get(id(obj))
+        if entry is not None and entry[0] is obj:
+            cache.move_to_end(id(obj))
+            return entry[1]
+        return None
+
+    def _store(self, cache: "OrderedDict[int, tuple]", obj: Any, encoded: bytes):
+        cache[id(obj)] = (obj, encoded)
+        if len(cache) > self.max_cached:
+            cache.popitem(last=False)
+
+    def encode_model(self, model: BaseModel) -> bytes:
+        self.stats["models"] += 1
+        encoded = self._cached(self._models, model)
+        if encoded is not None:
+            self.stats["model_hits"] += 1
+            return encoded
+        encoded = model.model_dump_json().encode("utf-8")
+        self._store(self._models, model, encoded)
+        return encoded
+
+    def _default(self, obj: Any):
+        if isinstance(obj, BaseModel):
+            if orjson is not None:
+                return orjson.Fragment(self.encode_model(obj))
+            return json.loads(self.encode_model(obj))
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+    def dumps(self, payload: Dict[str, Any]) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(payload, default=self._default)
+        return json.dumps(payload, ensure_ascii=False, default=self._default).encode("utf-8")
+
+    def sse(self, payload: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+        """One `data:` frame, preceded by an `id:` line when event_id is given."""
+        self.stats["events"] += 1
+        encoded = self._cached(self._events, payload)
+        if encoded is not None:
+            self.stats["event_hits"] += 1
+        else:
+            encoded = b"data: " + self.dumps(payload) + b"\n\n"
+            self._store(self._events, payload, encoded)
+        if event_id is not None:
+            return f"id: {event_id}\n".encode("ascii") + encoded
+        return encoded
+
+
+# --- Micro-benchmark: bytes and encode time per event ---
+if __name__ == "__main__":
+    import time as timer
+    from agent_graph import create_mock_itinerary
+
+    def make_events():
+        itinerary = create_mock_itinerary()
+        messages = [f"Planner: iteration {i}" for i in range(20)]
+        return [
+            {"node": "memory_retrieval", "status": "completed", "timestamp": "0.1",
+             "data": {"user_context": "用户画像: 偏好：喜欢摄影", "messages": messages[:1]}},
+            {"node": "planner", "status": "completed", "timestamp": "1.1",
+             "data": {"itinerary": itinerary, "itinerary_raw": ["Day 1: Arrive in Paris"] * 4, "messages": messages}},
+            {"node": "auditor", "status": "completed", "timestamp": "1.3",
+             "data": {"errors": ["营业时间冲突: 卢浮宫 在 2024-06-11 10:00-12:00 不在营业时间内。"], "messages": messages}},
+            {"node": "commercial_arbiter", "status": "completed", "timestamp": "1.8",
+             "data": {"profit_margin": 13.0, "aesthetic_score": 8.0, "messages": messages}},
+        ]
+
+    def baseline(payload):
+        # What the endpoint had to do before: dump models to dicts, then stdlib json
+        def default(obj):
+            if isinstance(obj, BaseModel):
+                return obj.model_dump(mode="json")
+            return obj.isoformat()
+        return f"data: {json.dumps(payload, ensure_ascii=False, default=default)}\n\n".encode("utf-8")
+
+    def bench(label, encode, events, subscribers, rounds=2000):
+        started = timer.perf_counter()
+        total_bytes = 0
+        for _ in range(rounds):
+            for event in events:
+                for _ in range(subscribers):
+                    total_bytes += len(encode(event))
+        n = rounds * len(events) * subscribers
+        elapsed = timer.perf_counter() - started
+        print(f"{label:<34} {total_bytes / n:8.0f} bytes/event {elapsed / n * 1e6:8.2f} us/event")
+
+    for subscribers in (1, 4):
+        print(f"--- {subscribers} subscriber(s) per run ---")
+        bench("json.dumps + model_dump", baseline, make_events(), subscribers)
+        # Serializer alone: nothing cached
+        encoder = EventEncoder(max_cached=0)
+        bench("EventEncoder (no cache)", encoder.sse, make_events(), subscribers)
+        # Itinerary cached, every event encoded again
+        encoder = EventEncoder()
+        bench("EventEncoder (model cache)", lambda e: b"data: " + encoder.dumps(e) + b"\n\n", make_events(), subscribers)
+        # Shared payload objects, as with RunRegistry fan-out and replays
+        encoder = EventEncoder()
+        bench("EventEncoder (model + event cache)", encoder.sse, make_events(), subscribers)
@@ -0,0 +1,172 @@
+"""
+Versioned SSE protocol for /stream-trip.
+
+Protocol 1 (default) sends each node's output as it finishes. Protocol 2 sends
+the AgentState itself, versioned by checkpoint step:
+
+    id: 7
+    data: {"v": 2, "type": "delta", "seq": 7, "node": "auditor", "next": [...],
+           "ops": [{"op": "replace", "path": "/errors", "value": [...]}]}
+
+- `seq` is the langgraph checkpoint step the state corresponds to, so it is
+  stable across reconnects and can be looked up in the checkpointer
+- `ops` is a JSON-patch (RFC 6902) subset against the state of the previous seq:
+  add / replace / remove of top-level keys, and `/key/-` appends for lists
+  that only grew
+- a full `snapshot` is sent first, whenever the client's base is unknown, and
+  after every `snapshot_every` deltas
+- `interrupt` / `eof` / `error` control events carry the seq of the last state
+
+A reconnecting EventSource sends `Last-Event-ID`; only the deltas after that seq
+are replayed.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PROTOCOL_VERSION = 2
+
+INTERRUPT_DATA = {"message": "Waiting for commercial approval..."}
+
+
+def _pointer(key: str) -> str:
+    return "/" + key.replace("~", "~0").replace("/", "~1")
+
+
+def state_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """JSON-patch ops turning `previous` into `current` (top-level keys, list appends)."""
+    ops = []
+    for key, value in current.items():
+        path = _pointer(key)
+        if key not in previous:
+            ops.append({"op": "add", "path": path, "value": value})
+            continue
+        old = previous[key]
+        if old is value or old == value:
+            continue
+        if isinstance(old, list) and isinstance(value, list) and len(value) > len(old) and value[:len(old)] == old:
+            ops.extend({"op": "add", "path": f"{path}/-", "value": item} for item in value[len(old):])
+        else:
+            ops.append({"op": "replace", "path": path, "value": value})
+    for key in previous:
+        if key not in current:
+            ops.append({"op": "remove", "path": _pointer(key)})
+    return ops
+
+
+@dataclass(eq=False)
+class StepRecord:
+    """
+    One entry of a run, shared by every subscriber of the thread.
+
+    kind: "base" (state the run starts from), "step" (a node finished),
+          "interrupt", "eof" or "error".
+    base_seq / delta: seq of the previous state and the ops from it; None when unknown.
+    Views are built once per record, so the encoder can cache their bytes.
+    """
+    kind: str
+    seq: int
+    node: Optional[str] = None
+    data: Any = None
+    values: Optional[Dict[str, Any]] = None
+    next: Tuple[str, ...] = ()
+    base_seq: Optional[int] = None
+    delta: Optional[List[Dict[str, Any]]] = None
+    timestamp: str = field(default_factory=lambda: str(time.monotonic()))
+    _views: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def state(cls, seq: int, values: Dict[str, Any], next: Sequence[str], previous: Optional["StepRecord"] = None,
+              node: Optional[str] = None, data: Any = None) -> "StepRecord":
+        """State record; the delta is computed against `previous` when it holds a state."""
+        record = cls("step" if node else "base", seq, node, data, values, tuple(next))
+        if previous is not None and previous.values is not None:
+            record.base_seq = previous.seq
+            record.delta = state_delta(previous.values, values)
+        return record
+
+    # --- Protocol 1 ---
+
+    def legacy_payload(self) -> Optional[Dict[str, Any]]:
+        if "legacy" not in self._views:
+            if self.kind == "step" and self.node != "__start__":
+                payload = {"node": self.node, "status": "completed", "data": self.data, "timestamp": self.timestamp}
+            elif self.kind == "interrupt":
+                payload = {"node": "human_interrupt", "status": "waiting", "data": INTERRUPT_DATA, "timestamp": self.timestamp}
+            elif self.kind == "eof":
+                payload = {"node": "EOF", "status": "done"}
+            elif self.kind == "error":
+                payload = {"node": "error", "status": "failed", "data": {"message": self.data}}
+            else:
+                payload = None
+            self._views["legacy"] = payload
+        return self._views["legacy"]
+
+    # --- Protocol 2 ---
+
+    def snapshot_event(self) -> Dict[str, Any]:
+        if "snapshot" not in self._views:
+            self._views["snapshot"] = {
+                "v": PROTOCOL_VERSION, "type": "snapshot", "seq": self.seq, "node": self.node,
+                "next": list(self.next), "state": self.values, "timestamp": self.timestamp,
+            }
+        return self._views["snapshot"]
+
+    def delta_event(self) -> Dict[str, Any]:
+        if "delta" not in self._views:
+            self._views["delta"] = {
+                "v": PROTOCOL_VERSION, "type": "delta", "seq": self.seq, "node": self.node,
+                "next": list(self.next), "ops": self.delta, "timestamp": self.timestamp,
+            }
+        return self._views["delta"]
+
+    def control_event(self) -> Dict[str, Any]:
+        if "control" not in self._views:
+            event = {"v": PROTOCOL_VERSION, "type": self.kind, "seq": self.seq}
+            event.update(self.legacy_payload())
+            self._views["control"] = event
+        return self._views["control"]
+
+
+class DeltaWriter:
+    """
+    Per-connection protocol 2 state: which seq the client holds and when the
+    next snapshot is due. `events(record)` returns the (payload, event id) pairs to send.
+    """
+
+    def __init__(self, last_event_id: Optional[int] = None, snapshot_every: int = 20):
+        self.seq = last_event_id
+        self.snapshot_every = snapshot_every
+        self.deltas_since_snapshot = 0
+
+    def events(self, record: StepRecord) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        if record.values is None:
+            return [(record.control_event(), str(record.seq))]
+        if self.seq is not None and record.seq <= self.seq:
+            return []  # Client already has this state
+        if (record.delta is None or record.base_seq != self.seq
+                or self.deltas_since_snapshot >= self.snapshot_every):
+            payload = record.snapshot_event()
+            self.deltas_since_snapshot = 0
+        else:
+            payload = record.delta_event()
+            self.deltas_since_snapshot += 1
+        self.seq = record.seq
+        return [(payload, str(record.seq))]
+
+    def replay(self, records: Sequence[StepRecord]) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        """
+        Catch-up events for records produced before the connection. If the
+        client's seq is among them only the later deltas are sent, otherwise a
+        snapshot of the latest state.
+        """
+        known = self.seq is not None and any(r.values is not None and r.seq == self.seq for r in records)
+        if not known:
+            self.seq = None
+            states = [i for i, r in enumerate(records) if r.values is not None]
+            if states:
+                records = records[states[-1]:]
+        events = []
+        for record in records:
+            events.extend(self.events(record))
+        return events
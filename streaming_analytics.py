@@ -0,0 +1,359 @@
+"""
+Out-of-core analytics for plan logs larger than RAM.
+
+Plan files (plan-store Parquet files or CSVs) are split into tasks of about
+chunk_rows rows (runs of row groups, line-aligned CSV byte ranges) and read in
+fixed-size chunks by a process pool. Each chunk is reduced to mergeable partial aggregates, and only
+those travel back to the parent:
+
+- per group (segment x version): count, conversions, realized profit, and
+  Welford mean / M2 of margin, aesthetic and net profit (merged with Chan's
+  parallel formula, so variances stay exact without keeping rows)
+- Pareto candidates: the chunk's own frontier; the global frontier is a subset
+  of the union of chunk frontiers, so the merge re-runs pareto_mask on that union
+- samples (optional): a uniform sample of at most k plans per group, for tests
+  that need rows (plan_stats.permutation_test). Every row gets a random key
+  and each group keeps its k smallest, so samples merge like the partials
+
+Memory is bounded by workers x chunk_rows rows plus the (small) partials; at
+most 2 x workers tasks are in flight.
+
+    python streaming_analytics.py p3 --workers 8 --chunk-rows 500000
+    python streaming_analytics.py p1 --pareto
+    python streaming_analytics.py logs/2026-*.csv
+"""
+import argparse
+import glob
+import io
+import operator
+import os
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pareto import pareto_mask
+from plan_metrics import COLUMNS, DEFAULT_BY, SUMS
+
+DEFAULT_CHUNK_ROWS = 500_000
+DEFAULT_SAMPLE_ROWS = 50_000
+WELFORD_COLUMNS = ("profit_margin", "aesthetic_score", "net_profit")
+READ_COLUMNS = ["plan_id", "user_segment", "agent_version", "net_profit", "profit_margin",
+                "aesthetic_score", "logic_score", "is_converted"]
+
+_OPS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt, "==": operator.eq, "!=": operator.ne}
+
+
+@dataclass
+class ParetoSpec:
+    objectives: Tuple[str, ...] = ("aesthetic_score", "profit_margin")
+    filters: Tuple[Tuple[str, str, float], ...] = (("logic_score", ">=", 8.0),)
+    keep: Tuple[str, ...] = ("plan_id", "agent_version", "is_converted")
+
+    def apply(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        mask = np.ones(len(chunk), dtype=bool)
+        for column, op, value in self.filters:
+            mask &= _OPS[op](chunk[column], value).to_numpy()
+        columns = [c for c in (*self.keep, *self.objectives) if c in chunk.columns]
+        return chunk.loc[mask, columns]
+
+
+@dataclass
+class SampleSpec:
+    rows: int = DEFAULT_SAMPLE_ROWS                     # per group
+    seed: int = 0
+    filters: Tuple[Tuple[str, str, Any], ...] = ()      # e.g. (("agent_version", "==", "v3-profit-seeker"),)
+    columns: Tuple[str, ...] = tuple(COLUMNS)
+
+    def apply(self, chunk: pd.DataFrame, by: Sequence[str], rng: np.random.Generator) -> pd.DataFrame:
+        mask = np.ones(len(chunk), dtype=bool)
+        for column, op, value in self.filters:
+            mask &= _OPS[op](chunk[column], value).to_numpy()
+        columns = list(dict.fromkeys(c for c in (*by, *self.columns) if c in chunk.columns))
+        rows = chunk.loc[mask, columns].assign(_key=rng.random(int(mask.sum())))
+        return bottom_k(rows, by, self.rows)
+
+
+# --- Partial aggregates ---
+
+def partial_from_chunk(chunk: pd.DataFrame, by: Sequence[str] = DEFAULT_BY) -> pd.DataFrame:
+    """Per-group partial of one chunk: count, converted, realized_profit, mean_* and m2_* columns."""
+    by = [c for c in by if c in chunk.columns]
+    chunk = chunk.assign(realized_profit=np.where(chunk["is_converted"].to_numpy(dtype=bool), chunk["net_profit"], 0.0))
+    keys = [chunk[c] for c in by] if by else [np.zeros(len(chunk), dtype=np.int8)]
+    grouped = chunk.groupby(keys, dropna=False, sort=False, observed=True)
+    out = pd.DataFrame({
+        "count": grouped.size(),
+        "converted": grouped["is_converted"].sum(),
+        "realized_profit": grouped["realized_profit"].sum(),
+    })
+    means = grouped[list(WELFORD_COLUMNS)].mean()
+    m2 = grouped[list(WELFORD_COLUMNS)].var(ddof=0).mul(out["count"], axis=0)
+    for column in WELFORD_COLUMNS:
+        out[f"mean_{column}"] = means[column]
+        out[f"m2_{column}"] = m2[column]
+    out.index.names = by or ["_all"]
+    return out
+
+
+def merge_partials(a: Optional[pd.DataFrame], b: pd.DataFrame) -> pd.DataFrame:
+    """Combine two partials (Chan et al.): counts and sums add, means and M2 are pooled."""
+    if a is None or a.empty:
+        return b
+    a, b = a.align(b, join="outer", fill_value=0.0)
+    na, nb = a["count"], b["count"]
+    n = na + nb
+    out = pd.DataFrame({"count": n, "converted": a["converted"] + b["converted"],
+                        "realized_profit": a["realized_profit"] + b["realized_profit"]})
+    weight = (nb / n).where(n > 0, 0.0)
+    for column in WELFORD_COLUMNS:
+        ma, mb = a[f"mean_{column}"], b[f"mean_{column}"]
+        delta = mb - ma
+        out[f"mean_{column}"] = ma + delta * weight
+        out[f"m2_{column}"] = a[f"m2_{column}"] + b[f"m2_{column}"] + delta ** 2 * na * weight
+    return out
+
+
+def to_sums(partial: pd.DataFrame) -> pd.DataFrame:
+    """A plan_metrics SUMS table (so plan_metrics.finalize / rollup apply), plus std columns."""
+    out = pd.DataFrame({
+        "count": partial["count"].astype(np.int64),
+        "converted": partial["converted"],
+        "profit_margin_sum": partial["mean_profit_margin"] * partial["count"],
+        "aesthetic_sum": partial["mean_aesthetic_score"] * partial["count"],
+        "realized_profit": partial["realized_profit"],
+    }, index=partial.index)
+    for column in WELFORD_COLUMNS:
+        out[f"std_{column}"] = np.sqrt(partial[f"m2_{column}"] / partial["count"])
+    out = out.reset_index().drop(columns=["_all"], errors="ignore")
+    keys = [c for c in partial.index.names if c in out.columns]
+    # Plain string keys sorted like plan_metrics.aggregate (chunk categories differ from file to file)
+    out[keys] = out[keys].astype(object)
+    return out.sort_values(keys, na_position="last").reset_index(drop=True) if keys else out
+
+
+def merge_candidates(a: Optional[pd.DataFrame], b: pd.DataFrame, spec: ParetoSpec) -> pd.DataFrame:
+    if a is not None and len(a):
+        b = pd.concat([a, b], ignore_index=True)
+    if len(b) == 0:
+        return b
+    return b[pareto_mask(b[list(spec.objectives)])].reset_index(drop=True)
+
+
+def bottom_k(rows: pd.DataFrame, by: Sequence[str], k: int) -> pd.DataFrame:
+    """The k rows with the smallest _key per group: a uniform sample without replacement."""
+    by = [c for c in by if c in rows.columns]
+    rows = rows.sort_values("_key", kind="stable")
+    if not by:
+        return rows.head(k)
+    return rows.groupby(by, dropna=False, sort=False, observed=True).head(k)
+
+
+def merge_samples(a: Optional[pd.DataFrame], b: pd.DataFrame, by: Sequence[str], spec: SampleSpec) -> pd.DataFrame:
+    if a is None or len(a) == 0:
+        return b
+    return bottom_k(pd.concat([a, b], ignore_index=True), by, spec.rows)
+
+
+# --- Workers ---
+
+@dataclass(frozen=True)
+class FileTask:
+    """A slice of one plan file that a worker reduces on its own."""
+    path: str
+    row_groups: Optional[Tuple[int, ...]] = None    # Parquet: the slice's row groups (None: all)
+    byte_range: Optional[Tuple[int, int]] = None    # CSV: [start, end) offsets of whole lines (None: all)
+
+
+def split_file(path: str, chunk_rows: int) -> List[FileTask]:
+    """
+    Tasks of about chunk_rows rows each, so one large file still spreads over
+    the pool: runs of whole row groups for Parquet, line-aligned byte ranges
+    for CSV (plan CSVs have no quoted newlines).
+    """
+    if not path.endswith(".csv"):
+        metadata = pq.ParquetFile(path, memory_map=True).metadata
+        tasks, span, rows = [], [], 0
+        for i in range(metadata.num_row_groups):
+            span.append(i)
+            rows += metadata.row_group(i).num_rows
+            if rows >= chunk_rows:
+                tasks.append(FileTask(path, row_groups=tuple(span)))
+                span, rows = [], 0
+        if span or not tasks:
+            tasks.append(FileTask(path, row_groups=tuple(span)))
+        return tasks
+
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        sample = f.read(1 << 16)
+        row_bytes = max(len(sample) / max(sample.count(b"\n"), 1), 1.0)
+        step = max(int(row_bytes * chunk_rows), 1 << 16)
+        bounds = [len(header)]
+        while bounds[-1] + step < size:
+            f.seek(bounds[-1] + step)
+            f.readline()            # move to the start of the next line
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [FileTask(path, byte_range=(start, end)) for start, end in zip(bounds, bounds[1:])]
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of [start, end) of a file, for pd.read_csv."""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._file.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def iter_chunks(task: FileTask, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Chunks of one task; Parquet files are memory-mapped and read batch by batch."""
+    path = task.path
+    if path.endswith(".csv"):
+        if task.byte_range is None:
+            yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda c: c in READ_COLUMNS)
+            return
+        names = pd.read_csv(path, nrows=0).columns.tolist()
+        with io.BufferedReader(_ByteRange(path, *task.byte_range)) as data:
+            yield from pd.read_csv(data, header=None, names=names, chunksize=chunk_rows,
+                                   usecols=lambda c: c in READ_COLUMNS)
+        return
+    parquet = pq.ParquetFile(path, memory_map=True)
+    columns = [c for c in READ_COLUMNS if c in parquet.schema_arrow.names]
+    # Batches follow the row groups (often far smaller than chunk_rows); coalesce them
+    pending, rows = [], 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, row_groups=task.row_groups, columns=columns):
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+            pending, rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def process_task(task: FileTask, by: Sequence[str], chunk_rows: int, pareto: Optional[ParetoSpec],
+                 sample: Optional[SampleSpec] = None) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame],
+                                                               Optional[pd.DataFrame], int]:
+    partial, candidates, sampled, rows = None, None, None, 0
+    # Keyed by the task, not the worker, so samples depend on the seed only
+    rng = np.random.default_rng([sample.seed, zlib.crc32(repr(task).encode())]) if sample is not None else None
+    for chunk in iter_chunks(task, chunk_rows):
+        if chunk["is_converted"].dtype == object:
+            chunk["is_converted"] = chunk["is_converted"].map({"True": True, "False": False, True: True, False: False})
+        partial = merge_partials(partial, partial_from_chunk(chunk, by))
+        if pareto is not None:
+            candidates = merge_candidates(candidates, pareto.apply(chunk), pareto)
+        if sample is not None:
+            sampled = merge_samples(sampled, sample.apply(chunk, by, rng), by, sample)
+        rows += len(chunk)
+    return partial, candidates, sampled, rows
+
+
+# --- Driver ---
+
+@dataclass
+class StreamResult:
+    sums: pd.DataFrame                  # plan_metrics SUMS table + std_* columns
+    frontier: Optional[pd.DataFrame]    # Pareto frontier rows (spec.keep + objectives), if requested
+    sample: Optional[pd.DataFrame]      # at most spec.rows random plans per group, if requested
+    rows: int
+    files: int
+    seconds: float
+
+
+def resolve_sources(sources: Sequence[str]) -> List[str]:
+    """Plan-store phases ("p1".."p3") and file globs, expanded to a list of files."""
+    from plan_store import PHASE_CSVS, phase_files
+    files: List[str] = []
+    for source in sources:
+        if source in PHASE_CSVS:
+            files.extend(phase_files(source))
+        else:
+            files.extend(sorted(glob.glob(source)) or [source])
+    return files
+
+
+def stream_analyze(sources: Sequence[str], by: Sequence[str] = DEFAULT_BY,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS, workers: Optional[int] = None,
+                   pareto: Optional[ParetoSpec] = None, sample: Optional[SampleSpec] = None) -> StreamResult:
+    files = resolve_sources(sources)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    partial, candidates, sampled, rows = None, None, None, 0
+
+    def merge(result):
+        nonlocal partial, candidates, sampled, rows
+        file_partial, file_candidates, file_sample, file_rows = result
+        if file_partial is not None:
+            partial = merge_partials(partial, file_partial)
+        if file_candidates is not None:
+            candidates = merge_candidates(candidates, file_candidates, pareto)
+        if file_sample is not None:
+            sampled = merge_samples(sampled, file_sample, by, sample)
+        rows += file_rows
+
+    # Large files become several tasks, so even a single file uses the whole pool
+    tasks = [task for path in files for task in split_file(path, chunk_rows)]
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            merge(process_task(task, by, chunk_rows, pareto, sample))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            pending, queue = set(), list(tasks)
+            while queue or pending:
+                # Bounded in-flight work: results are merged as they arrive
+                while queue and len(pending) < 2 * workers:
+                    pending.add(pool.submit(process_task, queue.pop(0), by, chunk_rows, pareto, sample))
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+
+    sums = to_sums(partial) if partial is not None else pd.DataFrame(columns=SUMS)
+    if sampled is not None:
+        sampled = sampled.sort_values("_key", kind="stable").drop(columns="_key").reset_index(drop=True)
+    return StreamResult(sums, candidates, sampled, rows, len(files), time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    from plan_metrics import finalize
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sources", nargs="+", help="plan-store phases (p1/p2/p3) and/or CSV/Parquet file globs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--pareto", action="store_true", help="also compute the frontier of plans with logic_score >= 8")
+    args = parser.parse_args()
+
+    result = stream_analyze(args.sources, chunk_rows=args.chunk_rows, workers=args.workers,
+                            pareto=ParetoSpec() if args.pareto else None)
+    pd.set_option("display.width", 200)
+    report = finalize(result.sums)
+    print(report.round(4).to_string(index=False))
+    if result.frontier is not None:
+        print(f"\nPareto frontier: {len(result.frontier)} plans")
+        print(result.frontier.groupby("agent_version", observed=True).size().to_string())
+    print(f"\n{result.rows} rows from {result.files} files in {result.seconds:.2f}s")
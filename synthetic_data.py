@@ -0,0 +1,255 @@
+"""
+Vectorized synthetic plan-log generator for the generate_data* scripts.
+
+Every column of a chunk is drawn as one NumPy array (segments, routed
+versions, scores, margins, penalties, conversions) instead of row by row, and
+rows are produced in fixed-size chunks, so memory stays flat at any row count.
+A phase differs from the others only by its PhaseConfig (routing policy from
+routing_policies.json, version profiles, penalty rule).
+
+Runs with the same seed and chunk size produce identical data (created_at is
+drawn within [start, end), which defaults to this year up to today 00:00).
+
+    python synthetic_data.py p3 --rows 10000000 --seed 7
+"""
+import argparse
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from plan_store import STORE_PATH, write_phase_chunks
+from routing_policy import load_policy
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+@dataclass
+class VersionProfile:
+    aesthetic_mean: float
+    aesthetic_std: float
+    base_margin: float
+    conversion_bonus: float = 0.0
+
+
+@dataclass
+class Penalty:
+    """Below `threshold` aesthetic, the version's margin becomes margin * factor - gap * per_point."""
+    version: str
+    threshold: float
+    factor: float = 1.0
+    per_point: float = 0.0
+
+
+@dataclass
+class ConversionRule:
+    """Conversion probability of a segment is multiplied by `below` or `at_or_above` depending on `column`."""
+    column: str
+    threshold: float
+    below: float
+    at_or_above: float
+
+
+@dataclass
+class PhaseConfig:
+    phase: str
+    file_name: str
+    n_samples: int
+    versions: Dict[str, VersionProfile]
+    policy: str                           # routing policy (segment mix and segment -> version routes)
+    aesthetic_range: Tuple[float, float] = (2.0, 10.0)
+    margin_slope: float = 0.025           # margin lost per aesthetic point above 7.0
+    margin_range: Tuple[float, float] = (0.05, 0.45)
+    penalty: Optional[Penalty] = None
+    revenue_multiplier: Dict[str, float] = field(default_factory=dict)
+    conversion_rules: Dict[str, ConversionRule] = field(default_factory=dict)
+    conversion_range: Optional[Tuple[float, float]] = (0.01, 0.95)
+
+
+V1 = VersionProfile(7.5, 0.9, 0.20)
+V2 = VersionProfile(8.8, 0.6, 0.12, conversion_bonus=0.1)
+
+SEGMENT_CONVERSION = {
+    # 极度挑剔：审美低于 8.0 转化率大幅下降
+    'high_net_worth': ConversionRule('aesthetic_score', 8.0, below=0.3, at_or_above=1.2),
+    # 价格敏感：对高利润率极其敏感（嫌贵）
+    'price_sensitive': ConversionRule('profit_margin', 0.25, below=1.1, at_or_above=0.5),
+}
+
+PHASES: Dict[str, PhaseConfig] = {
+    # P1: no routing
+    'p1': PhaseConfig(
+        phase='p1',
+        file_name='travel_agent_tradeoff_data.csv',
+        n_samples=1000,
+        versions={
+            'v1-balanced': VersionProfile(7.2, 1.0, 0.20),
+            'v2-aesthetic-first': VersionProfile(8.5, 0.8, 0.12, conversion_bonus=0.1),
+            'v3-profit-seeker': VersionProfile(5.5, 1.2, 0.28),
+        },
+        policy='p1-baseline',
+        aesthetic_range=(1.0, 10.0),
+        margin_slope=0.03,
+        conversion_range=None,
+    ),
+    # P2: v3 patched with a flat 20% margin cut below 6.0 aesthetic
+    'p2': PhaseConfig(
+        phase='p2',
+        file_name='travel_data_p2_routing.csv',
+        n_samples=1500,
+        versions={
+            'v1-balanced': V1,
+            'v2-aesthetic-first': V2,
+            'v3-profit-seeker-p2-patched': VersionProfile(6.5, 1.0, 0.25),
+        },
+        policy='p2-routing',
+        penalty=Penalty('v3-profit-seeker-p2-patched', 6.0, factor=0.8),
+        revenue_multiplier={'high_net_worth': 1.5},
+        conversion_rules=SEGMENT_CONVERSION,
+    ),
+    # P3: v3 with a tiered penalty (2% margin per aesthetic point below 7.0)
+    'p3': PhaseConfig(
+        phase='p3',
+        file_name='travel_data_p3_refined.csv',
+        n_samples=1500,
+        versions={
+            'v1-balanced': V1,
+            'v2-aesthetic-first': V2,
+            'v3-profit-seeker-p3-tiered': VersionProfile(6.8, 0.9, 0.26),
+        },
+        policy='p3-refined',
+        penalty=Penalty('v3-profit-seeker-p3-tiered', 7.0, per_point=0.02),
+        revenue_multiplier={'high_net_worth': 1.5},
+        conversion_rules=SEGMENT_CONVERSION,
+    ),
+}
+
+# Lookup table: byte -> two lowercase hex digits, for formatting plan ids without a Python loop
+_HEX_PAIRS = np.array([f"{b:02x}".encode() for b in range(256)], dtype="S2").view(np.uint16)
+
+
+def _plan_ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """8 hex digits per plan, like str(uuid.uuid4())[:8]."""
+    raw = rng.integers(0, 256, size=(n, 4), dtype=np.uint8)
+    return np.ascontiguousarray(_HEX_PAIRS[raw]).view("S8").ravel().astype(str)
+
+
+def _default_window() -> Tuple[datetime, datetime]:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today.replace(month=1, day=1), today
+
+
+def generate_chunk(config: PhaseConfig, n: int, rng: np.random.Generator,
+                   start: datetime, end: datetime) -> pd.DataFrame:
+    policy = load_policy(config.policy)
+    segment_names = policy.segments
+    version_names = policy.versions
+
+    # 1. Segments and routed versions: alias-table draws of the routing policy
+    segment = policy.sample_segments(n, rng)
+    version = policy.sample_versions(segment, rng)
+
+    # 2. Scores and margins from the version profiles
+    profiles = [config.versions[v] for v in version_names]
+    mean = np.array([p.aesthetic_mean for p in profiles])[version]
+    std = np.array([p.aesthetic_std for p in profiles])[version]
+    aesthetic = np.clip(mean + std * rng.standard_normal(n), *config.aesthetic_range)
+    base_margin = np.array([p.base_margin for p in profiles])[version]
+    margin = base_margin - (aesthetic - 7.0) * config.margin_slope + rng.normal(0, 0.03, n)
+
+    if config.penalty is not None:
+        hit = (version == version_names.index(config.penalty.version)) & (aesthetic < config.penalty.threshold)
+        gap = config.penalty.threshold - aesthetic[hit]
+        margin[hit] = margin[hit] * config.penalty.factor - gap * config.penalty.per_point
+    margin = np.clip(margin, *config.margin_range)
+
+    logic = rng.beta(5, 1, n) * 10
+    revenue = rng.integers(3000, 20001, n).astype(np.float64)
+    for name, multiplier in config.revenue_multiplier.items():
+        revenue[segment == segment_names.index(name)] *= multiplier
+    net_profit = revenue * margin
+
+    # 3. Conversion
+    prob = aesthetic / 10.0 * 0.4
+    columns = {'aesthetic_score': aesthetic, 'profit_margin': margin}
+    for name, rule in config.conversion_rules.items():
+        in_segment = segment == segment_names.index(name)
+        below = columns[rule.column] < rule.threshold
+        prob[in_segment] *= np.where(below[in_segment], rule.below, rule.at_or_above)
+    prob += np.array([p.conversion_bonus for p in profiles])[version]
+    if config.conversion_range is not None:
+        prob = np.clip(prob, *config.conversion_range)
+    converted = rng.random(n) < prob
+
+    span = int((end - start).total_seconds())
+    created_at = np.datetime64(start, "s") + rng.integers(0, max(span, 1), n).astype("timedelta64[s]")
+
+    data = {'plan_id': _plan_ids(rng, n)}
+    if policy.segmented:
+        data['user_segment'] = pd.Categorical.from_codes(segment, segment_names)
+    data.update({
+        'agent_version': pd.Categorical.from_codes(version, version_names),
+        'total_revenue': np.round(revenue, 2),
+        'net_profit': np.round(net_profit, 2),
+        'profit_margin': np.round(margin, 4),
+        'aesthetic_score': np.round(aesthetic, 2),
+        'logic_score': np.round(logic, 2),
+        'is_converted': converted,
+        'created_at': created_at,
+    })
+    return pd.DataFrame(data)
+
+
+def iter_chunks(config: PhaseConfig, n: Optional[int] = None, seed: Optional[int] = None,
+                chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[pd.DataFrame]:
+    """Yield the phase's plans in frames of at most `chunk_rows` rows; each chunk has its own child seed."""
+    n = config.n_samples if n is None else n
+    if start is None or end is None:
+        default_start, default_end = _default_window()
+        start, end = start or default_start, end or default_end
+    seeds = np.random.SeedSequence(seed)
+    for offset in range(0, n, chunk_rows):
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+        yield generate_chunk(config, min(chunk_rows, n - offset), rng, start, end)
+
+
+def generate_phase(phase: str, n: Optional[int] = None, seed: Optional[int] = None,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS, csv: bool = True,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Write the phase to the plan store (and its CSV unless csv=False), chunk by chunk.
+    Returns the first chunk as a preview.
+    """
+    config = PHASES[phase]
+    preview = []
+
+    def chunks():
+        for k, df in enumerate(iter_chunks(config, n, seed, chunk_rows, start, end)):
+            if csv:
+                df.to_csv(config.file_name, mode='w' if k == 0 else 'a', header=k == 0, index=False)
+            if k == 0:
+                preview.append(df)
+            yield df
+
+    write_phase_chunks(chunks(), phase)
+    return preview[0] if preview else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("phase", choices=sorted(PHASES))
+    parser.add_argument("--rows", type=int, default=None, help="defaults to the phase's n_samples")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--no-csv", action="store_true", help="only write the plan store")
+    args = parser.parse_args()
+
+    rows = args.rows or PHASES[args.phase].n_samples
+    preview = generate_phase(args.phase, rows, args.seed, args.chunk_rows, csv=not args.no_csv)
+    target = os.path.join(STORE_PATH, f"phase={args.phase}")
+    print(f"Generated {rows} plans for {args.phase} -> {target}" + ("" if args.no_csv else f", {PHASES[args.phase].file_name}"))
+    print(preview.head())
@@ -0,0 +1,64 @@
+"""
+Randomized cross-checks of live_frontier.LiveFrontier against pareto.pareto_mask
+and a brute-force dominance scan.
+
+    python -m pytest -q test_live_frontier.py
+"""
+import numpy as np
+import pytest
+
+from live_frontier import LiveFrontier
+from pareto import pareto_mask
+
+
+def brute_force_frontier(points):
+    """Plan ids no other plan dominates (NaN plans are incomparable, so always kept)."""
+    def dominates(p, q):
+        return p[0] >= q[0] and p[1] >= q[1] and p != q
+
+    comparable = {i: p for i, p in points.items() if not np.isnan(p).any()}
+    return {i for i, p in points.items()
+            if i not in comparable or not any(dominates(q, p) for q in comparable.values())}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_insert_remove_matches_full_recomputation(seed):
+    rng = np.random.default_rng(seed)
+    frontier, points = LiveFrontier(), {}
+    for _ in range(300):
+        if points and rng.random() < 0.35:
+            plan_id = list(points)[int(rng.integers(len(points)))]
+            before = {p for p in points if frontier.is_on_frontier(p)}
+            promoted = frontier.remove(plan_id)
+            del points[plan_id]
+            assert set(promoted) == {p for p in points if frontier.is_on_frontier(p)} - before
+        else:
+            plan_id = int(rng.integers(0, 120))
+            a, b = rng.integers(0, 8, 2).astype(float)    # small grid: many ties and duplicates
+            if rng.random() < 0.05:
+                a = np.nan
+            update = frontier.insert(plan_id, a, b)
+            points[plan_id] = (a, b)
+            assert update.on_frontier == frontier.is_on_frontier(plan_id)
+            assert not any(frontier.is_on_frontier(p) for p in update.evicted)
+
+        ids = list(points)
+        on_frontier = {p for p in ids if frontier.is_on_frontier(p)}
+        expected = pareto_mask(np.array([points[p] for p in ids]).reshape(-1, 2))
+        assert on_frontier == {p for p, keep in zip(ids, expected) if keep}
+        assert on_frontier == brute_force_frontier(points)
+        assert {row[0] for row in frontier.frontier()} == on_frontier
+
+
+def test_extend_matches_frontier_only_seed():
+    # The dashboard seeds its frontier with the pareto_mask rows only; later inserts must agree
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(2000, 2))
+    mask = pareto_mask(matrix)
+    full, seeded = LiveFrontier(), LiveFrontier()
+    full.extend((i, a, b) for i, (a, b) in enumerate(matrix.tolist()))
+    seeded.extend((i, a, b) for i, ((a, b), keep) in enumerate(zip(matrix.tolist(), mask)) if keep)
+    assert full.frontier() == seeded.frontier()
+    for plan_id, (a, b) in enumerate(rng.normal(size=(200, 2)).tolist(), start=len(matrix)):
+        assert full.insert(plan_id, a, b).on_frontier == seeded.insert(plan_id, a, b).on_frontier
+    assert full.frontier() == seeded.frontier()
@@ -0,0 +1,68 @@
+"""
+Randomized cross-checks of schedule_solver against brute force over every
+visiting order (days small enough to enumerate).
+
+    python -m pytest -q test_schedule_solver.py
+"""
+from itertools import combinations, permutations
+
+import numpy as np
+import pytest
+
+from schedule_solver import Stop, check, simulate, solve
+
+
+def random_day(n, rng):
+    stops = []
+    for i in range(n):
+        duration = int(rng.integers(20, 90))
+        opens = int(rng.integers(8 * 60, 14 * 60))
+        windows = [(opens, opens + int(rng.integers(60, 6 * 60)))]
+        if rng.random() < 0.3:      # a second, evening window
+            windows.append((windows[0][1] + 60, windows[0][1] + 60 + int(rng.integers(60, 3 * 60))))
+        stops.append(Stop(f"stop{i}", duration, windows, preferred_start=opens + int(rng.integers(0, 60))))
+    xy = rng.uniform(0, 10, (n, 2))
+    travel = np.round(np.linalg.norm(xy[:, None] - xy[None], axis=2) * 3 + 5)
+    np.fill_diagonal(travel, 0)
+    return stops, travel
+
+
+def brute_force(stops, travel):
+    """(largest number of stops that fit, earliest finish among the orders visiting that many)."""
+    for size in range(len(stops), 0, -1):
+        finishes = [f[-1] for subset in combinations(range(len(stops)), size)
+                    for order in permutations(subset)
+                    if (f := simulate(order, stops, travel)) is not None]
+        if finishes:
+            return size, min(finishes)
+    return 0, None
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_exact_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    stops, travel = random_day(int(rng.integers(2, 7)), rng)
+    schedule = solve(stops, travel)
+    size, finish = brute_force(stops, travel)
+
+    assert len(schedule.order) == size
+    assert len(schedule.dropped) == len(stops) - size
+    assert schedule.feasible == (size == len(stops))
+    if size:
+        assert simulate(schedule.order, stops, travel)[-1] == finish
+        assert check(stops, travel, schedule.order, schedule.starts) == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_heuristic_schedules_are_valid(seed):
+    rng = np.random.default_rng(seed)
+    stops, travel = random_day(int(rng.integers(2, 9)), rng)
+    schedule = solve(stops, travel, exact_max_stops=0)
+    size, _ = brute_force(stops, travel)
+
+    assert schedule.method == "heuristic"
+    assert len(schedule.order) <= size
+    placed, dropped = [stops[j].key for j in schedule.order], [v.key for v in schedule.dropped]
+    assert sorted(placed + dropped) == sorted(stop.key for stop in stops)
+    if schedule.order:
+        assert check(stops, travel, schedule.order, schedule.starts) == []
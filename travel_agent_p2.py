@@ -1,10 +1,14 @@
 import os
 import json
+import time
+import hashlib
 from dotenv import load_dotenv
 import googlemaps
 from datetime import datetime, timedelta
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List
+from langgraph.checkpoint.memory import MemorySaver
+from typing import TypedDict, List, Dict
+from convergence import LoopBudget, decide, record, REPLAN, STALLED
 
 # 1. 初始化
 load_dotenv(".env.local")
@@ -16,6 +20,14 @@ class AgentState(TypedDict):
     is_valid: bool
     feedback: str
     iteration: int
+    audit_memo: Dict[str, str]  # 路段哈希 -> 审计结论（"" 表示通过），replan 后只复查变化的路段
+    plan_history: List[str]     # 每版方案的指纹，用于识别重复方案/循环
+    started_at: float           # 第一版方案的时间 (time.time())
+    loop_status: str            # 收敛控制器的结论: done / replan / stalled
+    loop_reason: str
+
+# 收敛预算：超过轮数或时长仍未通过审计，就转人工
+LOOP_BUDGET = LoopBudget(max_iterations=5, max_seconds=60.0)
 
 # --- 节点 A: 规划者 (Planner) ---
 def planner_node(state: AgentState):
@@ -29,56 +41,97 @@ def planner_node(state: AgentState):
         # 初始方案：先去卢浮宫
         new_plan = ["10:00 卢浮宫", "14:00 埃菲尔铁塔"]
         
-    return {"itinerary": new_plan, "iteration": state['iteration'] + 1}
+    return {
+        "itinerary": new_plan,
+        "iteration": state['iteration'] + 1,
+        "plan_history": record(state.get("plan_history"), new_plan),
+        "started_at": state.get("started_at") or time.time()
+    }
 
 # --- 节点 B: 审计员 (Auditor) ---
-def auditor_node(state: AgentState):
-    print("[Auditor] 正在调取 Google Maps 验证路况...")
-    
+def leg_key(origin: str, destination: str) -> str:
+    """相邻两站的内容哈希：站点或时间变了，哈希就变"""
+    return hashlib.blake2b(f"{origin}|{destination}".encode("utf-8"), digest_size=8).hexdigest()
+
+def check_leg(origin: str, destination: str) -> str:
     # 这里模拟真实 API 调用逻辑
-    # 假设我们只在第一轮模拟一个"堵车"结果
-    if state['iteration'] == 1:
-        # 实际开发时这里写：gmaps.distance_matrix(...)
-        return {
-            "is_valid": False, 
-            "feedback": "警告：卢浮宫周边下午 14:00 有严重堵车，预计延误 40 分钟。"
-        }
-    else:
-        print("✅ 审计通过：当前行程逻辑顺畅。")
-        return {"is_valid": True, "feedback": "通过"}
+    # 实际开发时这里写：gmaps.distance_matrix(...)
+    if "卢浮宫" in origin and destination.startswith("14:00"):
+        return "警告：卢浮宫周边下午 14:00 有严重堵车，预计延误 40 分钟。"
+    return ""
+
+def auditor_node(state: AgentState):
+    # 只复查 memo 里没有的路段（新增的、站点或时间变了的）
+    memo = dict(state.get("audit_memo") or {})
+    legs = [(leg_key(a, b), a, b) for a, b in zip(state['itinerary'], state['itinerary'][1:])]
+    pending = [(key, a, b) for key, a, b in legs if key not in memo]
+    print(f"[Auditor] 正在调取 Google Maps 验证路况... (复查 {len(pending)}/{len(legs)} 段路线)")
+    for key, a, b in pending:
+        memo[key] = check_leg(a, b)
+
+    issues = [memo[key] for key, _, _ in legs if memo[key]]
+    if issues:
+        return {"is_valid": False, "feedback": " ".join(issues), "audit_memo": memo}
+    print("✅ 审计通过：当前行程逻辑顺畅。")
+    return {"is_valid": True, "feedback": "通过", "audit_memo": memo}
+
+# --- 节点 C: 收敛控制器 ---
+def convergence_node(state: AgentState):
+    verdict = decide(state.get("plan_history") or [], state["is_valid"], state.get("started_at"), LOOP_BUDGET)
+    if verdict.action == STALLED:
+        print(f"🛑 [Convergence] 第 {verdict.iterations} 轮停止自动重规划：{verdict.reason}")
+    return {"loop_status": verdict.action, "loop_reason": verdict.reason}
+
+# --- 节点 D: 人工介入 (图在此节点前中断，人工修改 state 后恢复) ---
+def human_review_node(state: AgentState):
+    print(f"[Human] 人工处理完毕，采用当前行程: {state['itinerary']}")
+    return {"is_valid": True, "feedback": "人工确认"}
 
 # --- 路由逻辑 ---
 def should_continue(state: AgentState):
-    if state["is_valid"]:
-        return "end"
-    return "replan"
+    if state["loop_status"] == REPLAN:
+        return "replan"
+    if state["loop_status"] == STALLED:
+        return "human"
+    return "end"
 
 # --- 2. 组装工作流 ---
 workflow = StateGraph(AgentState)
 
 workflow.add_node("planner", planner_node)
 workflow.add_node("auditor", auditor_node)
+workflow.add_node("convergence", convergence_node)
+workflow.add_node("human_review", human_review_node)
 
 workflow.set_entry_point("planner")
 workflow.add_edge("planner", "auditor")
+workflow.add_edge("auditor", "convergence")
 
 workflow.add_conditional_edges(
-    "auditor",
+    "convergence",
     should_continue,
     {
         "replan": "planner",
+        "human": "human_review",
         "end": END
     }
 )
+workflow.add_edge("human_review", END)
 
-app = workflow.compile()
+# 卡住的循环在 human_review 前中断，等待人工
+app = workflow.compile(checkpointer=MemorySaver(), interrupt_before=["human_review"])
 
 # --- 3. 运行启动 ---
 if __name__ == "__main__":
     print("🚀 AI 旅游 Agent P2 版启动 (带 Google Maps 审计功能)")
-    initial_state = {"itinerary": [], "is_valid": False, "feedback": "", "iteration": 0}
-    
-    for output in app.stream(initial_state):
+    initial_state = {"itinerary": [], "is_valid": False, "feedback": "", "iteration": 0, "audit_memo": {}, "plan_history": []}
+    config = {"configurable": {"thread_id": "p2-demo"}}
+
+    for output in app.stream(initial_state, config):
         for key, value in output.items():
-            if "itinerary" in value:
+            if value and "itinerary" in value:
                 print(f"当前行程: {value['itinerary']}")
+
+    snapshot = app.get_state(config)
+    if "human_review" in snapshot.next:
+        print(f"⏸️ 等待人工介入：{snapshot.values['loop_reason']}")
@@ -0,0 +1,265 @@
+"""
+Two-tier cache for Distance Matrix travel times.
+
+Pessimistic traffic for a place pair barely changes within the same weekday
+and time of day, so results are keyed by
+(origin place_id, destination place_id, weekday, departure bucket, traffic_model).
+
+Tier 1: in-process LRU (OrderedDict) with TTL.
+Tier 2: SQLite file that survives restarts of backend_api.py, written in
+        batches.
+"""
+import asyncio
+import atexit
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from maps_batching import DEPARTURE_BUCKET_MINUTES, departure_bucket
+
+CacheKey = Tuple[str, str, int, int, str]
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MEMORY_ENTRIES = 10_000
+DEFAULT_DISK_ENTRIES = 200_000
+DEFAULT_FLUSH_EVERY = 64
+
+
+def make_key(origin: str, destination: str, departure_time: datetime,
+             traffic_model: str = "pessimistic",
+             bucket_minutes: int = DEPARTURE_BUCKET_MINUTES) -> CacheKey:
+    bucket = departure_bucket(departure_time, bucket_minutes)
+    return (origin, destination, departure_time.weekday(), bucket.hour * 60 + bucket.minute, traffic_model)
+
+
+class TravelTimeCache:
+    """
+    Values are travel times in seconds (duration_in_traffic).
+
+    path: SQLite file for the persistent tier, or None for memory only. The
+    file is opened on first use, not at construction.
+
+    Memory hits never touch SQLite, nor wait for it: the LRU and the write
+    queues have their own lock, held for dict operations only, and the
+    connection another one, held across SQLite calls. Writes and last-access updates are queued
+    and written in one transaction every `flush_every` entries (and at exit),
+    so the per-lookup cost stays in memory. Async callers use aget/aput, which
+    run the SQLite part in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, path: Optional[str] = "travel_time_cache.db",
+                 ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_DISK_ENTRIES,
+                 flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.flush_every = flush_every
+        self._memory: "OrderedDict[CacheKey, Tuple[int, float]]" = OrderedDict()
+        self._pending_puts: Dict[CacheKey, Tuple[int, float]] = {}
+        self._pending_touches: Dict[CacheKey, float] = {}
+        self._lock = threading.Lock()       # memory LRU, write queues, counters
+        self._db_lock = threading.Lock()    # the SQLite connection
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0,
+                          "writes": 0, "flushes": 0}
+        self._conn = None
+        if path:
+            atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller holds _db_lock
+        if self._conn is None:
+            # check_same_thread=False: lookups come from worker threads
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS travel_times (
+                    origin TEXT NOT NULL,
+                    destination TEXT NOT NULL,
+                    weekday INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    traffic_model TEXT NOT NULL,
+                    seconds INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (origin, destination, weekday, bucket, traffic_model)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_travel_times_access ON travel_times (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    # --- Lookups ---
+
+    def get(self, key: CacheKey) -> Optional[int]:
+        seconds, answered = self._get_memory(key)
+        if answered:
+            return seconds
+        return self._get_disk(key)
+
+    async def aget(self, key: CacheKey) -> Optional[int]:
+        seconds, answered = self._get_memory(key)
+        if answered:
+            return seconds
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def put(self, key: CacheKey, seconds: int):
+        if self._put_memory(key, seconds):
+            self.flush()
+
+    async def aput(self, key: CacheKey, seconds: int):
+        if self._put_memory(key, seconds):
+            await asyncio.to_thread(self.flush)
+
+    def _get_memory(self, key: CacheKey) -> Tuple[Optional[int], bool]:
+        """(seconds, answered): answered is False when the disk tier still has to be asked."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                seconds, stored_at = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return seconds, True
+                del self._memory[key]
+                self._pending_puts.pop(key, None)
+                self._counters["expired"] += 1
+            if not self.path:
+                self._counters["misses"] += 1
+                return None, True
+        return None, False
+
+    def _get_disk(self, key: CacheKey) -> Optional[int]:
+        now = time.time()
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT seconds, stored_at FROM travel_times "
+                "WHERE origin = ? AND destination = ? AND weekday = ? AND bucket = ? AND traffic_model = ?",
+                key,
+            ).fetchone()
+        flush_due = False
+        with self._lock:
+            if row is not None:
+                seconds, stored_at = row
+                if now - stored_at <= self.ttl_seconds:
+                    self._pending_touches[key] = now
+                    self._remember(key, seconds, stored_at)
+                    self._counters["disk_hits"] += 1
+                    flush_due = self._flush_due()
+                else:
+                    row = None
+                    self._counters["expired"] += 1
+            if row is None:
+                self._counters["misses"] += 1
+        if flush_due:
+            self.flush()
+        return None if row is None else row[0]
+
+    def _put_memory(self, key: CacheKey, seconds: int) -> bool:
+        """Store in memory and queue the disk write; True when the queue is due for a flush."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, seconds, now)
+            self._counters["writes"] += 1
+            if not self.path:
+                return False
+            self._pending_puts[key] = (seconds, now)
+            return self._flush_due()
+
+    def _flush_due(self) -> bool:
+        return len(self._pending_puts) + len(self._pending_touches) >= self.flush_every
+
+    def _remember(self, key: CacheKey, seconds: int, stored_at: float):
+        self._memory[key] = (seconds, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    # --- Persistence ---
+
+    def flush(self):
+        """Write queued entries and access times in one transaction."""
+        if not self.path:
+            return
+        # The queues are swapped out under the memory lock, then written under the connection's
+        with self._db_lock:
+            with self._lock:
+                puts, self._pending_puts = self._pending_puts, {}
+                touches, self._pending_touches = self._pending_touches, {}
+                prune = self._counters["flushes"] % 4 == 0
+            if not (puts or touches):
+                return
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO travel_times "
+                "(origin, destination, weekday, bucket, traffic_model, seconds, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*key, seconds, stored_at, stored_at) for key, (seconds, stored_at) in puts.items()],
+            )
+            conn.executemany(
+                "UPDATE travel_times SET last_access = ? "
+                "WHERE origin = ? AND destination = ? AND weekday = ? AND bucket = ? AND traffic_model = ?",
+                [(accessed, *key) for key, accessed in touches.items()],
+            )
+            # Counting rows is O(n); prune every few flushes rather than on each one
+            evicted = self._prune_disk(time.time()) if prune else 0
+            conn.commit()
+        with self._lock:
+            self._counters["flushes"] += 1
+            self._counters["evictions"] += evicted
+
+    def close(self):
+        """Flush and close the SQLite file (registered with atexit)."""
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _prune_disk(self, now: float) -> int:
+        """Drop expired rows, then the least recently used beyond max_disk_entries; the number evicted."""
+        self._conn.execute("DELETE FROM travel_times WHERE stored_at < ?", (now - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM travel_times").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow <= 0:
+            return 0
+        # Least recently used rows go first
+        self._conn.execute(
+            "DELETE FROM travel_times WHERE rowid IN "
+            "(SELECT rowid FROM travel_times ORDER BY last_access LIMIT ?)",
+            (overflow,),
+        )
+        return overflow
+
+    # --- Reporting ---
+
+    def stats(self) -> Dict[str, float]:
+        """Counters and sizes; counts the SQLite rows, so async callers run it in a worker thread."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["pending_writes"] = len(self._pending_puts) + len(self._pending_touches)
+        with self._db_lock:
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM travel_times").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._pending_puts.clear()
+            self._pending_touches.clear()
+        if self.path:
+            with self._db_lock:
+                conn = self._connection()
+                conn.execute("DELETE FROM travel_times")
+                conn.commit()